@@ -10,12 +10,225 @@ Contient les fonctions:
     - jouer_coup (projet)
         communiquer avec le serveur pour enregistrer le nouveau coup et obtenir l'etat
         de la table de jeu updatée.
+    - client_défaut
+        le ClientQuoridor partagé par les trois fonctions précédentes
+Contient les classes:
+    - ClientQuoridor
+        client qui garde ses connexions ouvertes d'un appel à l'autre (keep-alive),
+        avec délais d'attente, reprises et mesure de la latence
 '''
+import os
+import statistics
+import time
+import unittest
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+
+# URL du server python à contacter (la variable d'environnement QUORIDOR_URL permet
+# de pointer vers un autre serveur, comme celui de serveur.py)
+URL_BASE = os.environ.get('QUORIDOR_URL', 'https://python.gel.ulaval.ca/quoridor/api/')
+# délais d'attente (connexion, lecture) en secondes
+DÉLAIS = (3.05, 10)
+# codes HTTP qui indiquent une erreur passagère du serveur
+CODES_PASSAGERS = (502, 503, 504)
+
+
+def jamais_envoyée(erreur):
+    '''Indique si une erreur de requests est survenue avant que la requête soit envoyée
+    (connexion refusée ou impossible à établir à temps)
+    '''
+    if isinstance(erreur, requests.ConnectTimeout):
+        return True
+    raison = getattr(erreur.args[0], 'reason', None) if erreur.args else None
+    return isinstance(raison, NewConnectionError)
+
+
+class ClientQuoridor:
+    '''class ClientQuoridor
+
+    Description:
+        Client du serveur de Quoridor qui réutilise une même requests.Session:
+        les connexions TCP+TLS restent ouvertes d'un coup à l'autre.
+        Les erreurs passagères sont reprises avec une attente qui double à chaque essai.
+        Les requêtes POST (débuter/ et jouer/) ne sont reprises que si le serveur ne
+        les a certainement pas traitées (connexion impossible ou code 503), pour ne
+        jamais jouer un coup ou débuter une partie deux fois.
+    Attributs:
+        url_base (str):
+            L'URL du serveur (None pour suivre api.URL_BASE)
+        délais (tuple):
+            Les délais d'attente (connexion, lecture) en secondes
+        essais (int):
+            Le nombre maximal d'essais pour une requête
+        attente (float):
+            L'attente avant le premier nouvel essai, en secondes
+        latences (dict):
+            La durée de chaque appel réussi, en secondes, par route ('lister/', ...)
+        reprises (dict):
+            Le nombre de nouveaux essais, par route
+    '''
+
+    def __init__(self, url_base=None, délais=DÉLAIS, essais=3, attente=0.25, connexions=10):
+        '''
+        Input:
+            url_base (str):
+                L'URL du serveur (default: None, api.URL_BASE)
+            délais (tuple ou float):
+                Les délais d'attente (connexion, lecture) (default: DÉLAIS)
+            essais (int):
+                Le nombre maximal d'essais pour une requête (default: 3)
+            attente (float):
+                L'attente avant le premier nouvel essai, en secondes (default: 0.25)
+            connexions (int):
+                Le nombre de connexions gardées ouvertes par serveur (default: 10)
+        '''
+        self.url_base = url_base
+        self.délais = délais
+        self.essais = essais
+        self.attente = attente
+        self.session = requests.Session()
+        adaptateur = HTTPAdapter(pool_connections=connexions, pool_maxsize=connexions)
+        self.session.mount('http://', adaptateur)
+        self.session.mount('https://', adaptateur)
+        self.latences = {}
+        self.reprises = {}
+
+
+    def url(self, route):
+        '''Donne l'URL complète d'une route du serveur'''
+        return (URL_BASE if self.url_base is None else self.url_base) + route
+
+
+    def requête(self, méthode, route, **kwargs):
+        '''def requête(méthode, route, **kwargs)
+
+        Description:
+            Envoie une requête au serveur, en reprenant les erreurs passagères
+        Input:
+            méthode (str):
+                'GET' ou 'POST'
+            route (str):
+                La route du serveur ('lister/', 'débuter/' ou 'jouer/')
+            kwargs:
+                Les arguments de requests.Session.request (params, data, ...)
+        Return:
+            rep (requests.Response):
+                La dernière réponse du serveur
+        Note:
+            - Si le dernier essai échoue, son exception requests est soulevée.
+        '''
+        idempotente = méthode == 'GET'
+        for essai in range(self.essais):
+            début = time.perf_counter()
+            try:
+                rep = self.session.request(méthode, self.url(route),
+                                           timeout=self.délais, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as erreur:
+                # une requête POST ne peut être reprise que si elle n'a jamais été envoyée
+                if not (idempotente or jamais_envoyée(erreur)) or essai == self.essais - 1:
+                    raise
+            else:
+                passager = rep.status_code == 503 or (
+                    idempotente and rep.status_code in CODES_PASSAGERS)
+                if not passager or essai == self.essais - 1:
+                    self.latences.setdefault(route, []).append(time.perf_counter() - début)
+                    return rep
+            self.reprises[route] = self.reprises.get(route, 0) + 1
+            time.sleep(self.attente * 2 ** essai)
+        return rep
+
+
+    def réponse(self, rep, méthode, route):
+        '''Décode la réponse du serveur comme le faisaient les fonctions du module
+        Soulève StopIteration si le serveur retourne un gagnant, et RuntimeError s'il
+        retourne un message. Si le code HTTP n'est pas 200, l'erreur est affichée
+        et la réponse est retournée telle quelle.
+        '''
+        if rep.status_code == 200:
+            # la requête s'est déroulée normalement; décoder le JSON
+            rep = rep.json()
+            if isinstance(rep, dict) and 'gagnant' in rep:
+                # soulever l'exception
+                raise StopIteration(rep["gagnant"])
+            # tester pour la présence d'un message dans la réponse
+            if isinstance(rep, dict) and "message" in rep:
+                raise RuntimeError(rep["message"])
+        else:
+            print(f"Le {méthode} sur {self.url(route)} a produit le code d'erreur {rep.status_code}.")
+        return rep
+
+
+    def lister_parties(self, idul):
+        '''Voir api.lister_parties'''
+        rep = self.requête('GET', 'lister/', params={'idul': idul})
+        return self.réponse(rep, 'GET', 'lister/')
+
+
+    def débuter_partie(self, idul):
+        '''Voir api.débuter_partie'''
+        rep = self.requête('POST', 'débuter/', data={'idul': idul})
+        return self.réponse(rep, 'POST', 'débuter/')
+
+
+    def jouer_coup(self, id_partie, type_coup, position):
+        '''Voir api.jouer_coup'''
+        rep = self.requête('POST', 'jouer/', data={'id': id_partie,
+                                                    'type': type_coup,
+                                                    'pos': position})
+        return self.réponse(rep, 'POST', 'jouer/')
+
 
+    def métriques(self):
+        '''def métriques()
+
+        Description:
+            Résume la latence des appels au serveur
+        Return:
+            (dict):
+                Pour chaque route: 'appels', 'reprises', et la latence 'moyenne',
+                'p50', 'p95' et 'max' en millisecondes
+        '''
+        résumé = {}
+        for route, latences in self.latences.items():
+            latences = sorted(1000 * latence for latence in latences)
+            résumé[route] = {
+                'appels': len(latences),
+                'reprises': self.reprises.get(route, 0),
+                'moyenne': statistics.mean(latences),
+                'p50': latences[len(latences) // 2],
+                'p95': latences[min(len(latences) - 1, int(len(latences) * 0.95))],
+                'max': latences[-1],
+            }
+        return résumé
+
+
+    def fermer(self):
+        '''Ferme les connexions gardées ouvertes'''
+        self.session.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exception):
+        self.fermer()
+
+
+# client partagé par les fonctions du module, créé au premier appel
+CLIENT = None
+
+
+def client_défaut():
+    '''Donne le client partagé par lister_parties, débuter_partie et jouer_coup'''
+    global CLIENT
+    if CLIENT is None:
+        CLIENT = ClientQuoridor()
+    return CLIENT
 
-# URL du server python à contacter
-URL_BASE = 'https://python.gel.ulaval.ca/quoridor/api/'
 
 def lister_parties(idul):
     '''def lister_parties(idul)
@@ -33,16 +246,7 @@ def lister_parties(idul):
         - Si le serveur retourne un message, la fonction soulève une
         exception RuntimeError suivi de ce message.
     '''
-    rep = requests.get(URL_BASE+'lister/', params={'idul': idul})
-    if rep.status_code == 200:
-        # la requête s'est déroulée normalement; décoder le JSON
-        rep = rep.json()
-        # tester pour la présence d'un message dans la réponse
-        if "message" in rep:
-            raise RuntimeError(rep["message"])
-    else:
-        print(f"Le GET sur {URL_BASE+'lister'} a produit le code d'erreur {rep.status_code}.")
-    return rep
+    return client_défaut().lister_parties(idul)
 
 
 
@@ -65,16 +269,7 @@ def débuter_partie(idul):
         - Si le serveur retourne un message, la fonction soulève
             une exception RuntimeError suivi de ce message.
     '''
-    rep = requests.post(URL_BASE+'débuter/', data={'idul': idul})
-    if rep.status_code == 200:
-        # la requête s'est déroulée normalement; décoder le JSON
-        rep = rep.json()
-        # tester pour la présence d'un message dans la réponse
-        if "message" in rep:
-            raise RuntimeError(rep["message"])
-    else:
-        print(f"Le GET sur {URL_BASE+'lister'} a produit le code d'erreur {rep.status_code}.")
-    return rep
+    return client_défaut().débuter_partie(idul)
 
 
 
@@ -102,20 +297,106 @@ def jouer_coup(id_partie, type_coup, position):
         - Si le serveur retour un gagnant, la fonction soulève
             une exception StopInteration suivi du nom du gagnant.
     '''
-    rep = requests.post(URL_BASE+'jouer/',
-                        data={'id': id_partie,
-                              'type': type_coup,
-                              'pos': position})
-    if rep.status_code == 200:
-        # la requête s'est déroulée normalement; décoder le JSON
-        rep = rep.json()
-        if 'gagnant' in rep:
-            # soulever l'exception
-            raise StopIteration(rep["gagnant"])
-        # tester pour la présence d'un message dans la réponse
-        if "message" in rep:
-            raise RuntimeError(rep["message"])
-        # tester s'il y a un gagnant
-    else:
-        print(f"Le GET sur {URL_BASE+'lister'} a produit le code d'erreur {rep.status_code}.")
-    return rep
+    return client_défaut().jouer_coup(id_partie, type_coup, position)
+
+
+class TestClientQuoridor(unittest.TestCase):
+    """classe test ClientQuoridor, contre un serveur factice local"""
+
+    def setUp(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, unquote, urlsplit
+        test = self
+        test.connexions = set()
+        test.pannes = 0
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            # HTTP/1.1: la connexion reste ouverte entre les requêtes
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def répondre(self, code, contenu):
+                corps = json.dumps(contenu).encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def do_GET(self):
+                test.connexions.add(self.client_address)
+                url = urlsplit(self.path)
+                if test.pannes:
+                    test.pannes -= 1
+                    self.répondre(503, {})
+                elif unquote(url.path).endswith('lister/'):
+                    self.répondre(200, {'parties': [parse_qs(url.query)['idul'][0]]})
+                else:
+                    self.répondre(404, {})
+
+            def do_POST(self):
+                test.connexions.add(self.client_address)
+                longueur = int(self.headers['Content-Length'])
+                données = parse_qs(self.rfile.read(longueur).decode('utf-8'))
+                route = unquote(urlsplit(self.path).path)
+                if route.endswith('débuter/'):
+                    self.répondre(200, {'id': '123', 'état': {'idul': données['idul'][0]}})
+                elif données['type'][0] == 'D':
+                    self.répondre(200, {'gagnant': 'joueur1'})
+                elif données['type'][0] == 'MH':
+                    self.répondre(200, {'état': {'pos': données['pos']}})
+                else:
+                    self.répondre(200, {'message': "Coup invalide"})
+
+        self.serveur = ThreadingHTTPServer(('127.0.0.1', 0), Gestionnaire)
+        threading.Thread(target=self.serveur.serve_forever, daemon=True).start()
+        self.client = ClientQuoridor('http://127.0.0.1:{}/quoridor/api/'.format(
+            self.serveur.server_address[1]), attente=0.01)
+
+
+    def tearDown(self):
+        self.client.fermer()
+        self.serveur.shutdown()
+        self.serveur.server_close()
+
+
+    def test_client(self):
+        """ Test du client
+            Cas à tester:
+                - les réponses sont décodées comme avant
+                - RuntimeError pour un message, StopIteration pour un gagnant
+                - une seule connexion pour tous les appels
+                - une erreur 503 est reprise et comptée
+                - les fonctions du module utilisent le client partagé
+        """
+        global CLIENT
+        self.assertEqual(self.client.lister_parties('idul'), {'parties': ['idul']})
+        self.assertEqual(self.client.débuter_partie('idul'),
+                         {'id': '123', 'état': {'idul': 'idul'}})
+        self.assertEqual(self.client.jouer_coup('123', 'MH', (4, 5)),
+                         {'état': {'pos': ['4', '5']}})
+        with self.assertRaises(RuntimeError):
+            self.client.jouer_coup('123', 'MV', (4, 5))
+        with self.assertRaises(StopIteration):
+            self.client.jouer_coup('123', 'D', (5, 9))
+        self.assertEqual(len(self.connexions), 1)
+        self.pannes = 2
+        self.assertEqual(self.client.lister_parties('idul'), {'parties': ['idul']})
+        métriques = self.client.métriques()
+        self.assertEqual(métriques['lister/'], dict(métriques['lister/'], appels=2, reprises=2))
+        self.assertEqual(métriques['jouer/']['appels'], 3)
+        ancien = CLIENT
+        CLIENT = self.client
+        try:
+            self.assertEqual(lister_parties('autre'), {'parties': ['autre']})
+        finally:
+            CLIENT = ancien
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -0,0 +1,323 @@
+'''api_async.py
+
+Version asyncio des fonctions de api.py, pour faire avancer plusieurs centaines de
+parties contre le serveur à partir d'un seul processus.
+Aucune bibliothèque HTTP asynchrone ne fait partie des dépendances du projet: les
+appels passent par un api.ClientQuoridor partagé (une seule réserve de connexions
+keep-alive), exécutés dans un groupe de fils d'exécution pour ne pas bloquer la
+boucle d'événements. Un asyncio.Semaphore limite le nombre d'appels simultanés.
+Les recherches de coups se font dans un autre groupe de fils, chaque partie avec sa
+propre table de transposition: la table globale de ia.py ne peut pas être partagée
+par des recherches simultanées.
+Contient les fonctions:
+    - partie_locale
+        construit une partie Quoridor à partir de l'état retourné par le serveur
+    - jouer_partie
+        joue une partie complète contre le serveur
+    - jouer_parties
+        joue plusieurs parties en parallèle sur une même boucle d'événements
+Contient les classes:
+    - ClientAsynchrone
+    - PartieTerminée(Exception)
+'''
+import asyncio
+import functools
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import ia
+import quoridor
+import transposition
+
+
+# nombre de cases de la table de transposition de chaque partie
+TAILLE_TABLE_PARTIE = 1 << 14
+
+
+class PartieTerminée(Exception):
+    '''class PartieTerminée
+
+    Description:
+        Soulevée par ClientAsynchrone.jouer_coup lorsque le serveur retourne un gagnant.
+        Remplace le StopIteration de api.jouer_coup, qui ne peut pas traverser une
+        coroutine (Python le transforme en RuntimeError).
+    Attributs:
+        gagnant (str):
+            Le nom du gagnant
+    '''
+
+    def __init__(self, gagnant):
+        super().__init__(gagnant)
+        self.gagnant = gagnant
+
+
+class ClientAsynchrone:
+    '''class ClientAsynchrone
+
+    Description:
+        Coroutines lister_parties, débuter_partie et jouer_coup, avec la même
+        signature et les mêmes erreurs que les fonctions de api.py
+        (sauf PartieTerminée à la place de StopIteration).
+    Attributs:
+        client (api.ClientQuoridor):
+            Le client synchrone partagé
+        concurrence (int):
+            Le nombre maximal d'appels simultanés au serveur
+        exécuteur (ThreadPoolExecutor):
+            Les fils des appels au serveur (concurrence fils)
+        calculs (ThreadPoolExecutor):
+            Les fils des recherches de coups, indépendants de la limite des appels
+    '''
+
+    def __init__(self, client=None, concurrence=20):
+        '''
+        Input:
+            client (api.ClientQuoridor):
+                Le client à utiliser (default: None, un nouveau client avec une
+                connexion par appel simultané)
+            concurrence (int):
+                Le nombre maximal d'appels simultanés au serveur (default: 20)
+        '''
+        self.client = api.ClientQuoridor(connexions=concurrence) if client is None else client
+        self.concurrence = concurrence
+        self.exécuteur = ThreadPoolExecutor(concurrence)
+        self.calculs = ThreadPoolExecutor()
+        # créé au premier appel, dans la boucle d'événements qui l'utilise
+        self._limite = None
+
+
+    async def _appeler(self, fonction, *arguments):
+        '''Exécute une fonction bloquante dans le groupe de fils, sous la limite de concurrence'''
+        if self._limite is None:
+            self._limite = asyncio.Semaphore(self.concurrence)
+        async with self._limite:
+            boucle = asyncio.get_running_loop()
+            return await boucle.run_in_executor(self.exécuteur,
+                                                functools.partial(fonction, *arguments))
+
+
+    async def lister_parties(self, idul):
+        '''Voir api.lister_parties'''
+        return await self._appeler(self.client.lister_parties, idul)
+
+
+    async def débuter_partie(self, idul):
+        '''Voir api.débuter_partie'''
+        return await self._appeler(self.client.débuter_partie, idul)
+
+
+    def _jouer_coup(self, id_partie, type_coup, position):
+        '''api.ClientQuoridor.jouer_coup, avec PartieTerminée à la place de StopIteration'''
+        try:
+            return self.client.jouer_coup(id_partie, type_coup, position)
+        except StopIteration as arrêt:
+            # StopIteration ne peut pas être placée dans un Future
+            raise PartieTerminée(arrêt.args[0]) from None
+
+
+    async def jouer_coup(self, id_partie, type_coup, position):
+        '''Voir api.jouer_coup
+        Soulève PartieTerminée (avec l'attribut gagnant) si le serveur retourne un gagnant.
+        '''
+        return await self._appeler(self._jouer_coup, id_partie, type_coup, position)
+
+
+    def métriques(self):
+        '''Voir api.ClientQuoridor.métriques'''
+        return self.client.métriques()
+
+
+    def fermer(self):
+        '''Ferme les connexions et les groupes de fils'''
+        self.exécuteur.shutdown(wait=False)
+        self.calculs.shutdown(wait=False)
+        self.client.fermer()
+
+
+def partie_locale(état, moteur='bits'):
+    '''Construit une partie Quoridor à partir de l'état retourné par le serveur'''
+    return quoridor.Quoridor.depuis_état(état, moteur)
+
+
+def choisir_coup(état, délai, table):
+    '''Choisit le coup du joueur 1 avec ia.meilleur_coup, dans la table de la partie'''
+    return ia.meilleur_coup(partie_locale(état), 1, délai, table)
+
+
+async def jouer_partie(client, idul, délai=0.1, coups_max=200):
+    '''def jouer_partie(client, idul, délai, coups_max)
+
+    Description:
+        Joue une partie complète contre le serveur, en tant que joueur 1.
+        Le coup est cherché dans le groupe de fils de calcul du client, sans bloquer
+        la boucle, avec une table de transposition propre à la partie.
+    Input:
+        client (ClientAsynchrone):
+            Le client à utiliser
+        idul (str):
+            L'identifiant IDUL du joueur
+        délai (float):
+            Le temps de réflexion par coup, en secondes (default: 0.1)
+        coups_max (int):
+            Le nombre de coups après lequel la partie est abandonnée (default: 200)
+    Return:
+        (dict):
+            'id', 'gagnant' (None si la partie est abandonnée ou interrompue par une
+            erreur), 'coups', 'durée' (en secondes) et 'erreur' (le message, s'il y a lieu)
+    '''
+    début = time.perf_counter()
+    rep = await client.débuter_partie(idul)
+    id_partie, état = rep['id'], rep['état']
+    résultat = {'id': id_partie, 'gagnant': None, 'coups': 0, 'erreur': None}
+    boucle = asyncio.get_running_loop()
+    table = transposition.TableTransposition(TAILLE_TABLE_PARTIE)
+    try:
+        while résultat['coups'] < coups_max:
+            type_coup, position = await boucle.run_in_executor(
+                client.calculs, choisir_coup, état, délai, table)
+            résultat['coups'] += 1
+            état = (await client.jouer_coup(id_partie, type_coup, position))['état']
+    except PartieTerminée as fin:
+        résultat['gagnant'] = fin.gagnant
+    except RuntimeError as erreur:
+        résultat['erreur'] = str(erreur)
+    résultat['durée'] = time.perf_counter() - début
+    return résultat
+
+
+async def jouer_parties(nombre, idul, client=None, délai=0.1, concurrence=20):
+    '''def jouer_parties(nombre, idul, client, délai, concurrence)
+
+    Description:
+        Joue plusieurs parties en parallèle sur une même boucle d'événements
+    Input:
+        nombre (int):
+            Le nombre de parties à jouer
+        idul (str):
+            L'identifiant IDUL du joueur
+        client (ClientAsynchrone):
+            Le client à utiliser (default: None, un client créé puis fermé ici)
+        délai (float):
+            Le temps de réflexion par coup, en secondes (default: 0.1)
+        concurrence (int):
+            Le nombre maximal d'appels simultanés d'un nouveau client (default: 20)
+    Return:
+        (list):
+            Le résultat de chaque partie (voir jouer_partie)
+    '''
+    propre = client is None
+    if propre:
+        client = ClientAsynchrone(concurrence=concurrence)
+    try:
+        return await asyncio.gather(*[jouer_partie(client, idul, délai)
+                                      for _ in range(nombre)])
+    finally:
+        if propre:
+            client.fermer()
+
+
+class TestClientAsynchrone(unittest.TestCase):
+    """classe test ClientAsynchrone, contre un serveur factice local"""
+
+    def setUp(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        from urllib.parse import parse_qs, unquote, urlsplit
+        parties = {}
+        verrou = threading.Lock()
+        # requêtes en cours de traitement, et leur nombre maximal
+        self.charge = charge = {'en_cours': 0, 'maximum': 0}
+
+        class Gestionnaire(BaseHTTPRequestHandler):
+            # HTTP/1.1: la connexion reste ouverte entre les requêtes
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def répondre(self, contenu):
+                # chaque requête prend 50 ms, comme un serveur distant
+                with verrou:
+                    charge['en_cours'] += 1
+                    charge['maximum'] = max(charge['maximum'], charge['en_cours'])
+                time.sleep(0.05)
+                with verrou:
+                    charge['en_cours'] -= 1
+                corps = json.dumps(contenu).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(corps)))
+                self.end_headers()
+                self.wfile.write(corps)
+
+            def do_POST(self):
+                longueur = int(self.headers['Content-Length'])
+                données = parse_qs(self.rfile.read(longueur).decode('utf-8'))
+                if unquote(urlsplit(self.path).path).endswith('débuter/'):
+                    with verrou:
+                        id_partie = str(len(parties))
+                        parties[id_partie] = quoridor.Quoridor([données['idul'][0], 'automate'])
+                    self.répondre({'id': id_partie, 'état': parties[id_partie].état_partie()})
+                    return
+                jeu = parties[données['id'][0]]
+                position = tuple(int(valeur) for valeur in données['pos'])
+                try:
+                    if données['type'][0] == 'D':
+                        jeu.déplacer_jeton(1, position)
+                    else:
+                        jeu.placer_mur(1, position, 'horizontal' if données['type'][0] == 'MH'
+                                       else 'vertical')
+                except quoridor.QuoridorError as erreur:
+                    self.répondre({'message': str(erreur)})
+                    return
+                # l'automate du serveur ne fait que se déplacer latéralement
+                if jeu.partie_terminée():
+                    self.répondre({'gagnant': jeu.partie_terminée()})
+                    return
+                x = jeu.joueurs[1]['pos'][0]
+                jeu.déplacer_jeton(2, (x + 1 if x < 9 else x - 1, 9))
+                self.répondre({'état': jeu.état_partie()})
+
+        self.serveur = ThreadingHTTPServer(('127.0.0.1', 0), Gestionnaire)
+        threading.Thread(target=self.serveur.serve_forever, daemon=True).start()
+        self.client = ClientAsynchrone(api.ClientQuoridor('http://127.0.0.1:{}/'.format(
+            self.serveur.server_address[1]), connexions=10), concurrence=10)
+
+
+    def tearDown(self):
+        self.client.fermer()
+        self.serveur.shutdown()
+        self.serveur.server_close()
+
+
+    def test_jouer_parties(self):
+        """ Test du client asynchrone
+            Cas à tester:
+                - plusieurs parties sont jouées jusqu'à la victoire en parallèle
+                - les appels se chevauchent (plusieurs requêtes en cours à la fois)
+                - RuntimeError pour un message, PartieTerminée pour un gagnant
+        """
+        résultats = asyncio.run(jouer_parties(10, 'idul', self.client, délai=0.01))
+        self.assertEqual([résultat['gagnant'] for résultat in résultats], ['idul'] * 10)
+        self.assertGreater(self.charge['maximum'], 1)
+        self.assertEqual(self.client.métriques()['jouer/']['appels'],
+                         sum(résultat['coups'] for résultat in résultats))
+
+        async def erreurs():
+            rep = await self.client.débuter_partie('idul')
+            with self.assertRaises(RuntimeError):
+                await self.client.jouer_coup(rep['id'], 'D', (1, 1))
+            for y in range(2, 9):
+                await self.client.jouer_coup(rep['id'], 'D', (5, y))
+            with self.assertRaises(PartieTerminée) as fin:
+                await self.client.jouer_coup(rep['id'], 'D', (5, 9))
+            self.assertEqual(fin.exception.gagnant, 'idul')
+        asyncio.run(erreurs())
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
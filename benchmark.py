@@ -0,0 +1,390 @@
+""" benchmark.py
+Module qui mesure la vitesse des opérations les plus fréquentes de Quoridor sur
+un corpus de positions générées (toujours les mêmes pour une même graine).
+Chaque opération est chronométrée individuellement; le rapport donne le nombre
+d'opérations par seconde et les centiles de la durée d'une opération.
+Un rapport peut être sauvegardé comme référence, puis comparé aux mesures suivantes
+pour signaler les régressions:
+    python benchmark.py --sauver reference.json
+    python benchmark.py --comparer reference.json
+contient les fonctions:
+    - générer_corpus
+        positions atteintes par des parties jouées au hasard
+    - mesurer
+        chronomètre les opérations sur le corpus
+    - comparer
+        régressions d'un rapport par rapport à une référence
+    - sauvegarder, charger
+contient les constantes:
+    - BANCS
+"""
+import argparse
+import copy
+import json
+import platform
+import random
+import sys
+import time
+import unittest
+
+import ia
+import quoridor
+import tournoi
+
+
+# une opération est en régression si sa durée médiane augmente de plus de 10%
+SEUIL = 0.10
+
+
+def générer_corpus(taille=200, graine=1901):
+    """Génère des positions en jouant des parties au hasard
+    Arguments:
+        taille {int} -- le nombre de positions (default: {200})
+        graine {int} -- la graine du générateur (default: {1901})
+    Return:
+        list -- des tuples (état, joueur): une copie de état_partie() et le joueur
+            qui a le trait. Les positions gagnées ne sont pas gardées.
+    """
+    hasard = random.Random(graine)
+    corpus = []
+    while len(corpus) < taille:
+        jeu = quoridor.Quoridor(["joueur1", "joueur2"], moteur='bits')
+        coups = 0
+        while len(corpus) < taille and not jeu.partie_terminée():
+            joueur = (coups % 2) + 1
+            corpus.append((jeu.état_partie(), joueur))
+            tournoi.jouer_hasard(jeu, joueur, hasard, {'déplacement': 0.8})
+            coups += 1
+    return corpus
+
+
+def partie(état, moteur):
+    """Construit une partie à partir d'une position du corpus, son moteur déjà prêt"""
+    jeu = quoridor.Quoridor.depuis_état(état, moteur)
+    jeu.moteur()
+    return jeu
+
+
+def banc_construire_graphe(corpus, options):
+    """construire_graphe sur chaque position"""
+    durées = []
+    for état, _ in corpus:
+        début = time.perf_counter()
+        quoridor.construire_graphe([joueur['pos'] for joueur in état['joueurs']],
+                                   état['murs']['horizontaux'], état['murs']['verticaux'])
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def banc_construire_partie(corpus, options):
+    """Quoridor(joueurs, murs) sur chaque position: le constructeur qui valide l'état"""
+    durées = []
+    for état, _ in corpus:
+        début = time.perf_counter()
+        quoridor.Quoridor(état['joueurs'], état['murs'], options['moteur'])
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def banc_depuis_état(corpus, options):
+    """Quoridor.depuis_état sur chaque position: l'état est fiable, rien n'est validé"""
+    durées = []
+    for état, _ in corpus:
+        début = time.perf_counter()
+        quoridor.Quoridor.depuis_état(état, options['moteur'])
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def banc_charger_parties(corpus, options):
+    """charger_parties sur tout le corpus d'un coup, la durée répartie entre les positions"""
+    états = [état for état, _ in corpus]
+    début = time.perf_counter()
+    quoridor.charger_parties(états, options['moteur'])
+    return [(time.perf_counter() - début) / len(états)] * len(états)
+
+
+def banc_déplacer_jeton(corpus, options):
+    """déplacer_jeton vers une case permise choisie au hasard, dans une nouvelle partie par position"""
+    hasard = random.Random(options['graine'])
+    durées = []
+    for état, joueur in corpus:
+        jeu = partie(état, options['moteur'])
+        position = hasard.choice(sorted(jeu.moteur().successeurs(état['joueurs'][joueur - 1]['pos'])))
+        début = time.perf_counter()
+        jeu.déplacer_jeton(joueur, position)
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def banc_placer_mur(corpus, options):
+    """placer_mur d'un mur permis choisi au hasard"""
+    hasard = random.Random(options['graine'])
+    durées = []
+    for état, joueur in corpus:
+        jeu = partie(état, options['moteur'])
+        murs = jeu.murs_valides(joueur)
+        if not murs:
+            continue
+        position, orientation = hasard.choice(murs)
+        début = time.perf_counter()
+        jeu.placer_mur(joueur, position, orientation)
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def murs_refusés(état):
+    """Des murs que placer_mur doit refuser dans une position: hors du damier,
+    sur un mur existant, le chevauchant d'un côté ou de l'autre, ou le croisant
+    """
+    refusés = [((9, 5), 'horizontal'), ((5, 9), 'vertical')]
+    for x, y in état['murs']['horizontaux']:
+        refusés += [((x, y), 'horizontal'), ((x + 1, y), 'horizontal'),
+                    ((x - 1, y), 'horizontal'), ((x + 1, y - 1), 'vertical')]
+    for x, y in état['murs']['verticaux']:
+        refusés += [((x, y), 'vertical'), ((x, y + 1), 'vertical'),
+                    ((x, y - 1), 'vertical'), ((x - 1, y + 1), 'horizontal')]
+    return refusés
+
+
+def banc_placer_mur_refusé(corpus, options):
+    """placer_mur d'un mur refusé choisi au hasard"""
+    hasard = random.Random(options['graine'])
+    durées = []
+    for état, joueur in corpus:
+        jeu = partie(état, options['moteur'])
+        if jeu.joueurs[(joueur - 1)]['murs'] <= 0:
+            continue
+        position, orientation = hasard.choice(murs_refusés(état))
+        début = time.perf_counter()
+        try:
+            jeu.placer_mur(joueur, position, orientation)
+        except quoridor.QuoridorError:
+            pass
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def banc_jouer_coup(corpus, options):
+    """jouer_coup à profondeur fixe, sans livre d'ouvertures, la table de transposition
+    vidée avant chaque coup"""
+    durées = []
+    for état, joueur in corpus[::options['pas_jouer_coup']]:
+        jeu = partie(état, options['moteur'])
+        ia.TABLE.vider()
+        début = time.perf_counter()
+        jeu.jouer_coup(joueur, 60.0, options['profondeur'], livre=False)
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def banc_partie_terminée(corpus, options):
+    """partie_terminée sur chaque position"""
+    durées = []
+    for état, _ in corpus:
+        jeu = partie(état, options['moteur'])
+        début = time.perf_counter()
+        jeu.partie_terminée()
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+def banc_afficher(corpus, options):
+    """Quoridor.__str__ sur chaque position"""
+    durées = []
+    for état, _ in corpus:
+        jeu = partie(état, options['moteur'])
+        début = time.perf_counter()
+        str(jeu)
+        durées.append(time.perf_counter() - début)
+    return durées
+
+
+# opérations mesurées: fonction(corpus, options) qui retourne la durée de chaque opération
+BANCS = {
+    'construire_graphe': banc_construire_graphe,
+    'Quoridor()': banc_construire_partie,
+    'depuis_état': banc_depuis_état,
+    'charger_parties': banc_charger_parties,
+    'déplacer_jeton': banc_déplacer_jeton,
+    'placer_mur': banc_placer_mur,
+    'placer_mur_refusé': banc_placer_mur_refusé,
+    'jouer_coup': banc_jouer_coup,
+    'partie_terminée': banc_partie_terminée,
+    '__str__': banc_afficher,
+}
+
+
+def _centile(durées, centile):
+    """Donne le centile (0 à 100) d'une liste triée de durées"""
+    return durées[min(len(durées) - 1, int(len(durées) * centile / 100))]
+
+
+def statistiques(durées):
+    """Résume une liste de durées en secondes
+    Return:
+        dict -- 'opérations', 'ops_par_seconde', et les centiles 'p50', 'p90', 'p99'
+            et 'max' en microsecondes
+    """
+    durées = sorted(durées)
+    return {
+        'opérations': len(durées),
+        'ops_par_seconde': len(durées) / sum(durées) if sum(durées) else 0.0,
+        'p50': 1e6 * _centile(durées, 50),
+        'p90': 1e6 * _centile(durées, 90),
+        'p99': 1e6 * _centile(durées, 99),
+        'max': 1e6 * durées[-1],
+    }
+
+
+def mesurer(noms=None, taille=200, graine=1901, répétitions=3, moteur='networkx',
+            profondeur=1, pas_jouer_coup=5):
+    """Chronomètre les opérations sur le corpus
+    Un premier passage sur le corpus, non compté, réchauffe les caches.
+    Keyword Arguments:
+        noms {list} -- les opérations à mesurer (default: {None}, toutes celles de BANCS)
+        taille {int} -- le nombre de positions du corpus (default: {200})
+        graine {int} -- la graine du corpus (default: {1901})
+        répétitions {int} -- le nombre de passages comptés sur le corpus (default: {3})
+        moteur {str} -- le moteur des parties (default: {'networkx'})
+        profondeur {int} -- la profondeur de recherche de jouer_coup (default: {1})
+        pas_jouer_coup {int} -- jouer_coup n'est mesuré que sur une position sur
+            pas_jouer_coup, parce qu'il est beaucoup plus lent (default: {5})
+    Return:
+        dict -- 'configuration' et 'résultats' (les statistiques de chaque opération)
+    """
+    noms = list(BANCS) if noms is None else noms
+    corpus = générer_corpus(taille, graine)
+    options = {'graine': graine, 'moteur': moteur, 'profondeur': profondeur,
+               'pas_jouer_coup': pas_jouer_coup}
+    résultats = {}
+    for nom in noms:
+        BANCS[nom](corpus[:10], options)
+        durées = []
+        for _ in range(répétitions):
+            durées += BANCS[nom](corpus, options)
+        résultats[nom] = statistiques(durées)
+    return {
+        'configuration': {'taille': taille, 'graine': graine, 'répétitions': répétitions,
+                          'moteur': moteur, 'profondeur': profondeur,
+                          'python': platform.python_version(), 'machine': platform.machine()},
+        'résultats': résultats,
+    }
+
+
+def comparer(rapport, référence, seuil=SEUIL):
+    """Trouve les opérations plus lentes que dans la référence
+    La comparaison se fait sur la durée médiane, moins sensible aux interruptions
+    de la machine que la moyenne.
+    Arguments:
+        rapport {dict} -- les mesures actuelles (voir mesurer)
+        référence {dict} -- les mesures de référence
+    Keyword Arguments:
+        seuil {float} -- la hausse relative tolérée (default: {SEUIL})
+    Return:
+        list -- des tuples (nom, médiane de référence, médiane actuelle, variation relative)
+    """
+    régressions = []
+    for nom, mesure in rapport['résultats'].items():
+        if nom not in référence['résultats']:
+            continue
+        ancienne = référence['résultats'][nom]['p50']
+        variation = (mesure['p50'] - ancienne) / ancienne if ancienne else 0.0
+        if variation > seuil:
+            régressions.append((nom, ancienne, mesure['p50'], variation))
+    return régressions
+
+
+def sauvegarder(rapport, chemin):
+    """Écrit un rapport en JSON"""
+    with open(chemin, 'w', encoding='utf-8') as fichier:
+        json.dump(rapport, fichier, ensure_ascii=False, indent=2)
+
+
+def charger(chemin):
+    """Lit un rapport écrit par sauvegarder"""
+    with open(chemin, encoding='utf-8') as fichier:
+        return json.load(fichier)
+
+
+def afficher(rapport, référence=None):
+    """Affiche un rapport, avec la variation par rapport à la référence s'il y en a une"""
+    print("{:<20} {:>8} {:>12} {:>10} {:>10} {:>10}".format(
+        "opération", "nombre", "ops/s", "p50 (us)", "p90 (us)", "p99 (us)"))
+    for nom, mesure in rapport['résultats'].items():
+        ligne = "{:<20} {:>8} {:>12.0f} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+            nom, mesure['opérations'], mesure['ops_par_seconde'],
+            mesure['p50'], mesure['p90'], mesure['p99'])
+        if référence is not None and nom in référence['résultats']:
+            ancienne = référence['résultats'][nom]['p50']
+            ligne += " {:+7.1%}".format((mesure['p50'] - ancienne) / ancienne)
+        print(ligne)
+
+
+def analyser_commande():
+    """Lit les arguments de la ligne de commande"""
+    analyseur = argparse.ArgumentParser(description="Mesure de la vitesse de Quoridor")
+    analyseur.add_argument('bancs', nargs='*',
+                           help="les opérations à mesurer (toutes par défaut): "
+                           + ", ".join(BANCS))
+    analyseur.add_argument('--taille', type=int, default=200, help="taille du corpus")
+    analyseur.add_argument('--graine', type=int, default=1901, help="graine du corpus")
+    analyseur.add_argument('--répétitions', type=int, default=3)
+    analyseur.add_argument('--moteur', default='networkx', choices=sorted(quoridor.MOTEURS))
+    analyseur.add_argument('--profondeur', type=int, default=1,
+                           help="profondeur de recherche de jouer_coup")
+    analyseur.add_argument('--sauver', help="fichier où écrire le rapport de référence")
+    analyseur.add_argument('--comparer', help="rapport de référence à comparer")
+    analyseur.add_argument('--seuil', type=float, default=SEUIL,
+                           help="hausse relative de la médiane tolérée")
+    arguments = analyseur.parse_args()
+    inconnus = [nom for nom in arguments.bancs if nom not in BANCS]
+    if inconnus:
+        analyseur.error("banc inconnu: {} (choisir parmi {})".format(
+            ", ".join(inconnus), ", ".join(BANCS)))
+    return arguments
+
+
+class TestBenchmark(unittest.TestCase):
+    """classe test benchmark"""
+
+    def test_mesurer(self):
+        """ Test des mesures et de la comparaison
+            Cas à tester:
+                - le corpus est le même pour une même graine
+                - toutes les opérations sont mesurées
+                - une référence plus rapide fait apparaître une régression
+                - un rapport sauvegardé est relu tel quel
+        """
+        import os
+        import tempfile
+        self.assertEqual(générer_corpus(15, 3), générer_corpus(15, 3))
+        rapport = mesurer(taille=15, répétitions=1, moteur='bits')
+        self.assertEqual(set(rapport['résultats']), set(BANCS))
+        for mesure in rapport['résultats'].values():
+            self.assertGreater(mesure['opérations'], 0)
+            self.assertLessEqual(mesure['p50'], mesure['p99'])
+        self.assertEqual(comparer(rapport, rapport), [])
+        référence = copy.deepcopy(rapport)
+        référence['résultats']['__str__']['p50'] /= 2
+        self.assertEqual([régression[0] for régression in comparer(rapport, référence)],
+                         ['__str__'])
+        with tempfile.TemporaryDirectory() as dossier:
+            sauvegarder(rapport, os.path.join(dossier, 'reference.json'))
+            self.assertEqual(charger(os.path.join(dossier, 'reference.json')), rapport)
+
+
+if __name__ == '__main__':
+    COM = analyser_commande()
+    RAPPORT = mesurer(COM.bancs or None, COM.taille, COM.graine, COM.répétitions,
+                      COM.moteur, COM.profondeur)
+    RÉFÉRENCE = charger(COM.comparer) if COM.comparer else None
+    afficher(RAPPORT, RÉFÉRENCE)
+    if COM.sauver:
+        sauvegarder(RAPPORT, COM.sauver)
+    if RÉFÉRENCE is not None:
+        RÉGRESSIONS = comparer(RAPPORT, RÉFÉRENCE, COM.seuil)
+        for NOM, ANCIENNE, NOUVELLE, VARIATION in RÉGRESSIONS:
+            print("RÉGRESSION {}: {:.1f} us -> {:.1f} us ({:+.1%})".format(
+                NOM, ANCIENNE, NOUVELLE, VARIATION))
+        sys.exit(1 if RÉGRESSIONS else 0)
@@ -0,0 +1,324 @@
+""" diffusion.py
+Module de diffusion d'une partie en direct aux spectateurs.
+Plutôt que l'état complet après chaque coup, une partie émet des deltas (voir
+Quoridor.abonner): (séquence, sorte, joueur, type_coup, position, ancienne).
+Un spectateur part d'un instantané (l'état et le numéro de séquence du dernier delta,
+voir départ_diffusion) et applique les deltas suivants, dans l'ordre.
+Le Diffuseur relaie les deltas d'une partie à un nombre quelconque d'abonnés, chacun
+avec sa propre file: la partie ne fait que déposer le delta dans chaque file, sans
+jamais attendre. Un abonné trop lent dont la file est pleine reçoit un nouvel instantané
+à la place des deltas qu'il n'a pas lus.
+Sur un fichier ou un socket, un message est une trame d'octets (voir trame):
+    - delta: b'D', puis la séquence (4 octets), le joueur et la sorte (1 octet),
+      le coup (plateau.coder_coup) et l'ancienne case du jeton (AUCUNE pour un mur)
+    - instantané: b'S', puis la longueur (4 octets) et l'instantané en JSON
+contient les fonctions:
+    - départ_diffusion
+        donne l'instantané de départ d'un spectateur
+    - appliquer_delta
+        applique un delta à un état (dictionnaire de état_partie)
+    - trame, lire_trames
+        conversion des messages en octets et lecture d'un flux de trames
+contient les classes:
+    - Spectateur
+    - Abonnement
+    - Diffuseur
+"""
+import copy
+import json
+import queue
+import struct
+import threading
+import unittest
+
+import plateau
+
+
+# trame d'un delta: séquence, joueur (bit 0) et annulation (bit 1), coup, ancienne case
+TRAME_DELTA = struct.Struct('<IBBB')
+# longueur d'un instantané
+TRAME_LONGUEUR = struct.Struct('<I')
+# ancienne case d'un mur
+AUCUNE = 0xFF
+# bit d'annulation dans l'octet du joueur
+ANNULÉ = 0x02
+
+
+def départ_diffusion(jeu):
+    """Donne une copie de l'état de la partie et le numéro du dernier delta émis
+    À ne pas confondre avec Quoridor.instantané, qui ne contient pas le numéro de séquence.
+    Doit être appelé dans le fil qui joue la partie (ou lorsqu'elle est arrêtée).
+    Return:
+        dict -- {'séquence': int, 'état': dict de état_partie}
+    """
+    return {'séquence': jeu.séquence, 'état': jeu.état_partie()}
+
+
+def appliquer_delta(état, delta):
+    """Applique un delta à un état (modifié sur place)
+    Arguments:
+        état {dict} -- l'état, au format de état_partie
+        delta {tuple} -- (séquence, sorte, joueur, type_coup, position, ancienne)
+    """
+    _, sorte, joueur, type_coup, position, ancienne = delta
+    infos = état['joueurs'][joueur - 1]
+    if type_coup == 'D':
+        infos['pos'] = tuple(position) if sorte == 'coup' else tuple(ancienne)
+        return
+    murs = état['murs']['horizontaux' if type_coup == 'MH' else 'verticaux']
+    if sorte == 'coup':
+        murs.append(tuple(position))
+        infos['murs'] -= 1
+    else:
+        murs.remove(tuple(position))
+        infos['murs'] += 1
+
+
+def trame(message):
+    """Convertit un message ('delta', delta) ou ('instantané', instantané) en octets"""
+    sorte, contenu = message
+    if sorte == 'delta':
+        séquence, genre, joueur, type_coup, position, ancienne = contenu
+        return b'D' + TRAME_DELTA.pack(
+            séquence, (joueur - 1) | (ANNULÉ if genre == 'annulé' else 0),
+            plateau.coder_coup((type_coup, position)),
+            AUCUNE if ancienne is None else plateau.case(ancienne))
+    corps = json.dumps(contenu).encode('utf-8')
+    return b'S' + TRAME_LONGUEUR.pack(len(corps)) + corps
+
+
+def lire_trames(fichier):
+    """Génère les messages d'un flux de trames (fichier ou socket.makefile('rb'))
+    Raises:
+        ValueError -- si une trame est invalide ou tronquée
+    """
+    while True:
+        genre = fichier.read(1)
+        if not genre:
+            return
+        if genre == b'D':
+            octets = fichier.read(TRAME_DELTA.size)
+            if len(octets) != TRAME_DELTA.size:
+                raise ValueError("trame tronquée")
+            séquence, joueur, code, ancienne = TRAME_DELTA.unpack(octets)
+            type_coup, position = plateau.décoder_coup(code)
+            yield ('delta', (séquence, 'annulé' if joueur & ANNULÉ else 'coup',
+                             (joueur & 1) + 1, type_coup, position,
+                             None if ancienne == AUCUNE else plateau.position(ancienne)))
+        elif genre == b'S':
+            longueur, = TRAME_LONGUEUR.unpack(fichier.read(TRAME_LONGUEUR.size))
+            corps = fichier.read(longueur)
+            if len(corps) != longueur:
+                raise ValueError("trame tronquée")
+            contenu = json.loads(corps.decode('utf-8'))
+            # JSON n'a pas de tuples
+            for joueur in contenu['état']['joueurs']:
+                joueur['pos'] = tuple(joueur['pos'])
+            for orientation in ('horizontaux', 'verticaux'):
+                contenu['état']['murs'][orientation] = [
+                    tuple(mur) for mur in contenu['état']['murs'][orientation]]
+            yield ('instantané', contenu)
+        else:
+            raise ValueError("trame invalide: {!r}".format(genre))
+
+
+class Spectateur:
+    """Spectateur
+    État d'une partie reconstruit à partir d'un instantané et des deltas suivants.
+    Attributs:
+        état {dict} -- l'état de la partie, au format de état_partie
+        séquence {int} -- le numéro du dernier delta appliqué
+    """
+
+    def __init__(self, départ):
+        """
+        Arguments:
+            départ {dict} -- un instantané (voir départ_diffusion)
+        """
+        self.séquence = départ['séquence']
+        # copie: l'instantané peut être partagé
+        self.état = copy.deepcopy(départ['état'])
+
+
+    def recevoir(self, message):
+        """Applique un message ('delta', delta) ou ('instantané', instantané)
+        Un delta déjà compris dans l'état est ignoré.
+        Raises:
+            ValueError -- si un delta manque (le spectateur doit être resynchronisé)
+        """
+        sorte, contenu = message
+        if sorte == 'instantané':
+            self.séquence = contenu['séquence']
+            self.état = copy.deepcopy(contenu['état'])
+            return
+        if contenu[0] <= self.séquence:
+            return
+        if contenu[0] != self.séquence + 1:
+            raise ValueError("delta manquant: {} attendu, {} reçu".format(
+                self.séquence + 1, contenu[0]))
+        appliquer_delta(self.état, contenu)
+        self.séquence = contenu[0]
+
+
+class Abonnement:
+    """Abonnement
+    Les messages destinés à un abonné du Diffuseur.
+    Attributs:
+        départ {dict} -- l'instantané au moment de l'abonnement
+        file {queue.Queue} -- les messages ('delta', delta) et ('instantané', instantané),
+            puis None lorsque la diffusion est terminée
+        décrochages {int} -- le nombre de fois où la file était pleine
+    """
+
+    def __init__(self, départ, taille_file):
+        self.départ = départ
+        self.file = queue.Queue(taille_file)
+        self.décrochages = 0
+
+
+    def messages(self, délai=None):
+        """Génère les messages jusqu'à la fin de la diffusion
+        Keyword Arguments:
+            délai {float} -- l'attente maximale d'un message, en secondes (default: {None})
+        Raises:
+            queue.Empty -- si aucun message n'arrive dans le délai
+        """
+        while True:
+            message = self.file.get(timeout=délai)
+            if message is None:
+                return
+            yield message
+
+
+class Diffuseur:
+    """Diffuseur
+    Relaie les deltas d'une partie à ses abonnés, sans jamais bloquer la partie.
+    Attributs:
+        jeu {Quoridor} -- la partie diffusée
+        taille_file {int} -- le nombre de messages en attente par abonné
+    """
+
+    def __init__(self, jeu, taille_file=1024):
+        """
+        Arguments:
+            jeu {Quoridor} -- la partie à diffuser
+        Keyword Arguments:
+            taille_file {int} -- le nombre de messages en attente par abonné (default: {1024})
+        Raises:
+            ValueError -- si taille_file est plus petit que 2 (une file pleine doit
+                pouvoir recevoir l'instantané puis la fin de la diffusion)
+        """
+        if taille_file < 2:
+            raise ValueError("taille_file doit être d'au moins 2: {}".format(taille_file))
+        self.jeu = jeu
+        self.taille_file = taille_file
+        self.abonnements = []
+        self.verrou = threading.Lock()
+        jeu.abonner(self.relayer)
+
+
+    def abonner(self):
+        """Ajoute un abonné à partir de l'état actuel de la partie
+        Doit être appelé dans le fil qui joue la partie (ou lorsqu'elle est arrêtée).
+        Return:
+            Abonnement -- l'instantané de départ et la file des messages suivants
+        """
+        abonnement = Abonnement(départ_diffusion(self.jeu), self.taille_file)
+        with self.verrou:
+            self.abonnements.append(abonnement)
+        return abonnement
+
+
+    def désabonner(self, abonnement):
+        """Retire un abonné; sa file reçoit la fin de la diffusion"""
+        with self.verrou:
+            self.abonnements.remove(abonnement)
+        self._déposer(abonnement, None)
+
+
+    def relayer(self, delta):
+        """Observateur de la partie: dépose le delta dans la file de chaque abonné"""
+        with self.verrou:
+            abonnements = list(self.abonnements)
+        for abonnement in abonnements:
+            self._déposer(abonnement, ('delta', delta))
+
+
+    def _déposer(self, abonnement, message):
+        """Dépose un message sans attendre; une file pleine est remplacée par un instantané"""
+        try:
+            abonnement.file.put_nowait(message)
+        except queue.Full:
+            abonnement.décrochages += 1
+            # vider la file: l'instantané remplace tous les deltas non lus
+            try:
+                while True:
+                    abonnement.file.get_nowait()
+            except queue.Empty:
+                pass
+            abonnement.file.put_nowait(('instantané', départ_diffusion(self.jeu)))
+            if message is None:
+                abonnement.file.put_nowait(None)
+
+
+    def fermer(self):
+        """Arrête la diffusion: la partie n'est plus observée, chaque file reçoit la fin"""
+        self.jeu.désabonner(self.relayer)
+        with self.verrou:
+            abonnements, self.abonnements = self.abonnements, []
+        for abonnement in abonnements:
+            self._déposer(abonnement, None)
+
+
+class TestDiffusion(unittest.TestCase):
+    """classe test Diffuseur"""
+
+    def test_diffusion(self):
+        """ Test de la diffusion
+            Cas à tester:
+                - un spectateur reconstruit l'état à partir de l'instantané et des deltas
+                - les coups explorés par la recherche ne sont pas diffusés
+                - une annulation est diffusée
+                - une file de moins de 2 messages est refusée
+                - un abonné lent reçoit un instantané au lieu des deltas perdus
+                - les trames d'octets redonnent les mêmes messages
+        """
+        import io
+        import quoridor
+        jeu = quoridor.Quoridor(["joueur1", "joueur2"], moteur='bits')
+        jeu.déplacer_jeton(1, (5, 2))
+        with self.assertRaises(ValueError):
+            Diffuseur(jeu, taille_file=1)
+        diffuseur = Diffuseur(jeu)
+        rapide = diffuseur.abonner()
+        diffuseur.taille_file = 2
+        lent = diffuseur.abonner()
+        jeu.placer_mur(2, (4, 3), 'horizontal')
+        jeu.jouer_coup(1, 5.0, profondeur=1)
+        jeu.déplacer_jeton(2, (5, 8))
+        jeu.annuler_coup()
+        jeu.refaire_coup()
+        diffuseur.fermer()
+        self.assertEqual(jeu.séquence, 6)
+        messages = list(rapide.messages(1.0))
+        self.assertEqual([message[1][1] for message in messages],
+                         ['coup', 'coup', 'coup', 'annulé', 'coup'])
+        # file de 2 messages: pleine au 3e et au 5e delta
+        self.assertEqual(lent.décrochages, 2)
+        spectateur = Spectateur(rapide.départ)
+        for message in lire_trames(io.BytesIO(b''.join(trame(message) for message in messages))):
+            spectateur.recevoir(message)
+        self.assertEqual(spectateur.état, départ_diffusion(jeu)['état'])
+        spectateur = Spectateur(lent.départ)
+        for message in lent.messages(1.0):
+            spectateur.recevoir(message)
+        self.assertEqual(spectateur.état, départ_diffusion(jeu)['état'])
+        # un delta manquant est détecté
+        spectateur = Spectateur(rapide.départ)
+        with self.assertRaises(ValueError):
+            spectateur.recevoir(messages[1])
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
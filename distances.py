@@ -0,0 +1,319 @@
+""" distances.py
+Module qui tient à jour, pour chaque joueur, la distance de chacune des 81 cases à
+sa rangée objectif, en tenant compte des murs mais pas des jetons.
+Un mur ne fait que couper des passages: les distances ne peuvent qu'augmenter, et
+seulement dans la région qui passait par les passages coupés. Seule cette région
+est recalculée. Retirer un mur (annuler un coup) fait l'inverse: les distances
+ne peuvent que diminuer, à partir des passages rouverts.
+Les cases sont numérotées comme dans plateau.py: (x, y) -> (x-1) + 9*(y-1).
+contient les fonctions:
+    - champ_complet
+        calcule un champ de distances à partir de zéro (parcours en largeur)
+contient les classes:
+    - ChampsDistances
+"""
+import heapq
+import unittest
+from collections import deque
+
+
+# distance d'une case d'où l'objectif est inaccessible
+INACCESSIBLE = 1000
+# directions: nord (y+1), sud (y-1), est (x+1), ouest (x-1)
+NORD, SUD, EST, OUEST = range(4)
+OPPOSÉES = (SUD, NORD, OUEST, EST)
+DÉCALAGES = (9, -9, 1, -1)
+# rangée objectif (0 à 8) de chaque joueur
+RANGÉES = (8, 0)
+
+
+def _voisins_damier(case):
+    """Les (direction, voisin) d'une case qui restent sur le damier"""
+    x, y = case % 9, case // 9
+    voisins = []
+    if y < 8:
+        voisins.append((NORD, case + 9))
+    if y > 0:
+        voisins.append((SUD, case - 9))
+    if x < 8:
+        voisins.append((EST, case + 1))
+    if x > 0:
+        voisins.append((OUEST, case - 1))
+    return voisins
+
+
+# voisins de chaque case sur un damier vide
+VOISINS = [_voisins_damier(case) for case in range(81)]
+
+
+def passages(position, orientation):
+    """Donne les 2 passages coupés par un mur
+    Arguments:
+        position {tuple} -- le tuple (x, y) de la position du mur
+        orientation {str} -- 'horizontal' ou 'vertical'
+    Return:
+        list -- des tuples (case, direction, voisin)
+    """
+    x, y = position
+    if orientation == 'horizontal':
+        # entre (x, y-1) et (x, y), puis entre (x+1, y-1) et (x+1, y)
+        dessous = (x - 1) + 9 * (y - 2)
+        return [(dessous, NORD, dessous + 9), (dessous + 1, NORD, dessous + 10)]
+    # entre (x-1, y) et (x, y), puis entre (x-1, y+1) et (x, y+1)
+    gauche = (x - 2) + 9 * (y - 1)
+    return [(gauche, EST, gauche + 1), (gauche + 9, EST, gauche + 10)]
+
+
+def champ_complet(joueur, bloqués):
+    """Calcule le champ de distances d'un joueur à partir de zéro
+    Arguments:
+        joueur {int} -- le numéro du joueur (1 ou 2)
+        bloqués {list} -- pour chaque case, le nombre de murs dans chaque direction
+    Return:
+        list -- la distance de chaque case à la rangée objectif du joueur
+    """
+    champ = [INACCESSIBLE] * 81
+    file = deque()
+    for x in range(9):
+        case = x + 9 * RANGÉES[joueur - 1]
+        champ[case] = 0
+        file.append(case)
+    while file:
+        case = file.popleft()
+        for direction, voisin in VOISINS[case]:
+            if not bloqués[case][direction] and champ[voisin] == INACCESSIBLE:
+                champ[voisin] = champ[case] + 1
+                file.append(voisin)
+    return champ
+
+
+class ChampsDistances:
+    """ChampsDistances
+    Les champs de distances des deux joueurs pour un ensemble de murs.
+    Attributs:
+        champs {list} -- les 2 champs: champs[joueur - 1][case] est la distance de la case
+            à l'objectif du joueur (INACCESSIBLE si l'objectif ne peut être atteint)
+        bloqués {list} -- pour chaque case, le nombre de murs au nord, au sud, à l'est
+            et à l'ouest
+        ouverts {list} -- pour chaque case, les voisins qui ne sont pas derrière un mur
+        murh, murv {list} -- les murs pour lesquels les champs sont valides
+    """
+
+    def __init__(self, murs_horizontaux, murs_verticaux):
+        """
+        Arguments:
+            murs_horizontaux {list} -- une liste des positions (x,y) des murs horizontaux.
+            murs_verticaux {list} -- une liste des positions (x,y) des murs verticaux.
+        """
+        self.murh = [tuple(mur) for mur in murs_horizontaux]
+        self.murv = [tuple(mur) for mur in murs_verticaux]
+        self.bloqués = [[0, 0, 0, 0] for _ in range(81)]
+        self.ouverts = [[voisin for _, voisin in VOISINS[case]] for case in range(81)]
+        for mur in self.murh:
+            self._bloquer(mur, 'horizontal', 1)
+        for mur in self.murv:
+            self._bloquer(mur, 'vertical', 1)
+        self.champs = [champ_complet(1, self.bloqués), champ_complet(2, self.bloqués)]
+
+
+    def _bloquer(self, position, orientation, changement):
+        """Ajoute (1) ou retire (-1) un mur du compte des passages bloqués"""
+        coupés = passages(position, orientation)
+        for case, direction, voisin in coupés:
+            for départ, sens, arrivée in ((case, direction, voisin),
+                                          (voisin, OPPOSÉES[direction], case)):
+                self.bloqués[départ][sens] += changement
+                # le passage se ferme au premier mur et se rouvre quand il n'y en a plus
+                if changement > 0 and self.bloqués[départ][sens] == 1:
+                    self.ouverts[départ].remove(arrivée)
+                elif changement < 0 and self.bloqués[départ][sens] == 0:
+                    self.ouverts[départ].append(arrivée)
+        return coupés
+
+
+    def distance(self, joueur, position):
+        """Donne la distance d'une position (x, y) à l'objectif du joueur"""
+        return self.champs[joueur - 1][(position[0] - 1) + 9 * (position[1] - 1)]
+
+
+    def chemin(self, joueur, position):
+        """Donne un plus court chemin vers l'objectif en descendant le champ de distances,
+        sans recherche: chaque pas va vers un voisin plus proche d'une unité.
+        Les jetons sont ignorés (ils ne bloquent jamais l'accès à l'objectif, grâce aux sauts).
+        Arguments:
+            joueur {int} -- le numéro du joueur (1 ou 2)
+            position {tuple} -- la position (x, y) de départ
+        Return:
+            list -- les positions (x, y) du chemin, suivies de 'B1' ou 'B2' comme
+                Quoridor.chemin, ou None si l'objectif est inaccessible
+        """
+        champ = self.champs[joueur - 1]
+        case = (position[0] - 1) + 9 * (position[1] - 1)
+        if champ[case] >= INACCESSIBLE:
+            return None
+        chemin = [tuple(position)]
+        while champ[case]:
+            case = next(voisin for voisin in self.ouverts[case]
+                        if champ[voisin] == champ[case] - 1)
+            chemin.append((case % 9 + 1, case // 9 + 1))
+        chemin.append('B1' if joueur == 1 else 'B2')
+        return chemin
+
+
+    def ajouter_mur(self, position, orientation):
+        """Ajoute un mur et recalcule les distances de la région touchée
+        Arguments:
+            position {tuple} -- le tuple (x, y) de la position du mur
+            orientation {str} -- 'horizontal' ou 'vertical'
+        """
+        coupés = self._bloquer(position, orientation, 1)
+        if orientation == 'horizontal':
+            self.murh.append(tuple(position))
+        else:
+            self.murv.append(tuple(position))
+        for champ in self.champs:
+            # seul un passage entre deux distances consécutives pouvait servir à un plus
+            # court chemin: la case la plus éloignée de l'objectif est peut-être touchée
+            départs = [voisin if champ[voisin] > champ[case] else case
+                       for case, _, voisin in coupés if abs(champ[case] - champ[voisin]) == 1]
+            if départs:
+                self._augmenter(champ, départs)
+
+
+    def retirer_mur(self, position, orientation):
+        """Retire un mur et propage les distances raccourcies
+        Arguments:
+            position {tuple} -- le tuple (x, y) de la position du mur
+            orientation {str} -- 'horizontal' ou 'vertical'
+        """
+        rouverts = self._bloquer(position, orientation, -1)
+        murs = self.murh if orientation == 'horizontal' else self.murv
+        # le mur retiré est presque toujours le dernier placé
+        if murs[-1] == tuple(position):
+            murs.pop()
+        else:
+            murs.remove(tuple(position))
+        for champ in self.champs:
+            self._diminuer(champ, rouverts)
+
+
+    def _augmenter(self, champ, départs):
+        """Recalcule les distances des cases qui ont perdu leur plus court chemin
+        Arguments:
+            champ {list} -- le champ à corriger (modifié sur place)
+            départs {list} -- les cases qui ont perdu un passage vers une case plus proche
+        """
+        # 1. les cases sans voisin plus proche de l'objectif doivent être recalculées,
+        #    et leurs voisins qui passaient par elles aussi
+        invalides = set()
+        pile = list(départs)
+        while pile:
+            case = pile.pop()
+            distance = champ[case]
+            if case in invalides or distance == 0 or distance == INACCESSIBLE:
+                continue
+            ouverts = self.ouverts[case]
+            if any(champ[voisin] == distance - 1 and voisin not in invalides
+                   for voisin in ouverts):
+                continue
+            invalides.add(case)
+            pile.extend(voisin for voisin in ouverts if champ[voisin] == distance + 1)
+        if not invalides:
+            return
+        # 2. repartir des cases valides qui bordent la région (Dijkstra à poids unitaires)
+        tas = []
+        for case in invalides:
+            bordure = [champ[voisin] + 1 for voisin in self.ouverts[case]
+                       if voisin not in invalides]
+            champ[case] = min(bordure, default=INACCESSIBLE)
+            if champ[case] < INACCESSIBLE:
+                heapq.heappush(tas, (champ[case], case))
+        while tas:
+            distance, case = heapq.heappop(tas)
+            if distance != champ[case]:
+                continue
+            for voisin in self.ouverts[case]:
+                if voisin in invalides and champ[voisin] > distance + 1:
+                    champ[voisin] = distance + 1
+                    heapq.heappush(tas, (distance + 1, voisin))
+
+
+    def _diminuer(self, champ, rouverts):
+        """Propage les distances raccourcies par des passages rouverts
+        Arguments:
+            champ {list} -- le champ à corriger (modifié sur place)
+            rouverts {list} -- les passages (case, direction, voisin) rouverts
+        """
+        tas = []
+        for case, _, voisin in rouverts:
+            for départ, arrivée in ((case, voisin), (voisin, case)):
+                if champ[départ] + 1 < champ[arrivée]:
+                    champ[arrivée] = champ[départ] + 1
+                    heapq.heappush(tas, (champ[arrivée], arrivée))
+        while tas:
+            distance, case = heapq.heappop(tas)
+            if distance != champ[case]:
+                continue
+            for voisin in self.ouverts[case]:
+                if champ[voisin] > distance + 1:
+                    champ[voisin] = distance + 1
+                    heapq.heappush(tas, (distance + 1, voisin))
+
+
+class TestChampsDistances(unittest.TestCase):
+    """classe test ChampsDistances"""
+
+    def test_incrémental(self):
+        """ Test des champs tenus à jour
+            Cas à tester:
+                - après chaque mur ajouté ou retiré, les champs sont égaux à ceux
+                  calculés à partir de zéro
+                - une case enfermée est INACCESSIBLE
+                - les distances suivent les plus courts chemins de Quoridor
+        """
+        import random
+        import quoridor
+        hasard = random.Random(5)
+        for _ in range(20):
+            champs = ChampsDistances([], [])
+            posés = []
+            for _ in range(hasard.randint(1, 20)):
+                # les murs peuvent enfermer des régions: les champs doivent rester exacts
+                orientation = hasard.choice(('horizontal', 'vertical'))
+                if orientation == 'horizontal':
+                    position = (hasard.randint(1, 8), hasard.randint(2, 9))
+                else:
+                    position = (hasard.randint(2, 9), hasard.randint(1, 8))
+                if any(champs.bloqués[case][direction]
+                       for case, direction, _ in passages(position, orientation)):
+                    continue
+                champs.ajouter_mur(position, orientation)
+                posés.append((position, orientation))
+                self.assertEqual(champs.champs, ChampsDistances(champs.murh, champs.murv).champs)
+            while posés:
+                champs.retirer_mur(*posés.pop(hasard.randrange(len(posés))))
+                self.assertEqual(champs.champs, ChampsDistances(champs.murh, champs.murv).champs)
+            self.assertEqual(champs.champs, ChampsDistances([], []).champs)
+        # enfermer le coin (1, 1)
+        champs = ChampsDistances([(1, 2)], [(2, 1)])
+        self.assertEqual(champs.distance(1, (1, 1)), INACCESSIBLE)
+        # (1, 1) est sur la rangée objectif du joueur 2
+        self.assertEqual(champs.distance(2, (1, 1)), 0)
+        self.assertEqual(champs.distance(2, (1, 2)), 5)
+        # sans jeton sur le chemin, la distance est la longueur du plus court chemin
+        jeu = quoridor.Quoridor([{"nom": "joueur1", "murs": 8, "pos": (1, 5)},
+                                 {"nom": "joueur2", "murs": 10, "pos": (9, 5)}],
+                                {"horizontaux": [(1, 7)], "verticaux": [(2, 5)]})
+        champs = ChampsDistances(jeu.murh, jeu.murv)
+        self.assertEqual(champs.distance(1, (1, 5)), len(jeu.chemin(1)) - 2)
+        self.assertEqual(champs.distance(2, (9, 5)), len(jeu.chemin(2)) - 2)
+        chemin = champs.chemin(1, (1, 5))
+        self.assertEqual(len(chemin), len(jeu.chemin(1)))
+        self.assertEqual(chemin[-1], 'B1')
+        for départ, arrivée in zip(chemin, chemin[1:-1]):
+            self.assertIn(arrivée, jeu.graphe().successors(départ))
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
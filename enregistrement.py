@@ -0,0 +1,350 @@
+""" enregistrement.py
+Module des enregistrements de parties: la liste des coups d'une partie, dans un format
+binaire compact ou en notation texte, et la relecture d'archives de parties une à une.
+Un enregistrement est un dictionnaire:
+    - 'noms': les noms des deux joueurs
+    - 'départ': la position de départ (etat.EtatQuoridor), ou None pour la position
+      de départ habituelle
+    - 'premier': le joueur qui joue le premier coup (1 ou 2)
+    - 'coups': les coups (type_coup, position) joués à tour de rôle; None lorsqu'un
+      joueur a passé son tour (deux coups de suite du même joueur dans l'historique)
+Format binaire: la signature MAGIQUE, puis pour chaque partie
+    - drapeaux (1 octet, bit 0: position de départ incluse) et premier joueur (1 octet)
+    - chaque nom: sa longueur (1 octet) et ses octets en UTF-8
+    - la position de départ, s'il y a lieu: le code de EtatQuoridor sur 19 octets
+    - le nombre de coups (2 octets), puis un octet par coup (plateau.coder_coup, PASSE)
+Notation texte: une partie par ligne, les champs séparés par des tabulations:
+    nom1, nom2, premier joueur, départ (code hexadécimal ou '-'), coups séparés par des
+    espaces ('D52', 'MH34', 'MV78' et '-' pour un tour passé)
+Les lecteurs sont des générateurs: une archive de n'importe quelle taille est relue
+une partie à la fois.
+contient les fonctions:
+    - partie
+        l'enregistrement d'une partie Quoridor à partir de son historique
+    - écrire_binaire, écrire_texte, écrire
+    - lire_binaire, lire_texte, lire
+    - rejouer
+        rejoue un enregistrement sur une partie Quoridor, en validant chaque coup
+    - statistiques
+        relit une archive et compte les gagnants et la longueur des parties
+"""
+import struct
+import unittest
+
+import etat
+import plateau
+
+
+# signature d'une archive binaire
+MAGIQUE = b'QPAR\x01'
+# octet d'un tour passé
+PASSE = 0xFF
+# drapeau: la position de départ suit les noms
+AVEC_DÉPART = 0x01
+# taille du code d'une position (150 bits)
+TAILLE_DÉPART = 19
+# positions de départ habituelles
+DÉPART = ((5, 1), (5, 9))
+
+
+def notation(coup):
+    """Donne la notation texte d'un coup: 'D52', 'MH34', 'MV78', ou '-' pour None"""
+    if coup is None:
+        return '-'
+    type_coup, (x, y) = coup
+    return '{}{}{}'.format(type_coup, x, y)
+
+
+def lire_notation(texte):
+    """Donne le coup (type_coup, position) d'une notation texte, ou None pour '-'
+    Raises:
+        ValueError -- si la notation est invalide
+    """
+    if texte == '-':
+        return None
+    type_coup, x, y = texte[:-2], texte[-2:-1], texte[-1:]
+    if type_coup not in ('D', 'MH', 'MV') or not (x.isdigit() and y.isdigit()):
+        raise ValueError("notation invalide: {}".format(texte))
+    return (type_coup, (int(x), int(y)))
+
+
+def partie(jeu):
+    """Donne l'enregistrement d'une partie à partir de son historique
+    La position de départ est retrouvée en défaisant l'historique sur une copie de l'état.
+    Arguments:
+        jeu {Quoridor} -- la partie
+    """
+    état = jeu.état_partie()
+    joueurs = état['joueurs']
+    murs = état['murs']
+    for joueur, type_coup, position, ancienne in reversed(jeu.historique):
+        if type_coup == 'D':
+            joueurs[joueur - 1]['pos'] = ancienne
+        else:
+            murs['horizontaux' if type_coup == 'MH' else 'verticaux'].remove(position)
+            joueurs[joueur - 1]['murs'] += 1
+    départ = None
+    if (tuple(infos['pos'] for infos in joueurs) != DÉPART or murs['horizontaux'] or
+            murs['verticaux'] or any(infos['murs'] != 10 for infos in joueurs)):
+        départ = etat.EtatQuoridor.depuis_état({'joueurs': joueurs, 'murs': murs})
+    premier = jeu.historique[0][0] if jeu.historique else 1
+    coups = []
+    trait = premier
+    for joueur, type_coup, position, _ in jeu.historique:
+        # deux coups de suite du même joueur: l'autre a passé son tour
+        if joueur != trait:
+            coups.append(None)
+        coups.append((type_coup, position))
+        trait = 3 - joueur
+    return {'noms': tuple(infos['nom'] for infos in joueurs), 'départ': départ,
+            'premier': premier, 'coups': coups}
+
+
+def écrire_binaire(fichier, enregistrement):
+    """Ajoute une partie à une archive binaire ouverte en écriture ('wb' ou 'ab')
+    La signature est écrite au début d'un fichier vide.
+    Raises:
+        ValueError -- si un nom dépasse 255 octets ou s'il y a plus de 65535 coups
+    """
+    if fichier.tell() == 0:
+        fichier.write(MAGIQUE)
+    départ = enregistrement['départ']
+    morceaux = [struct.pack('<BB', AVEC_DÉPART if départ is not None else 0,
+                            enregistrement['premier'])]
+    for nom in enregistrement['noms']:
+        octets = nom.encode('utf-8')
+        if len(octets) > 255:
+            raise ValueError("nom trop long: {}".format(nom))
+        morceaux.append(bytes([len(octets)]) + octets)
+    if départ is not None:
+        morceaux.append(départ.code.to_bytes(TAILLE_DÉPART, 'little'))
+    coups = enregistrement['coups']
+    if len(coups) > 0xFFFF:
+        raise ValueError("trop de coups: {}".format(len(coups)))
+    morceaux.append(struct.pack('<H', len(coups)))
+    morceaux.append(bytes(PASSE if coup is None else plateau.coder_coup(coup) for coup in coups))
+    fichier.write(b''.join(morceaux))
+
+
+def écrire_texte(fichier, enregistrement):
+    """Ajoute une partie, sur une ligne, à une archive texte ouverte en écriture"""
+    départ = enregistrement['départ']
+    fichier.write('\t'.join(list(enregistrement['noms']) + [
+        str(enregistrement['premier']), '-' if départ is None else format(départ.code, 'x'),
+        ' '.join(notation(coup) for coup in enregistrement['coups'])]) + '\n')
+
+
+def écrire(chemin, enregistrements, texte=False):
+    """Écrit une archive de parties
+    Arguments:
+        chemin {str} -- le fichier à écrire
+        enregistrements -- les enregistrements, un itérable consommé au fur et à mesure
+    Keyword Arguments:
+        texte {bool} -- écrire en notation texte plutôt qu'en binaire (default: {False})
+    Return:
+        int -- le nombre de parties écrites
+    """
+    nombre = 0
+    if texte:
+        with open(chemin, 'w', encoding='utf-8', newline='\n') as fichier:
+            for enregistrement in enregistrements:
+                écrire_texte(fichier, enregistrement)
+                nombre += 1
+    else:
+        with open(chemin, 'wb') as fichier:
+            for enregistrement in enregistrements:
+                écrire_binaire(fichier, enregistrement)
+                nombre += 1
+    return nombre
+
+
+def _lire_exactement(fichier, taille):
+    """Lit exactement taille octets, ou soulève ValueError"""
+    octets = fichier.read(taille)
+    if len(octets) != taille:
+        raise ValueError("archive tronquée")
+    return octets
+
+
+def lire_binaire(fichier):
+    """Génère les enregistrements d'une archive binaire ouverte en lecture ('rb')
+    Raises:
+        ValueError -- si le fichier n'est pas une archive ou s'il est tronqué
+    """
+    if fichier.read(len(MAGIQUE)) != MAGIQUE:
+        raise ValueError("archive de parties invalide")
+    while True:
+        entête = fichier.read(2)
+        if not entête:
+            return
+        if len(entête) != 2:
+            raise ValueError("archive tronquée")
+        drapeaux, premier = entête
+        noms = tuple(_lire_exactement(fichier, _lire_exactement(fichier, 1)[0]).decode('utf-8')
+                     for _ in range(2))
+        départ = None
+        if drapeaux & AVEC_DÉPART:
+            départ = etat.EtatQuoridor(int.from_bytes(
+                _lire_exactement(fichier, TAILLE_DÉPART), 'little'), noms)
+        nombre, = struct.unpack('<H', _lire_exactement(fichier, 2))
+        yield {'noms': noms, 'départ': départ, 'premier': premier,
+               'coups': [None if code == PASSE else plateau.décoder_coup(code)
+                         for code in _lire_exactement(fichier, nombre)]}
+
+
+def lire_texte(fichier):
+    """Génère les enregistrements d'une archive texte ouverte en lecture"""
+    for ligne in fichier:
+        ligne = ligne.rstrip('\r\n')
+        if not ligne:
+            continue
+        nom1, nom2, premier, départ, coups = ligne.split('\t')
+        yield {'noms': (nom1, nom2),
+               'départ': None if départ == '-' else etat.EtatQuoridor(int(départ, 16),
+                                                                       (nom1, nom2)),
+               'premier': int(premier),
+               'coups': [lire_notation(coup) for coup in coups.split()]}
+
+
+def lire(chemin):
+    """Génère les enregistrements d'une archive, binaire ou texte (selon sa signature)"""
+    with open(chemin, 'rb') as fichier:
+        binaire = fichier.read(len(MAGIQUE)) == MAGIQUE
+    if binaire:
+        with open(chemin, 'rb') as fichier:
+            yield from lire_binaire(fichier)
+    else:
+        with open(chemin, encoding='utf-8') as fichier:
+            yield from lire_texte(fichier)
+
+
+def rejouer(enregistrement, moteur='bits'):
+    """Rejoue un enregistrement en validant chaque coup
+    Arguments:
+        enregistrement {dict} -- la partie (voir partie)
+    Keyword Arguments:
+        moteur {str} -- le moteur de la partie (default: {'bits'})
+    Return:
+        Quoridor -- la partie après le dernier coup
+    Raises:
+        QuoridorError -- si un coup est invalide
+    """
+    import quoridor
+    départ = enregistrement['départ']
+    if départ is None:
+        jeu = quoridor.Quoridor(list(enregistrement['noms']), moteur=moteur)
+    else:
+        état = départ.vers_état()
+        for infos, nom in zip(état['joueurs'], enregistrement['noms']):
+            infos['nom'] = nom
+        jeu = quoridor.Quoridor.depuis_état(état, moteur)
+    joueur = enregistrement['premier']
+    for coup in enregistrement['coups']:
+        if coup is not None:
+            type_coup, position = coup
+            if type_coup == 'D':
+                jeu.déplacer_jeton(joueur, position)
+            else:
+                jeu.placer_mur(joueur, position,
+                               'horizontal' if type_coup == 'MH' else 'vertical')
+        joueur = 3 - joueur
+    return jeu
+
+
+def statistiques(chemin, moteur='bits'):
+    """Relit une archive en rejouant chaque partie
+    Return:
+        dict -- 'parties', 'invalides' (un coup refusé par le moteur), 'victoires'
+            (par numéro de joueur, 0 pour une partie non terminée) et 'coups' (total)
+    """
+    import quoridor
+    résultat = {'parties': 0, 'invalides': 0, 'victoires': {0: 0, 1: 0, 2: 0}, 'coups': 0}
+    for enregistrement in lire(chemin):
+        résultat['parties'] += 1
+        résultat['coups'] += len(enregistrement['coups'])
+        try:
+            jeu = rejouer(enregistrement, moteur)
+        except quoridor.QuoridorError:
+            résultat['invalides'] += 1
+            continue
+        gagnant = jeu.partie_terminée()
+        résultat['victoires'][0 if not gagnant else
+                              1 + enregistrement['noms'].index(gagnant)] += 1
+    return résultat
+
+
+class TestEnregistrement(unittest.TestCase):
+    """classe test enregistrement"""
+
+    def test_enregistrement(self):
+        """ Test des enregistrements de parties
+            Cas à tester:
+                - une partie rejouée à partir de son enregistrement donne la même position
+                - les formats binaire et texte donnent les mêmes enregistrements
+                - une position de départ quelconque et un tour passé sont conservés
+                - les statistiques relisent toute l'archive
+        """
+        import os
+        import random
+        import tempfile
+        import quoridor
+        hasard = random.Random(11)
+        parties = []
+        for _ in range(5):
+            jeu = quoridor.Quoridor(['joueur1', 'joueur2'])
+            joueur = 1
+            while not jeu.partie_terminée():
+                coups = jeu.coups_légaux(joueur)
+                if hasard.random() < 0.8:
+                    coup = ('D', jeu.chemin(joueur)[1])
+                else:
+                    coup = hasard.choice(coups)
+                jeu.appliquer_coup(joueur, coup)
+                joueur = 3 - joueur
+            parties.append(jeu)
+        # position quelconque, et deux coups de suite du joueur 1
+        jeu = quoridor.Quoridor([{"nom": "a", "murs": 7, "pos": (5, 5)},
+                                 {"nom": "b", "murs": 3, "pos": (8, 6)}],
+                                {"horizontaux": [(4, 4), (2, 6), (3, 8), (5, 8), (7, 8)],
+                                 "verticaux": [(6, 2), (6, 4), (4, 4), (7, 5), (7, 7)]})
+        jeu.déplacer_jeton(1, (5, 6))
+        jeu.placer_mur(1, (2, 2), 'vertical')
+        jeu.déplacer_jeton(2, (8, 5))
+        parties.append(jeu)
+        enregistrements = [partie(jeu) for jeu in parties]
+        self.assertEqual(enregistrements[0]['départ'], None)
+        self.assertEqual(enregistrements[-1]['coups'][1], None)
+        with tempfile.TemporaryDirectory() as dossier:
+            for nom, texte in (('parties.bin', False), ('parties.txt', True)):
+                chemin = os.path.join(dossier, nom)
+                self.assertEqual(écrire(chemin, iter(enregistrements), texte), 6)
+                relus = list(lire(chemin))
+                self.assertEqual(relus, enregistrements)
+                for jeu, relu in zip(parties, relus):
+                    # comparés en EtatQuoridor: l'ordre des murs n'est pas conservé
+                    self.assertEqual(etat.EtatQuoridor.depuis_état(rejouer(relu).état_partie()),
+                                     etat.EtatQuoridor.depuis_état(jeu.état_partie()))
+            # en binaire: un octet par coup, plus l'entête de chaque partie (noms de 7 et
+            # de 1 caractères, position de départ pour la dernière)
+            chemin = os.path.join(dossier, 'parties.bin')
+            coups = sum(len(enregistrement['coups']) for enregistrement in enregistrements)
+            self.assertEqual(os.path.getsize(chemin), len(MAGIQUE) + 5 * (2 + 16 + 2) +
+                             (2 + 4 + TAILLE_DÉPART + 2) + coups)
+            stats = statistiques(chemin)
+            self.assertEqual(stats['parties'], 6)
+            self.assertEqual(stats['invalides'], 0)
+            self.assertEqual(stats['victoires'][0], 1)
+            self.assertEqual(stats['coups'], coups)
+            with open(chemin, 'wb') as fichier:
+                jeu.enregistrer(fichier)
+                jeu.enregistrer(fichier)
+            self.assertEqual(len(list(lire(chemin))), 2)
+            with open(chemin, 'ab') as fichier:
+                fichier.write(b'\x00')
+            with self.assertRaises(ValueError):
+                list(lire(chemin))
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -0,0 +1,221 @@
+""" etat.py
+Module qui contient une représentation compacte et immuable d'une position de Quoridor.
+Toute la position tient dans un seul entier de 150 bits:
+    - bits 0 à 13: la case (0 à 80) de chaque jeton, 7 bits par joueur
+    - bits 14 à 21: le nombre de murs en réserve (0 à 10) de chaque joueur, 4 bits par joueur
+    - bits 22 à 85: les murs horizontaux (voir plateau.bit_mur)
+    - bits 86 à 149: les murs verticaux
+Les noms des joueurs sont gardés à côté, dans un tuple partagé entre les positions.
+contient les fonctions:
+    - taille_profonde
+        mémoire occupée par un objet et tout ce qu'il contient
+contient les classes:
+    - EtatQuoridor
+"""
+import sys
+import unittest
+
+import plateau
+
+
+# décalages des champs dans le code d'une position
+_DÉCALAGE_RÉSERVES = 14
+_DÉCALAGE_MURH = 22
+_DÉCALAGE_MURV = 86
+_MASQUE_MURS = (1 << 64) - 1
+
+
+def taille_profonde(objet, vus=None):
+    """Donne le nombre d'octets occupés par un objet et tout ce qu'il contient
+    Les objets partagés (comme les petits entiers) ne sont comptés qu'une fois.
+    Arguments:
+        objet -- l'objet à mesurer
+    """
+    if vus is None:
+        vus = set()
+    if id(objet) in vus:
+        return 0
+    vus.add(id(objet))
+    taille = sys.getsizeof(objet)
+    if isinstance(objet, dict):
+        taille += sum(taille_profonde(clé, vus) + taille_profonde(valeur, vus)
+                      for clé, valeur in objet.items())
+    elif isinstance(objet, (list, tuple, set, frozenset)):
+        taille += sum(taille_profonde(élément, vus) for élément in objet)
+    elif hasattr(objet, '__slots__'):
+        taille += sum(taille_profonde(getattr(objet, attribut), vus)
+                      for attribut in objet.__slots__)
+    return taille
+
+
+class EtatQuoridor:
+    """EtatQuoridor
+    Position de Quoridor immuable et hachable, rangée dans un seul entier.
+    Deux positions sont égales si elles ont les mêmes jetons, réserves, murs et noms.
+    L'ordre dans lequel les murs ont été placés n'est pas gardé: vers_état
+    redonne les murs dans l'ordre du damier.
+    """
+    __slots__ = ('code', 'noms')
+
+    def __init__(self, code, noms=('', '')):
+        """
+        Arguments:
+            code {int} -- la position encodée (voir le module)
+        Keyword Arguments:
+            noms {tuple} -- les noms des deux joueurs (default: {('', '')})
+        """
+        object.__setattr__(self, 'code', code)
+        object.__setattr__(self, 'noms', tuple(noms))
+
+
+    @classmethod
+    def encoder(cls, pions, réserves, murs_horizontaux, murs_verticaux, noms=('', '')):
+        """Construit une position à partir de ses champs
+        Arguments:
+            pions {tuple} -- les positions (x, y) des deux jetons
+            réserves {tuple} -- le nombre de murs en réserve de chaque joueur
+            murs_horizontaux {int} -- le masque des murs horizontaux
+            murs_verticaux {int} -- le masque des murs verticaux
+        Keyword Arguments:
+            noms {tuple} -- les noms des deux joueurs (default: {('', '')})
+        """
+        code = (plateau.case(pions[0]) | (plateau.case(pions[1]) << 7) |
+                (réserves[0] << _DÉCALAGE_RÉSERVES) |
+                (réserves[1] << (_DÉCALAGE_RÉSERVES + 4)) |
+                (murs_horizontaux << _DÉCALAGE_MURH) | (murs_verticaux << _DÉCALAGE_MURV))
+        return cls(code, noms)
+
+
+    @classmethod
+    def depuis_état(cls, état):
+        """Construit une position à partir d'un dictionnaire de Quoridor.état_partie"""
+        joueurs = état['joueurs']
+        murh = 0
+        for mur in état['murs']['horizontaux']:
+            murh |= 1 << plateau.bit_mur(mur, 'horizontal')
+        murv = 0
+        for mur in état['murs']['verticaux']:
+            murv |= 1 << plateau.bit_mur(mur, 'vertical')
+        return cls.encoder((joueurs[0]['pos'], joueurs[1]['pos']),
+                           (joueurs[0]['murs'], joueurs[1]['murs']),
+                           murh, murv, (joueurs[0]['nom'], joueurs[1]['nom']))
+
+
+    def vers_état(self):
+        """Donne la position sous la forme d'un dictionnaire de Quoridor.état_partie"""
+        pions = self.pions
+        réserves = self.réserves
+        return {
+            'joueurs': [
+                {'nom': self.noms[0], 'murs': réserves[0], 'pos': pions[0]},
+                {'nom': self.noms[1], 'murs': réserves[1], 'pos': pions[1]},
+            ],
+            'murs': {
+                'horizontaux': [plateau.mur(bit, 'horizontal')
+                                for bit in plateau.bits(self.murs_horizontaux)],
+                'verticaux': [plateau.mur(bit, 'vertical')
+                              for bit in plateau.bits(self.murs_verticaux)],
+            }}
+
+
+    @property
+    def pions(self):
+        """Les positions (x, y) des deux jetons"""
+        return (plateau.position(self.code & 0x7F), plateau.position((self.code >> 7) & 0x7F))
+
+
+    @property
+    def réserves(self):
+        """Le nombre de murs en réserve de chaque joueur"""
+        return ((self.code >> _DÉCALAGE_RÉSERVES) & 0xF,
+                (self.code >> (_DÉCALAGE_RÉSERVES + 4)) & 0xF)
+
+
+    @property
+    def murs_horizontaux(self):
+        """Le masque des murs horizontaux"""
+        return (self.code >> _DÉCALAGE_MURH) & _MASQUE_MURS
+
+
+    @property
+    def murs_verticaux(self):
+        """Le masque des murs verticaux"""
+        return (self.code >> _DÉCALAGE_MURV) & _MASQUE_MURS
+
+
+    def __setattr__(self, nom, valeur):
+        raise AttributeError("EtatQuoridor est immuable!")
+
+
+    def __delattr__(self, nom):
+        raise AttributeError("EtatQuoridor est immuable!")
+
+
+    def __eq__(self, autre):
+        if not isinstance(autre, EtatQuoridor):
+            return NotImplemented
+        return self.code == autre.code and self.noms == autre.noms
+
+
+    def __hash__(self):
+        return hash(self.code)
+
+
+    def __repr__(self):
+        return "EtatQuoridor({:#x}, {!r})".format(self.code, self.noms)
+
+
+    def __reduce__(self):
+        # la copie et pickle passent par le constructeur, les attributs étant immuables
+        return (EtatQuoridor, (self.code, self.noms))
+
+
+class TestEtatQuoridor(unittest.TestCase):
+    """classe test EtatQuoridor"""
+
+    def test_conversions(self):
+        """ Test des conversions vers et depuis état_partie
+            Cas à tester:
+                - l'aller-retour redonne le même état (murs dans l'ordre du damier)
+                - deux positions égales ont le même hachage
+                - la position est immuable
+                - la position occupe beaucoup moins de mémoire que le dictionnaire
+        """
+        import copy
+        import quoridor
+        import transposition
+        jeu = quoridor.Quoridor(["joueur1", "joueur2"], moteur='bits')
+        table = transposition.TableTransposition()
+        positions = set()
+        for numero in range(40):
+            joueur = (numero % 2) + 1
+            # profondeur fixe et table propre au test: la partie, et donc le nombre
+            # de positions, ne dépend ni de la vitesse de la machine ni des autres tests
+            jeu.jouer_coup(joueur, 5.0, profondeur=1, table=table)
+            état = jeu.état_partie()
+            compact = EtatQuoridor.depuis_état(état)
+            rendu = compact.vers_état()
+            self.assertEqual(rendu['joueurs'], état['joueurs'])
+            self.assertEqual(sorted(rendu['murs']['horizontaux']),
+                             sorted(état['murs']['horizontaux']))
+            self.assertEqual(sorted(rendu['murs']['verticaux']),
+                             sorted(état['murs']['verticaux']))
+            self.assertEqual(EtatQuoridor.depuis_état(rendu), compact)
+            self.assertEqual(hash(EtatQuoridor.depuis_état(rendu)), hash(compact))
+            positions.add(compact)
+            if jeu.partie_terminée():
+                break
+        self.assertEqual(len(positions), numero + 1)
+        with self.assertRaises(AttributeError):
+            compact.code = 0
+        self.assertEqual(copy.deepcopy(compact), compact)
+        # les noms sont partagés: seuls l'objet et son entier comptent
+        partagés = {id(compact.noms)} | {id(nom) for nom in compact.noms}
+        self.assertLess(taille_profonde(compact, partagés), 120)
+        self.assertLess(taille_profonde(compact, partagés) * 5,
+                        taille_profonde(jeu.état_partie()))
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -0,0 +1,252 @@
+""" evaluation.py
+Module d'évaluation de positions par lots, avec NumPy.
+Les positions sont données sous forme de tableaux (une rangée par position):
+    - pions: (N, 2) les cases (plateau.case) des deux jetons
+    - murh, murv: (N,) les masques de murs (uint64, bits de plateau.bit_mur)
+    - réserves: (N, 2) le nombre de murs en réserve de chaque joueur
+Les murs sont convertis en passages ouverts, un masque de 9 bits par rangée du damier
+(tableaux (N, 9) uint16), puis les distances aux objectifs sont calculées par une
+recherche en largeur sur toutes les positions à la fois: chaque itération avance le
+front de toutes les positions d'un pas, par décalages de bits et de rangées.
+Comme dans distances.py, les jetons ne sont pas des obstacles pour les distances.
+contient les fonctions:
+    - encoder
+        les tableaux d'une suite de positions (Quoridor ou EtatQuoridor)
+    - passages
+        les passages laissés ouverts par les murs
+    - distances_pions
+        la distance de chaque jeton à son objectif
+    - mobilités
+        le nombre de déplacements permis de chaque jeton
+    - caractéristiques
+        la matrice des caractéristiques (COLONNES) des positions
+    - scores
+        la valeur de ia.évaluer pour chaque position
+"""
+import unittest
+
+import numpy as np
+
+import distances
+import etat
+import ia
+
+
+# colonnes de la matrice des caractéristiques
+COLONNES = ('distance1', 'distance2', 'mobilité1', 'mobilité2',
+            'réserve1', 'réserve2', 'murs_placés')
+# directions, dans l'ordre des tableaux de passages, et décalage de case de chacune
+DIRECTIONS = ('nord', 'sud', 'est', 'ouest')
+DÉCALAGES = (9, -9, 1, -1)
+# directions perpendiculaires, pour les sauts en diagonale
+PERPENDICULAIRES = ((2, 3), (2, 3), (0, 1), (0, 1))
+# masque d'une rangée complète (9 colonnes)
+RANGÉE = np.uint16(0x1FF)
+# nombre de positions traitées à la fois (borne la mémoire des tableaux)
+TAILLE_LOT = 1 << 16
+
+
+def encoder(positions):
+    """Donne les tableaux de positions Quoridor ou EtatQuoridor
+    Return:
+        tuple -- (pions, murh, murv, réserves)
+    """
+    codes = [position if isinstance(position, etat.EtatQuoridor) else
+             etat.EtatQuoridor.depuis_état(position.vue_partie()) for position in positions]
+    # les cases des jetons sont les 14 premiers bits du code
+    pions = np.array([(code.code & 0x7F, (code.code >> 7) & 0x7F) for code in codes],
+                     dtype=np.int16).reshape(-1, 2)
+    réserves = np.array([code.réserves for code in codes], dtype=np.int16).reshape(-1, 2)
+    murh = np.array([code.murs_horizontaux for code in codes], dtype=np.uint64)
+    murv = np.array([code.murs_verticaux for code in codes], dtype=np.uint64)
+    return pions, murh, murv, réserves
+
+
+def passages(murh, murv):
+    """Donne les passages ouverts de chaque case dans chaque direction
+    Arguments:
+        murh, murv {numpy.ndarray} -- (N,) les masques de murs
+    Return:
+        numpy.ndarray -- (4, N, 9) uint16, dans l'ordre de DIRECTIONS: pour chaque
+            rangée (y - 1), le masque des colonnes (bit x - 1) qui peuvent passer
+    """
+    nombre = len(murh)
+    # les 8 murs possibles de chaque rangée de murs, un octet par rangée (bit c: colonne c)
+    décalages = np.arange(0, 64, 8, dtype=np.uint64)
+    horizontaux = ((murh[:, None] >> décalages) & np.uint64(0xFF)).astype(np.uint16)
+    verticaux = ((murv[:, None] >> décalages) & np.uint64(0xFF)).astype(np.uint16)
+    ouverts = np.empty((4, nombre, 9), dtype=np.uint16)
+    ouverts[0] = RANGÉE
+    ouverts[1] = RANGÉE
+    ouverts[2] = RANGÉE & ~np.uint16(1 << 8)
+    ouverts[3] = RANGÉE & ~np.uint16(1)
+    # un mur horizontal bloque ses 2 colonnes entre les rangées r et r + 1
+    ouverts[0, :, :8] &= ~(horizontaux | (horizontaux << 1))
+    ouverts[1, :, 1:] &= ~(horizontaux | (horizontaux << 1))
+    # un mur vertical bloque les rangées r et r + 1 entre les colonnes c et c + 1
+    for décalage in (0, 1):
+        ouverts[2, :, décalage:décalage + 8] &= ~verticaux
+        ouverts[3, :, décalage:décalage + 8] &= ~(verticaux << 1)
+    # bords du damier
+    ouverts[0, :, 8] = 0
+    ouverts[1, :, 0] = 0
+    return ouverts
+
+
+def _contient(masques, lignes, cases):
+    """Vérifie si la case de chaque position est dans son masque de rangées (N, 9)"""
+    return ((masques[lignes, cases // 9] >> (cases % 9)) & 1).astype(bool)
+
+
+def distances_pions(ouverts, pions):
+    """Recherche en largeur simultanée à partir de l'objectif de chaque joueur
+    Les fronts de toutes les positions avancent d'un pas à chaque itération, jusqu'à
+    ce que chaque jeton soit atteint ou que son front soit vide.
+    Arguments:
+        ouverts {numpy.ndarray} -- les passages (voir passages)
+        pions {numpy.ndarray} -- (N, 2) les cases des jetons
+    Return:
+        numpy.ndarray -- (N, 2) la distance de chaque jeton à son objectif
+            (distances.INACCESSIBLE si l'objectif n'est pas accessible)
+    """
+    nombre = ouverts.shape[1]
+    lignes = np.arange(nombre)
+    résultat = np.full((nombre, 2), distances.INACCESSIBLE, dtype=np.int16)
+    for joueur, rangée in enumerate(distances.RANGÉES):
+        cases = pions[:, joueur].astype(np.int32)
+        front = np.zeros((nombre, 9), dtype=np.uint16)
+        front[:, rangée] = RANGÉE
+        atteintes = front.copy()
+        actives = np.ones(nombre, dtype=bool)
+        pas = 0
+        while actives.any():
+            arrivées = actives & _contient(front, lignes, cases)
+            résultat[arrivées, joueur] = pas
+            actives &= ~arrivées & front.any(axis=1)
+            pas += 1
+            # une case rejoint le front si elle peut y entrer (les murs sont symétriques)
+            suivant = ((front & ouverts[2]) << 1) | ((front & ouverts[3]) >> 1)
+            suivant[:, 1:] |= front[:, :-1] & ouverts[0, :, :-1]
+            suivant[:, :-1] |= front[:, 1:] & ouverts[1, :, 1:]
+            front = suivant & ~atteintes
+            atteintes |= front
+    return résultat
+
+
+def mobilités(ouverts, pions):
+    """Donne le nombre de déplacements permis de chaque jeton, sauts compris
+    Arguments:
+        ouverts {numpy.ndarray} -- les passages (voir passages)
+        pions {numpy.ndarray} -- (N, 2) les cases des jetons
+    Return:
+        numpy.ndarray -- (N, 2) le nombre de déplacements de chaque joueur
+    """
+    lignes = np.arange(len(pions))
+    résultat = np.zeros((len(pions), 2), dtype=np.int16)
+    for joueur in (0, 1):
+        case = pions[:, joueur].astype(np.int32)
+        autre = pions[:, 1 - joueur].astype(np.int32)
+        for direction, décalage in enumerate(DÉCALAGES):
+            ouvert = _contient(ouverts[direction], lignes, case)
+            bloqué_par_autre = ouvert & (case + décalage == autre)
+            résultat[:, joueur] += ouvert & ~bloqué_par_autre
+            # saut en ligne droite, sinon en diagonale si un mur est derrière l'autre jeton
+            derrière = _contient(ouverts[direction], lignes, autre)
+            diagonales = sum(_contient(ouverts[côté], lignes, autre).astype(np.int16)
+                             for côté in PERPENDICULAIRES[direction])
+            résultat[:, joueur] += np.where(bloqué_par_autre,
+                                            np.where(derrière, 1, diagonales), 0).astype(np.int16)
+    return résultat
+
+
+def _compter_bits(masques):
+    """Nombre de bits à 1 de chaque masque uint64"""
+    rangs = np.arange(64, dtype=np.uint64)
+    return ((masques[:, None] >> rangs) & np.uint64(1)).sum(axis=1).astype(np.int16)
+
+
+def caractéristiques(pions, murh, murv, réserves, taille_lot=TAILLE_LOT):
+    """Calcule les caractéristiques de N positions
+    Arguments:
+        pions {numpy.ndarray} -- (N, 2) les cases des jetons
+        murh, murv {numpy.ndarray} -- (N,) les masques de murs (uint64)
+        réserves {numpy.ndarray} -- (N, 2) les murs en réserve
+    Keyword Arguments:
+        taille_lot {int} -- le nombre de positions traitées à la fois (default: {TAILLE_LOT})
+    Return:
+        numpy.ndarray -- (N, len(COLONNES)) entiers, dans l'ordre de COLONNES
+    """
+    pions = np.asarray(pions)
+    murh = np.asarray(murh, dtype=np.uint64)
+    murv = np.asarray(murv, dtype=np.uint64)
+    réserves = np.asarray(réserves)
+    résultat = np.empty((len(pions), len(COLONNES)), dtype=np.int16)
+    for début in range(0, len(pions), taille_lot):
+        tranche = slice(début, début + taille_lot)
+        ouverts = passages(murh[tranche], murv[tranche])
+        résultat[tranche, 0:2] = distances_pions(ouverts, pions[tranche])
+        résultat[tranche, 2:4] = mobilités(ouverts, pions[tranche])
+        résultat[tranche, 4:6] = réserves[tranche]
+        résultat[tranche, 6] = _compter_bits(murh[tranche]) + _compter_bits(murv[tranche])
+    return résultat
+
+
+def scores(matrice, joueur=1):
+    """Donne la valeur de ia.évaluer pour chaque position, du point de vue du joueur
+    Arguments:
+        matrice {numpy.ndarray} -- les caractéristiques (voir caractéristiques)
+    Keyword Arguments:
+        joueur {int} -- le joueur (1 ou 2) (default: {1})
+    """
+    distance = np.where(matrice[:, 0:2] >= distances.INACCESSIBLE, ia.INFINI,
+                        matrice[:, 0:2].astype(np.int64))
+    signe = 1 if joueur == 1 else -1
+    return signe * (10 * (distance[:, 1] - distance[:, 0]) +
+                    matrice[:, 4].astype(np.int64) - matrice[:, 5])
+
+
+class TestEvaluation(unittest.TestCase):
+    """classe test evaluation"""
+
+    def test_caractéristiques(self):
+        """ Test des caractéristiques par lots
+            Cas à tester:
+                - les distances sont celles de Quoridor.distance_objectif
+                - les mobilités sont le nombre de successeurs du moteur (sauts compris)
+                - les scores sont ceux de ia.évaluer
+                - le calcul par tranches donne le même résultat
+        """
+        import random
+        import quoridor
+        hasard = random.Random(20)
+        parties = []
+        for _ in range(40):
+            jeu = quoridor.Quoridor(['joueur1', 'joueur2'], moteur='bits')
+            joueur = 1
+            for _ in range(hasard.randrange(30)):
+                if jeu.partie_terminée():
+                    break
+                coups = jeu.coups_légaux(joueur)
+                jeu.appliquer_coup(joueur, hasard.choice(coups))
+                joueur = 3 - joueur
+            parties.append(jeu)
+        # face à face, avec un mur derrière le joueur 2 (sauts en diagonale)
+        parties.append(quoridor.Quoridor([{"nom": "a", "murs": 9, "pos": (5, 5)},
+                                          {"nom": "b", "murs": 10, "pos": (5, 6)}],
+                                         {"horizontaux": [(5, 7)], "verticaux": []}))
+        matrice = caractéristiques(*encoder(parties))
+        self.assertEqual(matrice.shape, (41, len(COLONNES)))
+        for jeu, rangée in zip(parties, matrice):
+            self.assertEqual(list(rangée[0:2]), [jeu.distance_objectif(1),
+                                                 jeu.distance_objectif(2)])
+            self.assertEqual(list(rangée[2:4]), [
+                len(jeu.moteur().successeurs(jeu.joueurs[numero]['pos'])) for numero in (0, 1)])
+            self.assertEqual(rangée[6], len(jeu.murh) + len(jeu.murv))
+        self.assertEqual(list(matrice[-1, 2:4]), [5, 3])
+        self.assertEqual(list(scores(matrice, 2)), [ia.évaluer(jeu, 2) for jeu in parties])
+        self.assertTrue((caractéristiques(*encoder(parties), taille_lot=7) == matrice).all())
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -0,0 +1,249 @@
+""" finale.py
+Module des tables de finales: lorsque les deux joueurs n'ont plus de murs, la partie
+est une course sur un damier fixe et se résout exactement.
+Pour une disposition de murs, l'analyse rétrograde donne, pour chaque position des
+deux jetons et chaque joueur au trait (2 x 81 x 81 positions), le résultat (gain,
+perte ou nulle) et le nombre de demi-coups jusqu'à la fin avec un jeu parfait.
+Les calculs sont faits sur des tableaux NumPy: chaque itération détermine d'un coup
+toutes les positions gagnées ou perdues en un demi-coup de plus que la précédente.
+Les tables sont gardées en mémoire par disposition de murs: une fois les murs
+épuisés, la disposition ne change plus jusqu'à la fin de la partie.
+contient les fonctions:
+    - table_finale
+        la table d'une disposition de murs (calculée au premier besoin)
+    - coup_parfait
+        le meilleur coup d'une partie sans murs en réserve, lu dans sa table
+contient les classes:
+    - TableFinale
+"""
+import unittest
+
+import numpy as np
+
+import plateau
+
+
+# résultats, du point de vue du joueur qui a le trait
+GAIN = 1
+NULLE = 0
+PERTE = -1
+# nombre de positions d'un joueur au trait: (case du joueur 1, case du joueur 2)
+POSITIONS = 81 * 81
+# nombre maximal de déplacements d'un jeton (4 directions, dont une remplacée par
+# au plus 2 sauts en diagonale)
+DÉPLACEMENTS_MAX = 5
+# tables calculées, par disposition de murs
+TABLES = {}
+# nombre de tables gardées en mémoire (la mémoire est vidée lorsqu'il est atteint)
+TAILLE_TABLES = 32
+
+
+def destinations(libres):
+    """Donne les cases où un jeton peut aller, pour chaque case du jeton et de l'autre jeton
+    Arguments:
+        libres {dict} -- les masques de libertés du damier (plateau.libertés)
+    Return:
+        numpy.ndarray -- tableau (81, 81, DÉPLACEMENTS_MAX): [case, case de l'autre jeton]
+            vers les cases atteignables, complété par -1
+    """
+    résultat = np.full((81, 81, DÉPLACEMENTS_MAX), -1, dtype=np.int16)
+    for bit in range(81):
+        voisins = list(plateau.bits(plateau.voisins(1 << bit, libres)))
+        # l'autre jeton ne change rien tant qu'il n'est pas sur une case voisine
+        résultat[bit, :, :len(voisins)] = voisins
+        for autre in voisins:
+            cases = list(plateau.bits(plateau.successeurs(bit, [bit, autre], libres)))
+            résultat[bit, autre] = -1
+            résultat[bit, autre, :len(cases)] = cases
+    return résultat
+
+
+class TableFinale:
+    """TableFinale
+    Résultats d'une disposition de murs, pour toutes les positions sans murs en réserve.
+    Une position est l'indice trait * 6561 + case du joueur 1 * 81 + case du joueur 2,
+    avec trait 0 pour le joueur 1 et 1 pour le joueur 2.
+    Attributs:
+        résultats {numpy.ndarray} -- GAIN, PERTE ou NULLE pour le joueur au trait (int8)
+        distances {numpy.ndarray} -- le nombre de demi-coups jusqu'à la fin (int16)
+        enfants {numpy.ndarray} -- (positions, DÉPLACEMENTS_MAX): les positions après
+            chaque déplacement; un déplacement absent mène à la position fictive
+            2 * 6561, gagnée par l'adversaire
+    """
+
+    def __init__(self, murs_horizontaux, murs_verticaux):
+        """
+        Arguments:
+            murs_horizontaux {list} -- les positions (x, y) des murs horizontaux
+            murs_verticaux {list} -- les positions (x, y) des murs verticaux
+        """
+        cibles = destinations(plateau.libertés(murs_horizontaux, murs_verticaux)).astype(np.int32)
+        cases = np.arange(81, dtype=np.int32)
+        joueur1 = cases[:, None, None]
+        joueur2 = cases[None, :, None]
+        fictive = 2 * POSITIONS
+        # trait au joueur 1: il part de sa case (cibles[a, b]); trait au joueur 2: cibles[b, a]
+        enfants = np.empty((2, 81, 81, DÉPLACEMENTS_MAX), dtype=np.int32)
+        enfants[0] = np.where(cibles >= 0, POSITIONS + cibles * 81 + joueur2, fictive)
+        cibles2 = cibles.transpose(1, 0, 2)
+        enfants[1] = np.where(cibles2 >= 0, joueur1 * 81 + cibles2, fictive)
+        self.enfants = enfants.reshape(2 * POSITIONS, DÉPLACEMENTS_MAX)
+        self.résultats, self.distances = self.analyser()
+
+
+    def analyser(self):
+        """Analyse rétrograde
+        Return:
+            tuple -- (résultats, distances), avec la position fictive en dernier
+        """
+        trait = np.repeat([0, 1], POSITIONS)
+        case1 = np.tile(np.repeat(np.arange(81), 81), 2)
+        case2 = np.tile(np.arange(81), 2 * 81)
+        arrivé1 = case1 >= 72
+        arrivé2 = case2 < 9
+        résultats = np.zeros(2 * POSITIONS + 1, dtype=np.int8)
+        distances = np.zeros(2 * POSITIONS + 1, dtype=np.int16)
+        # le joueur qui vient de jouer a atteint son objectif: le joueur au trait a perdu
+        résultats[:-1][np.where(trait == 0, arrivé2, arrivé1)] = PERTE
+        # le joueur au trait est déjà sur son objectif (ne se produit pas en partie)
+        déjà = np.where(trait == 0, arrivé1, arrivé2) & (résultats[:-1] == NULLE)
+        résultats[:-1][déjà] = GAIN
+        résultats[-1] = GAIN
+        # les deux jetons sur la même case: position impossible, laissée nulle
+        actives = (case1 != case2) & (résultats[:-1] == NULLE)
+        profondeur = 0
+        while actives.any():
+            profondeur += 1
+            valeurs = résultats[self.enfants]
+            gagnées = actives & (valeurs == PERTE).any(axis=1)
+            perdues = actives & (valeurs == GAIN).all(axis=1)
+            if not (gagnées.any() or perdues.any()):
+                break
+            résultats[:-1][gagnées] = GAIN
+            résultats[:-1][perdues] = PERTE
+            distances[:-1][gagnées | perdues] = profondeur
+            actives &= ~(gagnées | perdues)
+        return résultats, distances
+
+
+    @staticmethod
+    def indice(pions, trait):
+        """Indice d'une position: pions {list} les bits des 2 jetons, trait {int} 1 ou 2"""
+        return (trait - 1) * POSITIONS + pions[0] * 81 + pions[1]
+
+
+    def résultat(self, pions, trait):
+        """Donne (résultat, distance) pour le joueur au trait"""
+        indice = self.indice(pions, trait)
+        return int(self.résultats[indice]), int(self.distances[indice])
+
+
+    def meilleur_enfant(self, pions, trait):
+        """Donne l'indice de la position après le meilleur déplacement du joueur au trait
+        Le gain le plus rapide, la perte la plus lente, sinon une position nulle.
+        """
+        enfants = self.enfants[self.indice(pions, trait)]
+        enfants = enfants[enfants < 2 * POSITIONS]
+        valeurs = self.résultats[enfants]
+        distances = self.distances[enfants]
+        # pour l'adversaire: une perte est notre gain
+        if (valeurs == PERTE).any():
+            choix = np.where(valeurs == PERTE, distances, np.iinfo(np.int16).max).argmin()
+        elif (valeurs == NULLE).any():
+            choix = (valeurs == NULLE).argmax()
+        else:
+            choix = distances.argmax()
+        return int(enfants[choix])
+
+
+    def coup(self, pions, trait):
+        """Donne le déplacement parfait (case de destination, en bit) du joueur au trait"""
+        enfant = self.meilleur_enfant(pions, trait) % POSITIONS
+        return enfant // 81 if trait == 1 else enfant % 81
+
+
+def table_finale(murs_horizontaux, murs_verticaux):
+    """Donne la table d'une disposition de murs, calculée au premier besoin
+    Arguments:
+        murs_horizontaux {list} -- les positions (x, y) des murs horizontaux
+        murs_verticaux {list} -- les positions (x, y) des murs verticaux
+    """
+    clé = (frozenset(map(tuple, murs_horizontaux)), frozenset(map(tuple, murs_verticaux)))
+    table = TABLES.get(clé)
+    if table is None:
+        if len(TABLES) >= TAILLE_TABLES:
+            TABLES.clear()
+        table = TABLES[clé] = TableFinale(murs_horizontaux, murs_verticaux)
+    return table
+
+
+def coup_parfait(jeu, joueur):
+    """Donne le coup parfait d'une partie où les deux joueurs n'ont plus de murs
+    Arguments:
+        jeu {Quoridor} -- la partie
+        joueur {int} -- le joueur qui a le trait (1 ou 2)
+    Return:
+        tuple -- le coup ('D', position), ou None s'il reste des murs à un joueur
+    """
+    if jeu.joueurs[0]['murs'] or jeu.joueurs[1]['murs']:
+        return None
+    pions = [plateau.case(infos['pos']) for infos in jeu.joueurs]
+    return ('D', plateau.position(table_finale(jeu.murh, jeu.murv).coup(pions, joueur)))
+
+
+class TestTableFinale(unittest.TestCase):
+    """classe test TableFinale"""
+
+    def test_table_finale(self):
+        """ Test des tables de finales
+            Cas à tester:
+                - course sans murs: le joueur au trait à égalité de distance gagne, sauf
+                    si l'adversaire peut sauter par-dessus lui
+                - le résultat de chaque position est celui de ses enfants (négamax)
+                - un saut par-dessus l'adversaire est utilisé
+                - jouer_coup suit la table et la table est gardée en mémoire
+        """
+        import random
+        import quoridor
+        table = table_finale([], [])
+        coins = [plateau.case((1, 1)), plateau.case((9, 9))]
+        self.assertEqual(table.résultat(coins, 1), (GAIN, 15))
+        self.assertEqual(table.résultat(coins, 2), (GAIN, 15))
+        # de la position de départ, le joueur 2 finit par sauter par-dessus le joueur 1
+        départ = [plateau.case((5, 1)), plateau.case((5, 9))]
+        self.assertEqual(table.résultat(départ, 1), (PERTE, 16))
+        # vérification exhaustive par négamax sur toutes les positions décidées
+        for indice in range(2 * POSITIONS):
+            résultat = table.résultats[indice]
+            if table.distances[indice] == 0:
+                continue
+            valeurs = table.résultats[table.enfants[indice]]
+            if résultat == GAIN:
+                self.assertTrue((valeurs == PERTE).any())
+            elif résultat == PERTE:
+                self.assertTrue((valeurs == GAIN).all())
+        # face à face: le joueur 1 saute par-dessus le joueur 2
+        pions = [plateau.case((5, 5)), plateau.case((5, 6))]
+        self.assertEqual(plateau.position(table.coup(pions, 1)), (5, 7))
+        # 20 murs au hasard, puis la partie jouée jusqu'au bout par jouer_coup
+        hasard = random.Random(4)
+        jeu = quoridor.Quoridor(["joueur1", "joueur2"])
+        self.assertEqual(coup_parfait(jeu, 1), None)
+        for numero in range(20):
+            position, orientation = hasard.choice(jeu.murs_valides(numero % 2 + 1))
+            jeu.placer_mur(numero % 2 + 1, position, orientation)
+        table = table_finale(jeu.murh, jeu.murv)
+        self.assertIs(table_finale(list(jeu.murh), list(jeu.murv)), table)
+        résultat, distance = table.résultat(départ, 1)
+        coup = coup_parfait(jeu, 1)
+        self.assertEqual(jeu.jouer_coup(1, 1.0), coup)
+        joueur = 2
+        for _ in range(distance - 1):
+            jeu.jouer_coup(joueur, 1.0)
+            joueur = 3 - joueur
+        self.assertEqual(jeu.partie_terminée(), "joueur1" if résultat == GAIN else "joueur2")
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -0,0 +1,353 @@
+""" ia.py
+Module qui contient l'intelligence artificielle derrière Quoridor.jouer_coup.
+La recherche est un minimax (en version negamax) avec élagage alpha-bêta,
+ordonnancement des coups, table de transposition et approfondissement itératif
+sous un budget de temps.
+Lorsque le temps est écoulé, le meilleur coup trouvé jusque-là est retourné.
+Les coups sont des tuples (type_coup, position) avec les types de api.jouer_coup:
+    - 'D' = Déplacer l'avatar
+    - 'MH' = Placer un mur horizontal
+    - 'MV' = Placer un mur vertical
+contient les fonctions:
+    - distance
+        nombre de coups qu'il reste à un joueur pour atteindre son objectif
+    - meilleur_pas
+        déplacement qui rapproche le plus un joueur de son objectif
+    - évaluer
+        évaluation d'une position par différence des plus courts chemins
+    - murs_candidats
+        murs qui coupent un chemin donné
+    - meilleur_coup
+        point d'entrée de la recherche
+contient les classes:
+    - Recherche
+    - TempsÉcoulé(Exception)
+"""
+import time
+import unittest
+
+import distances
+import plateau
+from transposition import TableTransposition, EXACTE, BORNE_INF, BORNE_SUP
+
+
+# score d'une partie gagnée (diminué du nombre de coups pour gagner au plus vite)
+GAGNÉ = 10000
+INFINI = 10 ** 9
+# profondeur maximale de l'approfondissement itératif
+PROFONDEUR_MAX = 30
+# orientation des murs selon le type de coup
+ORIENTATIONS = {'MH': 'horizontal', 'MV': 'vertical'}
+TYPES_MURS = {'horizontal': 'MH', 'vertical': 'MV'}
+# rangée que chaque joueur doit atteindre
+RANGÉES_OBJECTIFS = [9, 1]
+# au-delà de ce score, la valeur est une victoire ou une défaite forcée
+SEUIL_GAGNÉ = GAGNÉ - 10 * PROFONDEUR_MAX
+# table de transposition partagée d'un coup à l'autre
+TABLE = TableTransposition()
+
+
+class TempsÉcoulé(Exception):
+    """TempsÉcoulé
+    Soulevée pour interrompre la recherche lorsque le budget de temps est épuisé
+    """
+
+
+def distance(jeu, joueur):
+    """Donne le nombre de coups qu'il reste au joueur pour atteindre son objectif
+    Arguments:
+        jeu {Quoridor} -- la partie
+        joueur {int} -- le numéro du joueur (1 ou 2)
+    """
+    # lecture du champ de distances tenu à jour par la partie (les jetons sont ignorés)
+    distance_objectif = jeu.distance_objectif(joueur)
+    if distance_objectif >= distances.INACCESSIBLE:
+        return INFINI
+    return distance_objectif
+
+
+def meilleur_pas(jeu, joueur):
+    """Donne le déplacement permis qui mène à la case la plus proche de l'objectif
+    Chaque voisin est évalué par une lecture du champ de distances, sans recherche de chemin.
+    Arguments:
+        jeu {Quoridor} -- la partie
+        joueur {int} -- le numéro du joueur (1 ou 2)
+    Return:
+        tuple -- la position (x, y) du déplacement, ou None si le jeton ne peut pas bouger
+    """
+    champ = jeu.distances().champs[joueur - 1]
+    return min(jeu.moteur().successeurs(jeu.joueurs[joueur - 1]['pos']),
+               key=lambda position: champ[plateau.case(position)], default=None)
+
+
+def évaluer(jeu, joueur):
+    """Évalue la position du point de vue du joueur spécifié
+    La différence des plus courts chemins domine; les murs en réserve départagent.
+    Arguments:
+        jeu {Quoridor} -- la partie
+        joueur {int} -- le numéro du joueur (1 ou 2)
+    """
+    adversaire = 3 - joueur
+    return (10 * (distance(jeu, adversaire) - distance(jeu, joueur)) +
+            jeu.joueurs[joueur - 1]['murs'] - jeu.joueurs[adversaire - 1]['murs'])
+
+
+def vers_table(valeur, ply):
+    """Rend un score de victoire relatif au noeud plutôt qu'à la racine, pour la table"""
+    if valeur >= SEUIL_GAGNÉ:
+        return valeur + ply
+    if valeur <= -SEUIL_GAGNÉ:
+        return valeur - ply
+    return valeur
+
+
+def de_table(valeur, ply):
+    """Inverse de vers_table"""
+    if valeur >= SEUIL_GAGNÉ:
+        return valeur - ply
+    if valeur <= -SEUIL_GAGNÉ:
+        return valeur + ply
+    return valeur
+
+
+def murs_candidats(chemin):
+    """Donne les murs qui coupent un des pas simples d'un chemin, dans l'ordre du chemin
+    Ces murs ne sont pas forcément admissibles (voir Quoridor.murs_valides).
+    Arguments:
+        chemin {list} -- les positions (x, y) du chemin, suivies de l'objectif
+    Return:
+        list -- les tuples (position, orientation) des murs
+    """
+    candidats = []
+    for départ, arrivée in zip(chemin, chemin[1:]):
+        if arrivée in ('B1', 'B2'):
+            break
+        écart_x = arrivée[0] - départ[0]
+        écart_y = arrivée[1] - départ[1]
+        if abs(écart_x) + abs(écart_y) != 1:
+            continue
+        if écart_x == 0:
+            # pas vertical: un mur horizontal au-dessus de la case la plus basse
+            y = max(départ[1], arrivée[1])
+            murs = [((départ[0] - 1, y), 'horizontal'), ((départ[0], y), 'horizontal')]
+        else:
+            # pas horizontal: un mur vertical à droite de la case la plus à gauche
+            x = max(départ[0], arrivée[0])
+            murs = [((x, départ[1] - 1), 'vertical'), ((x, départ[1]), 'vertical')]
+        for mur in murs:
+            if mur not in candidats:
+                candidats.append(mur)
+    return candidats
+
+
+class Recherche:
+    """Recherche
+    Recherche alpha-bêta à approfondissement itératif sur une partie.
+    Chaque coup est joué puis annulé sur place (Quoridor.appliquer_coup / annuler_coup),
+    sans copier la partie.
+    Attributs:
+        jeu {Quoridor} -- la partie à analyser
+        échéance {float} -- le moment (time.perf_counter) où la recherche doit s'arrêter
+        table {TableTransposition} -- la table de transposition consultée
+        noeuds {int} -- le nombre de noeuds visités
+        profondeur {int} -- la dernière profondeur complétée
+        profondeur_max {int} -- la profondeur à laquelle la recherche s'arrête
+    """
+
+    def __init__(self, jeu, délai, table=None, profondeur_max=PROFONDEUR_MAX):
+        """
+        Arguments:
+            jeu {Quoridor} -- la partie à analyser
+            délai {float} -- le budget de temps en secondes
+        Keyword Arguments:
+            table {TableTransposition} -- la table à utiliser (default: {None}, la table TABLE)
+            profondeur_max {int} -- la profondeur maximale (default: {PROFONDEUR_MAX})
+        """
+        self.jeu = jeu
+        self.échéance = time.perf_counter() + délai
+        self.table = TABLE if table is None else table
+        self.table.nouvelle_recherche()
+        self.noeuds = 0
+        self.profondeur = 0
+        self.profondeur_max = profondeur_max
+        # coup qui a causé une coupure à chaque profondeur (heuristique du coup meurtrier)
+        self.meurtriers = {}
+
+
+    def coups(self, joueur, ply, premier=None):
+        """Génère les coups du joueur, les plus prometteurs en premier
+        Arguments:
+            joueur {int} -- le numéro du joueur (1 ou 2)
+            ply {int} -- la profondeur du noeud à partir de la racine
+        Keyword Arguments:
+            premier {tuple} -- un coup à essayer avant tous les autres (default: {None})
+        """
+        jeu = self.jeu
+        # déplacements: les plus proches de l'objectif d'abord (lecture du champ de distances)
+        champ = jeu.distances().champs[joueur - 1]
+        déplacements = sorted((('D', case) for case in
+                               jeu.moteur().successeurs(jeu.joueurs[joueur - 1]['pos'])),
+                              key=lambda coup: champ[plateau.case(coup[1])])
+        # murs: seulement ceux qui coupent le chemin de l'adversaire
+        murs = []
+        if jeu.joueurs[joueur - 1]['murs'] > 0:
+            chemin_adverse = jeu.distances().chemin(3 - joueur, jeu.joueurs[2 - joueur]['pos'])
+            if chemin_adverse is not None:
+                murs = [(TYPES_MURS[orientation], position) for position, orientation in
+                        jeu.murs_valides(joueur, murs_candidats(chemin_adverse))]
+        coups = déplacements[:1] + murs + déplacements[1:]
+        # les coups connus pour être bons passent devant
+        for coup in (self.meurtriers.get(ply), premier):
+            if coup in coups:
+                coups.remove(coup)
+                coups.insert(0, coup)
+        return coups
+
+
+    def negamax(self, joueur, profondeur, alpha, beta, ply):
+        """Valeur de la position pour le joueur qui a le trait
+        Arguments:
+            joueur {int} -- le joueur qui a le trait
+            profondeur {int} -- le nombre de demi-coups qu'il reste à explorer
+            alpha, beta {int} -- la fenêtre de recherche
+            ply {int} -- la profondeur du noeud à partir de la racine
+        Raises:
+            TempsÉcoulé -- si le budget de temps est épuisé
+        """
+        self.noeuds += 1
+        if time.perf_counter() > self.échéance:
+            raise TempsÉcoulé()
+        adversaire = 3 - joueur
+        # l'adversaire vient d'atteindre son objectif
+        if self.jeu.joueurs[adversaire - 1]['pos'][1] == RANGÉES_OBJECTIFS[adversaire - 1]:
+            return -(GAGNÉ - ply)
+        if profondeur == 0:
+            return évaluer(self.jeu, joueur)
+        # consulter la table de transposition
+        clé = self.jeu.clé_zobrist(joueur)
+        entrée = self.table.chercher(clé)
+        coup_table = None
+        if entrée is not None:
+            profondeur_table, valeur, drapeau, coup_table = entrée
+            valeur = de_table(valeur, ply)
+            if profondeur_table >= profondeur and (
+                    drapeau == EXACTE or
+                    (drapeau == BORNE_INF and valeur >= beta) or
+                    (drapeau == BORNE_SUP and valeur <= alpha)):
+                return valeur
+        alpha_initial = alpha
+        meilleur = -INFINI
+        meilleur_coup = None
+        for coup in self.coups(joueur, ply, coup_table):
+            self.jeu.appliquer_coup(joueur, coup, effacer_annulés=False)
+            try:
+                score = -self.negamax(adversaire, profondeur - 1, -beta, -alpha, ply + 1)
+            finally:
+                self.jeu.annuler_coup(garder=False)
+            if score > meilleur:
+                meilleur = score
+                meilleur_coup = coup
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                self.meurtriers[ply] = coup
+                break
+        # enregistrer le résultat avec le type de borne qu'il représente
+        if meilleur <= alpha_initial:
+            drapeau = BORNE_SUP
+        elif meilleur >= beta:
+            drapeau = BORNE_INF
+        else:
+            drapeau = EXACTE
+        self.table.enregistrer(clé, profondeur, vers_table(meilleur, ply), drapeau, meilleur_coup)
+        return meilleur
+
+
+    def chercher(self, joueur):
+        """Approfondit la recherche jusqu'à ce que le temps soit écoulé
+        Arguments:
+            joueur {int} -- le joueur qui a le trait
+        Return:
+            tuple -- le meilleur coup (type_coup, position) trouvé
+        """
+        # coup de secours: le déplacement qui rapproche le plus de l'objectif
+        meilleur_coup = ('D', meilleur_pas(self.jeu, joueur))
+        for profondeur in range(1, self.profondeur_max + 1):
+            meilleur_iteration = None
+            alpha = -INFINI
+            try:
+                for coup in self.coups(joueur, 0, meilleur_coup):
+                    self.jeu.appliquer_coup(joueur, coup, effacer_annulés=False)
+                    try:
+                        score = -self.negamax(3 - joueur, profondeur - 1, -INFINI, -alpha, 1)
+                    finally:
+                        self.jeu.annuler_coup(garder=False)
+                    if score > alpha:
+                        alpha = score
+                        meilleur_iteration = coup
+                        # le premier coup essayé est l'ancien meilleur: tout coup
+                        # meilleur que lui à cette profondeur peut être gardé
+                        meilleur_coup = coup
+            except TempsÉcoulé:
+                break
+            self.profondeur = profondeur
+            meilleur_coup = meilleur_iteration
+            # inutile de chercher plus loin une victoire ou une défaite forcée
+            if abs(alpha) >= SEUIL_GAGNÉ:
+                break
+        return meilleur_coup
+
+
+def meilleur_coup(jeu, joueur, délai=1.0, table=None, profondeur=None):
+    """Cherche le meilleur coup pour le joueur spécifié
+    Arguments:
+        jeu {Quoridor} -- la partie (remise dans son état initial au retour)
+        joueur {int} -- le numéro du joueur (1 ou 2)
+    Keyword Arguments:
+        délai {float} -- le budget de temps en secondes (default: {1.0})
+        table {TableTransposition} -- la table à utiliser (default: {None}, la table TABLE)
+        profondeur {int} -- arrêter la recherche à cette profondeur; avec un délai assez
+            long, le coup ne dépend plus de la vitesse de la machine (default: {None})
+    Return:
+        tuple -- le coup (type_coup, position)
+    """
+    if profondeur is None:
+        profondeur = PROFONDEUR_MAX
+    return Recherche(jeu, délai, table, profondeur).chercher(joueur)
+
+
+class TestRecherche(unittest.TestCase):
+    """classe test Recherche"""
+
+    def test_meilleur_coup(self):
+        """ Test de la fonction meilleur_coup
+            Cas à tester:
+                - un joueur à un pas de son objectif y va
+                - un joueur bloque l'adversaire à un pas de son objectif
+                - la partie est remise dans son état initial après la recherche
+                - le budget de temps est respecté
+        """
+        import quoridor
+        for moteur in quoridor.MOTEURS:
+            # victoire immédiate
+            jeu = quoridor.Quoridor([
+                {"nom": "joueur1", "murs": 10, "pos": (2, 8)},
+                {"nom": "joueur2", "murs": 10, "pos": (8, 8)}
+            ], moteur=moteur)
+            self.assertEqual(meilleur_coup(jeu, 1, 0.5), ('D', (2, 9)))
+            # l'adversaire gagne au prochain coup s'il n'est pas bloqué
+            jeu = quoridor.Quoridor([
+                {"nom": "joueur1", "murs": 10, "pos": (1, 5)},
+                {"nom": "joueur2", "murs": 10, "pos": (5, 2)}
+            ], moteur=moteur)
+            etat = jeu.état_partie()
+            debut = time.perf_counter()
+            coup = meilleur_coup(jeu, 1, 0.5)
+            self.assertLess(time.perf_counter() - debut, 1.5)
+            self.assertEqual(coup[0], 'MH')
+            self.assertEqual(jeu.état_partie(), etat)
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -26,6 +26,7 @@ Contient les fonctions:
         - afficher le jeu
         - terminer le jeu
 '''
+import ouverture
 import quoridor
 
 def loop(joueurs, jeu):
@@ -53,7 +54,7 @@ def loop(joueurs, jeu):
                 print(jeu)
                 # jouer le coup du joueur 1
                 if joueurs[(n - 1)] == "robot":
-                    jeu.jouer_coup(n)
+                    jeu.jouer_coup(n, livre=ouverture.livre_défaut())
                 else:
                     print("tout à {}".format(joueurs[(n-1)]))
                     print("indiquer le type de coup à jouer")
@@ -0,0 +1,430 @@
+""" mcts.py
+Module qui contient le second moteur de Quoridor.jouer_coup: une recherche arborescente
+Monte-Carlo (MCTS) avec sélection UCT.
+Les parties simulées (rollouts) ne copient jamais un Quoridor: elles jouent sur un
+ÉtatRapide, quelques entiers (masques de bits de plateau.py) copiés en une opération.
+La politique de simulation avance sur le plus court chemin et place de temps à autre
+un mur au hasard devant l'adversaire.
+La recherche peut être répartie sur plusieurs processus: chacun construit son propre
+arbre à partir de la racine avec sa propre graine, puis les statistiques des coups de
+la racine sont additionnées (parallélisation à la racine).
+contient les fonctions:
+    - chercher
+        construit un arbre pour un budget de simulations ou de temps
+    - meilleur_coup
+        point d'entrée, en un ou plusieurs processus
+contient les classes:
+    - ÉtatRapide
+    - Noeud
+"""
+import math
+import os
+import random
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import ia
+import plateau
+
+
+# constante d'exploration de UCT
+EXPLORATION = 1.4
+# probabilité qu'un joueur qui a encore des murs en place un pendant une simulation
+PROBABILITÉ_MUR = 0.15
+# une simulation plus longue est déclarée nulle
+COUPS_MAX = 200
+# rangée à atteindre (masque) pour chaque joueur
+OBJECTIFS = (plateau.RANGÉE_9, plateau.RANGÉE_1)
+# passages coupés par chaque mur: (orientation, bit) -> ((direction, masque), (direction, masque))
+COUPURES = {(orientation, bit): plateau.coupures(plateau.mur(bit, orientation), orientation)
+            for orientation in ('horizontal', 'vertical') for bit in range(64)}
+
+
+class ÉtatRapide:
+    """ÉtatRapide
+    Position de Quoridor réduite à des entiers, pour les simulations.
+    Les coups sont des tuples (type_coup, bit): le bit de la case pour 'D',
+    le bit du mur (plateau.bit_mur) pour 'MH' et 'MV'.
+    Attributs:
+        pions {list} -- les numéros de bit des deux jetons
+        réserves {list} -- le nombre de murs qu'il reste à chaque joueur
+        libres {dict} -- les masques de libertés du damier (plateau.libertés)
+        murh, murv {int} -- les masques des murs placés
+    """
+    __slots__ = ('pions', 'réserves', 'libres', 'murh', 'murv')
+
+    def __init__(self, pions, réserves, libres, murh, murv):
+        self.pions = pions
+        self.réserves = réserves
+        self.libres = libres
+        self.murh = murh
+        self.murv = murv
+
+
+    @classmethod
+    def depuis_partie(cls, jeu):
+        """Construit l'état d'une partie Quoridor"""
+        murh = 0
+        for mur in jeu.murh:
+            murh |= 1 << plateau.bit_mur(mur, 'horizontal')
+        murv = 0
+        for mur in jeu.murv:
+            murv |= 1 << plateau.bit_mur(mur, 'vertical')
+        return cls([plateau.case(joueur['pos']) for joueur in jeu.joueurs],
+                   [joueur['murs'] for joueur in jeu.joueurs],
+                   plateau.libertés(jeu.murh, jeu.murv), murh, murv)
+
+
+    def copie(self):
+        """Copie l'état (quelques entiers, sans copie profonde)"""
+        return ÉtatRapide(self.pions[:], self.réserves[:], self.libres.copy(),
+                          self.murh, self.murv)
+
+
+    def gagnant(self):
+        """Donne le joueur (1 ou 2) qui a atteint son objectif, ou None"""
+        if (OBJECTIFS[0] >> self.pions[0]) & 1:
+            return 1
+        if (OBJECTIFS[1] >> self.pions[1]) & 1:
+            return 2
+        return None
+
+
+    def couches(self, joueur):
+        """Donne les cases groupées par distance à l'objectif du joueur (sans les jetons)
+        Return:
+            tuple -- (couches, atteignables): la liste des masques de cases à distance
+                0, 1, 2, ... et le masque de toutes les cases d'où l'objectif est accessible
+        """
+        front = OBJECTIFS[joueur - 1]
+        atteignables = front
+        couches = []
+        while front:
+            couches.append(front)
+            # les murs sont symétriques: les voisins d'une couche sont à un pas de plus
+            front = plateau.voisins(front, self.libres) & ~atteignables
+            atteignables |= front
+        return couches, atteignables
+
+
+    def chemin(self, joueur, couches):
+        """Donne les cases d'un plus court chemin du joueur (sans les jetons), en
+        descendant les couches de distance
+        """
+        bit = self.pions[joueur - 1]
+        distance = next(indice for indice, couche in enumerate(couches) if (couche >> bit) & 1)
+        chemin = [bit]
+        for couche in reversed(couches[:distance]):
+            masque = plateau.voisins(1 << bit, self.libres) & couche
+            bit = (masque & -masque).bit_length() - 1
+            chemin.append(bit)
+        return chemin
+
+
+    def pas(self, joueur, couches):
+        """Donne le déplacement permis qui rapproche le plus le joueur de son objectif"""
+        permis = plateau.successeurs(self.pions[joueur - 1], self.pions, self.libres)
+        for couche in couches:
+            if permis & couche:
+                masque = permis & couche
+                return (masque & -masque).bit_length() - 1
+        # aucun déplacement vers une case d'où l'objectif est accessible
+        return (permis & -permis).bit_length() - 1 if permis else None
+
+
+    def mur_libre(self, bit, orientation):
+        """Vérifie qu'un mur ne chevauche ni ne croise un mur déjà placé"""
+        # un mur horizontal et le mur vertical qui le croise ont le même bit
+        if ((self.murh | self.murv) >> bit) & 1:
+            return False
+        if orientation == 'horizontal':
+            colonne = bit % 8
+            return not ((colonne > 0 and (self.murh >> (bit - 1)) & 1) or
+                        (colonne < 7 and (self.murh >> (bit + 1)) & 1))
+        rangée = bit // 8
+        return not ((rangée > 0 and (self.murv >> (bit - 8)) & 1) or
+                    (rangée < 7 and (self.murv >> (bit + 8)) & 1))
+
+
+    def poser(self, joueur, bit, orientation, vérifier=True):
+        """Place un mur s'il est permis
+        Arguments:
+            joueur {int} -- le joueur qui place le mur
+            bit {int} -- le bit du mur
+            orientation {str} -- 'horizontal' ou 'vertical'
+        Keyword Arguments:
+            vérifier {bool} -- vérifier que le mur est libre et n'enferme personne
+                (default: {True})
+        Return:
+            bool -- True si le mur a été placé (l'état n'est pas modifié sinon)
+        """
+        if vérifier and not self.mur_libre(bit, orientation):
+            return False
+        anciens = self.libres.copy()
+        for direction, masque in COUPURES[(orientation, bit)]:
+            self.libres[direction] &= ~masque
+        if vérifier:
+            for numero in (1, 2):
+                if not (self.couches(numero)[1] >> self.pions[numero - 1]) & 1:
+                    self.libres = anciens
+                    return False
+        if orientation == 'horizontal':
+            self.murh |= 1 << bit
+        else:
+            self.murv |= 1 << bit
+        self.réserves[joueur - 1] -= 1
+        return True
+
+
+    def jouer(self, joueur, coup):
+        """Joue un coup déjà validé (voir coups)"""
+        type_coup, bit = coup
+        if type_coup == 'D':
+            self.pions[joueur - 1] = bit
+        else:
+            self.poser(joueur, bit, ia.ORIENTATIONS[type_coup], vérifier=False)
+
+
+    def coups(self, joueur):
+        """Donne les coups considérés dans l'arbre: tous les déplacements, et les murs
+        permis qui coupent le plus court chemin de l'adversaire (comme ia.murs_candidats)
+        """
+        coups = [('D', bit) for bit in plateau.bits(
+            plateau.successeurs(self.pions[joueur - 1], self.pions, self.libres))]
+        if self.réserves[joueur - 1] > 0:
+            adversaire = 3 - joueur
+            chemin = [plateau.position(bit) for bit in
+                      self.chemin(adversaire, self.couches(adversaire)[0])]
+            for position_mur, orientation in ia.murs_candidats(chemin + ['B1']):
+                x, y = position_mur
+                if orientation == 'horizontal' and not (1 <= x <= 8 and 2 <= y <= 9):
+                    continue
+                if orientation == 'vertical' and not (2 <= x <= 9 and 1 <= y <= 8):
+                    continue
+                bit = plateau.bit_mur(position_mur, orientation)
+                essai = self.copie()
+                if essai.poser(joueur, bit, orientation):
+                    coups.append((ia.TYPES_MURS[orientation], bit))
+        return coups
+
+
+    def simuler(self, trait, hasard, probabilité_mur=PROBABILITÉ_MUR):
+        """Joue la partie jusqu'au bout (l'état est modifié)
+        Chaque joueur avance sur son plus court chemin, ou place parfois un mur qui
+        coupe le prochain pas de l'adversaire.
+        Arguments:
+            trait {int} -- le joueur qui joue le premier
+            hasard {random.Random} -- le générateur des choix
+        Return:
+            int -- le gagnant (1 ou 2), ou 0 si la partie dépasse COUPS_MAX
+        """
+        couches = [self.couches(1)[0], self.couches(2)[0]]
+        joueur = trait
+        for _ in range(COUPS_MAX):
+            gagnant = self.gagnant()
+            if gagnant:
+                return gagnant
+            adversaire = 3 - joueur
+            if self.réserves[joueur - 1] > 0 and hasard.random() < probabilité_mur:
+                # un mur devant le prochain pas de l'adversaire
+                chemin = self.chemin(adversaire, couches[adversaire - 1])
+                if len(chemin) > 1:
+                    départ, arrivée = (plateau.position(bit) for bit in chemin[:2])
+                    position_mur, orientation = hasard.choice(
+                        ia.murs_candidats([départ, arrivée, 'B1']))
+                    x, y = position_mur
+                    if ((1 <= x <= 8 and 2 <= y <= 9) if orientation == 'horizontal'
+                            else (2 <= x <= 9 and 1 <= y <= 8)) and self.poser(
+                                joueur, plateau.bit_mur(position_mur, orientation), orientation):
+                        couches = [self.couches(1)[0], self.couches(2)[0]]
+                        joueur = adversaire
+                        continue
+            bit = self.pas(joueur, couches[joueur - 1])
+            if bit is not None:
+                self.pions[joueur - 1] = bit
+            joueur = adversaire
+        return self.gagnant() or 0
+
+
+class Noeud:
+    """Noeud
+    Noeud de l'arbre de recherche.
+    Attributs:
+        coup {tuple} -- le coup qui mène à ce noeud
+        joueur {int} -- le joueur qui a joué ce coup (les gains sont de son point de vue)
+        parent {Noeud} -- le noeud précédent
+        enfants {list} -- les noeuds déjà développés
+        à_essayer {list} -- les coups pas encore développés (None: pas encore générés)
+        visites {int} -- le nombre de simulations passées par ce noeud
+        gains {float} -- les victoires du joueur (une nulle compte pour une demie)
+    """
+    __slots__ = ('coup', 'joueur', 'parent', 'enfants', 'à_essayer', 'visites', 'gains')
+
+    def __init__(self, coup, joueur, parent=None):
+        self.coup = coup
+        self.joueur = joueur
+        self.parent = parent
+        self.enfants = []
+        self.à_essayer = None
+        self.visites = 0
+        self.gains = 0.0
+
+
+    def uct(self, journal_parent):
+        """Valeur UCT du noeud: taux de victoire plus bonus d'exploration"""
+        return (self.gains / self.visites +
+                EXPLORATION * math.sqrt(journal_parent / self.visites))
+
+
+def chercher(état, joueur, itérations=None, délai=None, graine=None):
+    """Construit un arbre de recherche à partir d'une position
+    Arguments:
+        état {ÉtatRapide} -- la position (non modifiée)
+        joueur {int} -- le joueur qui a le trait
+    Keyword Arguments:
+        itérations {int} -- le nombre de simulations (default: {None})
+        délai {float} -- le budget de temps en secondes, si itérations n'est pas donné
+            (default: {None}, 1 seconde)
+        graine {int} -- la graine du générateur (default: {None})
+    Return:
+        dict -- pour chaque coup de la racine: (visites, gains)
+    """
+    hasard = random.Random(graine)
+    racine = Noeud(None, 3 - joueur)
+    échéance = time.perf_counter() + (1.0 if délai is None else délai)
+    itération = 0
+    while True:
+        if itérations is not None:
+            if itération >= itérations:
+                break
+        elif itération % 16 == 0 and time.perf_counter() > échéance:
+            break
+        itération += 1
+        courant = état.copie()
+        noeud = racine
+        # sélection: descendre tant que tous les coups du noeud ont été développés
+        while noeud.à_essayer == [] and noeud.enfants:
+            journal = math.log(noeud.visites)
+            noeud = max(noeud.enfants, key=lambda enfant: enfant.uct(journal))
+            courant.jouer(noeud.joueur, noeud.coup)
+        # développement d'un nouveau coup
+        if courant.gagnant() is None:
+            if noeud.à_essayer is None:
+                noeud.à_essayer = courant.coups(3 - noeud.joueur)
+                hasard.shuffle(noeud.à_essayer)
+            if noeud.à_essayer:
+                enfant = Noeud(noeud.à_essayer.pop(), 3 - noeud.joueur, noeud)
+                noeud.enfants.append(enfant)
+                courant.jouer(enfant.joueur, enfant.coup)
+                noeud = enfant
+        # simulation, puis remontée du résultat
+        gagnant = courant.gagnant() or courant.simuler(3 - noeud.joueur, hasard)
+        while noeud is not None:
+            noeud.visites += 1
+            if gagnant == noeud.joueur:
+                noeud.gains += 1
+            elif not gagnant:
+                noeud.gains += 0.5
+            noeud = noeud.parent
+    return {enfant.coup: (enfant.visites, enfant.gains) for enfant in racine.enfants}
+
+
+def _chercher(arguments):
+    """chercher avec ses arguments en un tuple, pour ProcessPoolExecutor"""
+    return chercher(*arguments)
+
+
+# processus gardés d'une recherche à l'autre, créés au premier besoin
+_EXÉCUTEUR = None
+_PROCESSUS = 0
+
+
+def exécuteur(processus):
+    """Donne un ProcessPoolExecutor de la taille demandée, réutilisé d'un coup à l'autre"""
+    global _EXÉCUTEUR, _PROCESSUS
+    if _EXÉCUTEUR is None or _PROCESSUS != processus:
+        if _EXÉCUTEUR is not None:
+            _EXÉCUTEUR.shutdown()
+        _EXÉCUTEUR = ProcessPoolExecutor(processus)
+        _PROCESSUS = processus
+    return _EXÉCUTEUR
+
+
+def meilleur_coup(jeu, joueur, délai=1.0, itérations=None, processus=1, graine=None):
+    """Cherche le meilleur coup du joueur par MCTS
+    Arguments:
+        jeu {Quoridor} -- la partie (non modifiée)
+        joueur {int} -- le numéro du joueur (1 ou 2)
+    Keyword Arguments:
+        délai {float} -- le budget de temps en secondes (default: {1.0})
+        itérations {int} -- le nombre total de simulations; remplace le délai (default: {None})
+        processus {int} -- le nombre de processus; chacun fait sa part du budget
+            (default: {1}, dans le processus courant)
+        graine {int} -- la graine de la recherche (default: {None})
+    Return:
+        tuple -- le coup le plus visité (type_coup, position), ou None si aucun coup
+    """
+    état = ÉtatRapide.depuis_partie(jeu)
+    if processus <= 1:
+        statistiques = chercher(état, joueur, itérations, délai, graine)
+    else:
+        part = None if itérations is None else -(-itérations // processus)
+        graines = [None if graine is None else graine + numero for numero in range(processus)]
+        statistiques = {}
+        # additionner les statistiques de la racine de chaque arbre
+        for résultat in exécuteur(processus).map(
+                _chercher, [(état, joueur, part, délai, graine_processus)
+                            for graine_processus in graines]):
+            for coup, (visites, gains) in résultat.items():
+                anciennes = statistiques.get(coup, (0, 0.0))
+                statistiques[coup] = (anciennes[0] + visites, anciennes[1] + gains)
+    if not statistiques:
+        return None
+    type_coup, bit = max(statistiques, key=lambda coup: statistiques[coup])
+    if type_coup == 'D':
+        return ('D', plateau.position(bit))
+    return (type_coup, plateau.mur(bit, ia.ORIENTATIONS[type_coup]))
+
+
+class TestMCTS(unittest.TestCase):
+    """classe test MCTS"""
+
+    def test_meilleur_coup(self):
+        """ Test de la recherche MCTS
+            Cas à tester:
+                - les murs de l'arbre sont permis par Quoridor
+                - une victoire immédiate est trouvée
+                - la recherche en deux processus donne un coup valide
+                - jouer_coup accepte le mode 'mcts', avec ses itérations et ses processus
+        """
+        import quoridor
+        jeu = quoridor.Quoridor([{"nom": "joueur1", "murs": 8, "pos": (5, 4)},
+                                 {"nom": "joueur2", "murs": 10, "pos": (5, 6)}],
+                                {"horizontaux": [(4, 5)], "verticaux": [(7, 3)]})
+        état = ÉtatRapide.depuis_partie(jeu)
+        for type_coup, bit in état.coups(1):
+            if type_coup != 'D':
+                position = plateau.mur(bit, ia.ORIENTATIONS[type_coup])
+                self.assertIn((position, ia.ORIENTATIONS[type_coup]), jeu.murs_valides(1))
+        self.assertEqual(état.copie().simuler(1, random.Random(1)) in (0, 1, 2), True)
+        # la simulation ne modifie pas l'état de départ
+        self.assertEqual(état.pions, [plateau.case((5, 4)), plateau.case((5, 6))])
+        jeu = quoridor.Quoridor([{"nom": "joueur1", "murs": 10, "pos": (2, 8)},
+                                 {"nom": "joueur2", "murs": 10, "pos": (8, 2)}])
+        self.assertEqual(meilleur_coup(jeu, 1, itérations=300, graine=3), ('D', (2, 9)))
+        coup = meilleur_coup(jeu, 2, itérations=200, processus=2, graine=3)
+        self.assertEqual(coup[0] in ('D', 'MH', 'MV'), True)
+        # jouer_coup transmet le nombre d'itérations et de processus
+        self.assertEqual(jeu.jouer_coup(1, 60.0, mode='mcts', itérations=300, processus=2),
+                         ('D', (2, 9)))
+        jeu = quoridor.Quoridor(["joueur1", "joueur2"])
+        type_coup, position = jeu.jouer_coup(1, 0.2, mode='mcts')
+        self.assertEqual(len(jeu.historique), 1)
+        self.assertRaisesRegex(quoridor.QuoridorError, "mode invalide!",
+                               jeu.jouer_coup, 2, 0.1, mode='inconnu')
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -0,0 +1,264 @@
+""" ouverture.py
+Module du livre d'ouvertures: les premiers coups de la partie, cherchés d'avance
+par des recherches profondes, pour que Quoridor.jouer_coup n'y dépense pas son délai.
+Toutes les parties commencent de la même position, les premiers coups reviennent donc
+d'une partie à l'autre.
+Format du fichier (petit-boutiste):
+    - entête: MAGIQUE (8 octets), le nombre de bits de l'index, le nombre d'entrées
+    - index: 2**bits + 1 rangs d'entrées (uint32); les entrées dont la clé commence
+      par les bits b sont aux rangs index[b] à index[b + 1]
+    - entrées, triées par clé: la clé de Zobrist avec le trait (uint64), le code du
+      coup (plateau.coder_coup) et la profondeur de la recherche qui l'a choisi
+Le fichier est lu par mmap: une recherche lit deux rangs de l'index puis, en moyenne,
+moins de deux entrées, sans jamais charger le livre en mémoire.
+contient les fonctions:
+    - construire
+        cherche les coups du livre à partir de la position de départ
+    - écrire
+        écrit des entrées dans le format du livre
+    - livre_défaut
+        le livre FICHIER_LIVRE, ouvert au premier appel
+contient les classes:
+    - LivreOuvertures
+"""
+import argparse
+import mmap
+import os
+import struct
+import unittest
+
+import ia
+import plateau
+import transposition
+
+
+# signature du format
+MAGIQUE = b'QLIVRE01'
+# entête: signature, bits de l'index, nombre d'entrées
+ENTÊTE = struct.Struct('<8sII')
+# deux rangs consécutifs de l'index
+RANGS = struct.Struct('<II')
+# entrée: clé, code du coup, profondeur
+ENTRÉE = struct.Struct('<QHH')
+# fichier du livre par défaut (voir livre_défaut): Quoridor.jouer_coup ne consulte
+# un livre que s'il lui est donné, comme le font main.py et session.py
+FICHIER_LIVRE = os.environ.get('QUORIDOR_LIVRE', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'ouvertures.livre'))
+
+
+def écrire(chemin, entrées):
+    """Écrit un livre d'ouvertures
+    Le fichier est écrit à côté puis renommé: un livre ouvert par une autre partie
+    n'est jamais vu à moitié écrit.
+    Arguments:
+        chemin {str} -- le fichier à écrire
+        entrées {dict} -- clé de Zobrist avec le trait -> (code du coup, profondeur)
+    """
+    clés = sorted(entrées)
+    # environ une entrée par case de l'index
+    bits = min(max(len(clés).bit_length(), 4), 24)
+    index = [0] * ((1 << bits) + 1)
+    for clé in clés:
+        index[(clé >> (64 - bits)) + 1] += 1
+    for seau in range(1 << bits):
+        index[seau + 1] += index[seau]
+    temporaire = chemin + '.tmp'
+    with open(temporaire, 'wb') as fichier:
+        fichier.write(ENTÊTE.pack(MAGIQUE, bits, len(clés)))
+        fichier.write(struct.pack('<{}I'.format(len(index)), *index))
+        for clé in clés:
+            fichier.write(ENTRÉE.pack(clé, *entrées[clé]))
+    os.replace(temporaire, chemin)
+
+
+class LivreOuvertures:
+    """LivreOuvertures
+    Livre d'ouvertures lu directement dans le fichier (mmap).
+    Attributs:
+        chemin {str} -- le fichier du livre
+        bits {int} -- le nombre de bits de clé de l'index
+        taille {int} -- le nombre d'entrées
+    """
+
+    def __init__(self, chemin):
+        """
+        Arguments:
+            chemin {str} -- le fichier du livre (voir écrire)
+        Raises:
+            ValueError -- si le fichier n'est pas un livre d'ouvertures
+        """
+        self.chemin = chemin
+        with open(chemin, 'rb') as fichier:
+            self.mémoire = mmap.mmap(fichier.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.mémoire) < ENTÊTE.size:
+            self.mémoire.close()
+            raise ValueError("livre d'ouvertures invalide: {}".format(chemin))
+        magique, self.bits, self.taille = ENTÊTE.unpack_from(self.mémoire, 0)
+        self.début = ENTÊTE.size + 4 * ((1 << self.bits) + 1)
+        if magique != MAGIQUE or len(self.mémoire) != self.début + ENTRÉE.size * self.taille:
+            self.mémoire.close()
+            raise ValueError("livre d'ouvertures invalide: {}".format(chemin))
+
+
+    def __len__(self):
+        return self.taille
+
+
+    def chercher(self, clé):
+        """Donne l'entrée d'une position
+        Arguments:
+            clé {int} -- la clé de Zobrist de la position, avec le trait
+        Return:
+            tuple -- (code du coup, profondeur), ou None si la position n'est pas au livre
+        """
+        bas, haut = RANGS.unpack_from(self.mémoire, ENTÊTE.size + 4 * (clé >> (64 - self.bits)))
+        for rang in range(bas, haut):
+            clé_entrée, code, profondeur = ENTRÉE.unpack_from(
+                self.mémoire, self.début + ENTRÉE.size * rang)
+            if clé_entrée == clé:
+                return (code, profondeur)
+            # les entrées sont triées
+            if clé_entrée > clé:
+                break
+        return None
+
+
+    def coup(self, jeu, joueur):
+        """Donne le coup du livre pour le joueur qui a le trait
+        Arguments:
+            jeu {Quoridor} -- la partie
+            joueur {int} -- le joueur qui a le trait (1 ou 2)
+        Return:
+            tuple -- le coup (type_coup, position), ou None hors du livre
+        """
+        entrée = self.chercher(jeu.clé_zobrist(joueur))
+        return None if entrée is None else plateau.décoder_coup(entrée[0])
+
+
+    def fermer(self):
+        """Libère le fichier"""
+        self.mémoire.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *erreur):
+        self.fermer()
+
+
+# livre de FICHIER_LIVRE, ouvert au premier appel de livre_défaut
+_LIVRE = None
+_CHERCHÉ = False
+
+
+def livre_défaut():
+    """Donne le livre de FICHIER_LIVRE, ou None s'il n'existe pas"""
+    global _LIVRE, _CHERCHÉ
+    if not _CHERCHÉ:
+        _CHERCHÉ = True
+        if os.path.exists(FICHIER_LIVRE):
+            _LIVRE = LivreOuvertures(FICHIER_LIVRE)
+    return _LIVRE
+
+
+def construire(plies=4, largeur=3, profondeur=3, délai=30.0, moteur='bits', trait=1):
+    """Cherche les coups du livre à partir de la position de départ
+    Pour chaque position, le meilleur coup du joueur qui a le trait est cherché à
+    profondeur fixe. Les positions suivantes sont celles après ce coup et après les
+    largeur - 1 autres coups les plus prometteurs (dans l'ordre de ia.Recherche.coups),
+    pour que le livre couvre aussi les réponses probables de l'adversaire.
+    Keyword Arguments:
+        plies {int} -- le nombre de demi-coups couverts par le livre (default: {4})
+        largeur {int} -- le nombre de coups suivis à chaque position (default: {3})
+        profondeur {int} -- la profondeur des recherches (default: {3})
+        délai {float} -- le délai de chaque recherche, assez long pour atteindre
+            la profondeur (default: {30.0})
+        moteur {str} -- le moteur des parties (default: {'bits'})
+        trait {int} -- le joueur qui joue le premier coup (default: {1})
+    Return:
+        dict -- les entrées du livre (voir écrire)
+    """
+    import quoridor
+    jeu = quoridor.Quoridor(['joueur1', 'joueur2'], moteur=moteur)
+    table = transposition.TableTransposition()
+    entrées = {}
+
+    def explorer(joueur, restants):
+        clé = jeu.clé_zobrist(joueur)
+        if restants == 0 or clé in entrées or jeu.partie_terminée():
+            return
+        coup = ia.meilleur_coup(jeu, joueur, délai, table, profondeur)
+        entrées[clé] = (plateau.coder_coup(coup), profondeur)
+        suivants = [coup] + [autre for autre in ia.Recherche(jeu, 0, table).coups(joueur, 0)
+                             if autre != coup][:largeur - 1]
+        for suivant in suivants:
+            jeu.appliquer_coup(joueur, suivant)
+            try:
+                explorer(3 - joueur, restants - 1)
+            finally:
+                jeu.annuler_coup(garder=False)
+
+    explorer(trait, plies)
+    return entrées
+
+
+def analyser_commande():
+    """Lit les arguments de la ligne de commande"""
+    analyseur = argparse.ArgumentParser(description="Construction du livre d'ouvertures")
+    analyseur.add_argument('--sortie', default=FICHIER_LIVRE, help="fichier du livre")
+    analyseur.add_argument('--plies', type=int, default=4,
+                           help="nombre de demi-coups couverts par le livre")
+    analyseur.add_argument('--largeur', type=int, default=3,
+                           help="nombre de coups suivis à chaque position")
+    analyseur.add_argument('--profondeur', type=int, default=3,
+                           help="profondeur des recherches")
+    return analyseur.parse_args()
+
+
+class TestLivreOuvertures(unittest.TestCase):
+    """classe test LivreOuvertures"""
+
+    def test_livre(self):
+        """ Test du livre d'ouvertures
+            Cas à tester:
+                - chaque entrée écrite est retrouvée, une clé absente ne l'est pas
+                - le livre construit couvre la position de départ pour les deux joueurs
+                - jouer_coup joue le coup du livre, puis cherche hors du livre
+                - un fichier qui n'est pas un livre est refusé
+        """
+        import random
+        import tempfile
+        import quoridor
+        hasard = random.Random(5)
+        entrées = {hasard.getrandbits(64): (hasard.randrange(209), 3) for _ in range(500)}
+        with tempfile.TemporaryDirectory() as dossier:
+            chemin = os.path.join(dossier, 'test.livre')
+            écrire(chemin, entrées)
+            with LivreOuvertures(chemin) as livre:
+                self.assertEqual(len(livre), 500)
+                for clé, entrée in entrées.items():
+                    self.assertEqual(livre.chercher(clé), entrée)
+                self.assertEqual(livre.chercher(hasard.getrandbits(64)), None)
+            entrées = construire(plies=1, profondeur=1, trait=1)
+            entrées.update(construire(plies=1, profondeur=1, trait=2))
+            écrire(chemin, entrées)
+            with LivreOuvertures(chemin) as livre:
+                jeu = quoridor.Quoridor(['joueur1', 'joueur2'])
+                coup = livre.coup(jeu, 1)
+                self.assertEqual(coup, ia.meilleur_coup(jeu, 1, 5.0, profondeur=1))
+                self.assertNotEqual(livre.coup(jeu, 2), None)
+                self.assertEqual(jeu.jouer_coup(1, 0.05, livre=livre), coup)
+                self.assertEqual(livre.coup(jeu, 2), None)
+                self.assertEqual(len(jeu.jouer_coup(2, 0.05, livre=livre)), 2)
+            with open(chemin, 'wb') as fichier:
+                fichier.write(b'pas un livre')
+            self.assertRaises(ValueError, LivreOuvertures, chemin)
+
+
+if __name__ == '__main__':
+    COM = analyser_commande()
+    ENTRÉES = construire(COM.plies, COM.largeur, COM.profondeur)
+    écrire(COM.sortie, ENTRÉES)
+    print("{} positions écrites dans {}".format(len(ENTRÉES), COM.sortie))
@@ -0,0 +1,553 @@
+""" plateau.py
+Module qui contient une représentation compacte du damier en masques de bits.
+Chaque case (x, y) est le bit (x-1) + 9*(y-1) d'un entier de 81 bits, et chaque
+mur est un bit d'un entier de 64 bits par orientation. Les recherches de chemin
+se font par propagation de fronts entiers (décalages de bits), sans networkx.
+Les règles de déplacement (sauts en ligne droite et en diagonale) sont exactement
+celles de quoridor.construire_graphe.
+contient les fonctions:
+    - case / position
+        conversions entre (x, y) et numéro de bit
+    - bit_mur / mur
+        conversions entre la position d'un mur et son numéro de bit
+    - masque_murs
+        masque des murs d'une orientation
+    - coder_coup / décoder_coup
+        conversions entre un coup (type_coup, position) et un entier de 0 à 208
+    - libertés
+        masques des cases qui peuvent se déplacer dans chaque direction
+    - successeurs / distance / plus_court_chemin
+        déplacements et recherche de chemin sur des masques
+    - murs_interdits
+        masques des emplacements de murs occupés, chevauchés ou croisés
+contient les classes:
+    - PlateauBits
+    - IndexMurs
+"""
+import unittest
+
+
+# masques de base du damier
+TOUT = (1 << 81) - 1
+COLONNE_1 = sum(1 << (9 * y) for y in range(9))
+COLONNE_9 = COLONNE_1 << 8
+RANGÉE_1 = (1 << 9) - 1
+RANGÉE_9 = RANGÉE_1 << 72
+# masque des cases à atteindre pour chaque objectif
+OBJECTIFS = {'B1': RANGÉE_9, 'B2': RANGÉE_1}
+# masques des 64 emplacements de murs d'une orientation (8 colonnes par rangée)
+TOUS_MURS = (1 << 64) - 1
+COLONNE_MURS_1 = sum(1 << (8 * rangée) for rangée in range(8))
+COLONNE_MURS_8 = COLONNE_MURS_1 << 7
+
+
+class MurOccupé(ValueError):
+    """MurOccupé
+    Soulevée lorsqu'un mur coupe un passage déjà coupé par un autre mur
+    """
+
+
+def case(position):
+    """Donne le numéro de bit de la case (x, y)"""
+    return (position[0] - 1) + 9 * (position[1] - 1)
+
+
+def position(bit):
+    """Donne la position (x, y) du numéro de bit spécifié"""
+    return (bit % 9 + 1, bit // 9 + 1)
+
+
+def bits(masque):
+    """Itère sur les numéros de bit allumés d'un masque"""
+    while masque:
+        bas = masque & -masque
+        yield bas.bit_length() - 1
+        masque ^= bas
+
+
+def bit_mur(position_mur, orientation):
+    """Donne le numéro de bit d'un mur dans le masque de son orientation
+    Arguments:
+        position_mur {tuple} -- le tuple (x, y) de la position du mur
+        orientation {str} -- 'horizontal' ou 'vertical'
+    """
+    if orientation == 'horizontal':
+        return (position_mur[0] - 1) + 8 * (position_mur[1] - 2)
+    return (position_mur[0] - 2) + 8 * (position_mur[1] - 1)
+
+
+def masque_murs(murs, orientation):
+    """Donne le masque des murs d'une orientation
+    Arguments:
+        murs {list} -- une liste des positions (x,y) des murs
+        orientation {str} -- 'horizontal' ou 'vertical'
+    """
+    masque = 0
+    for position_mur in murs:
+        masque |= 1 << bit_mur(position_mur, orientation)
+    return masque
+
+
+def mur(bit, orientation):
+    """Donne la position (x, y) du mur au numéro de bit spécifié, inverse de bit_mur"""
+    if orientation == 'horizontal':
+        return (bit % 8 + 1, bit // 8 + 2)
+    return (bit % 8 + 2, bit // 8 + 1)
+
+
+# premier code de chaque type de coup: 81 déplacements, puis 64 murs de chaque orientation
+DÉBUTS_CODES = {'D': 0, 'MH': 81, 'MV': 145}
+# nombre total de codes de coups
+NOMBRE_CODES = 209
+
+
+def coder_coup(coup):
+    """Code un coup (type_coup, position) en un entier de 0 à 208 (tient dans un octet)
+    Arguments:
+        coup {tuple} -- le type de coup ('D', 'MH' ou 'MV') et la position (x, y)
+    """
+    type_coup, position_coup = coup
+    if type_coup == 'D':
+        return case(position_coup)
+    orientation = 'horizontal' if type_coup == 'MH' else 'vertical'
+    return DÉBUTS_CODES[type_coup] + bit_mur(position_coup, orientation)
+
+
+def décoder_coup(code):
+    """Décode un entier de coder_coup en un coup (type_coup, position)"""
+    if code < 81:
+        return ('D', position(code))
+    if code < 145:
+        return ('MH', mur(code - 81, 'horizontal'))
+    return ('MV', mur(code - 145, 'vertical'))
+
+
+def coupures(position_mur, orientation):
+    """Donne les passages coupés par un mur
+    Arguments:
+        position_mur {tuple} -- le tuple (x, y) de la position du mur
+        orientation {str} -- 'horizontal' ou 'vertical'
+    Return:
+        tuple -- (direction, masque) où masque contient les 2 cases qui ne peuvent
+            plus aller dans cette direction, puis (direction, masque) pour le sens inverse
+    """
+    x, y = position_mur
+    if orientation == 'horizontal':
+        # les cases sous le mur ne peuvent plus monter, celles au-dessus descendre
+        dessous = (1 << case((x, y - 1))) | (1 << case((x + 1, y - 1)))
+        return (('nord', dessous), ('sud', dessous << 9))
+    # les cases à gauche du mur ne peuvent plus aller à droite, et vice versa
+    gauche = (1 << case((x - 1, y))) | (1 << case((x - 1, y + 1)))
+    return (('est', gauche), ('ouest', gauche << 1))
+
+
+def libertés(murs_horizontaux, murs_verticaux):
+    """Calcule les masques des cases qui peuvent se déplacer dans chaque direction
+    Arguments:
+        murs_horizontaux {list} -- une liste des positions (x,y) des murs horizontaux.
+        murs_verticaux {list} -- une liste des positions (x,y) des murs verticaux.
+    Return:
+        dict -- 'nord', 'sud', 'est', 'ouest' vers le masque des cases libres
+    """
+    libres = {'nord': TOUT & ~RANGÉE_9, 'sud': TOUT & ~RANGÉE_1,
+              'est': TOUT & ~COLONNE_9, 'ouest': TOUT & ~COLONNE_1}
+    for murs, orientation in ((murs_horizontaux, 'horizontal'),
+                              (murs_verticaux, 'vertical')):
+        for mur in murs:
+            for direction, masque in coupures(mur, orientation):
+                libres[direction] &= ~masque
+    return libres
+
+
+def voisins(masque, libres):
+    """Propage un masque de cases d'un pas dans les 4 directions, en respectant les murs"""
+    return (((masque & libres['nord']) << 9) | ((masque & libres['sud']) >> 9) |
+            ((masque & libres['est']) << 1) | ((masque & libres['ouest']) >> 1))
+
+
+def sauts(pions, libres):
+    """Calcule les sauts ajoutés par les joueurs, comme le fait construire_graphe
+    Arguments:
+        pions {list} -- les numéros de bit des deux joueurs
+        libres {dict} -- les masques de libertés du damier
+    Return:
+        dict -- numéro de bit d'une case voisine d'un joueur vers le masque de ses sauts
+    """
+    masque_pions = 0
+    for pion in pions:
+        masque_pions |= 1 << pion
+    résultat = {}
+    # successeurs de chaque joueur au moment où construire_graphe le traite
+    succ_joueur = {}
+    for pion in pions:
+        succ = succ_joueur.get(pion, voisins(1 << pion, libres))
+        for prédécesseur in bits(voisins(1 << pion, libres)):
+            # ajout d'un lien sauteur en ligne droite si admissible
+            droit = 2 * pion - prédécesseur
+            if 0 <= droit < 81 and (succ >> droit) & 1 and not (masque_pions >> droit) & 1:
+                ajout = 1 << droit
+            else:
+                # sinon les liens en diagonal
+                ajout = succ & ~(1 << prédécesseur) & ~masque_pions
+            résultat[prédécesseur] = résultat.get(prédécesseur, 0) | ajout
+            # le prédécesseur perd son arc vers le joueur et gagne ses sauts
+            if prédécesseur in pions:
+                succ_joueur[prédécesseur] = ((voisins(1 << prédécesseur, libres)
+                                              & ~(1 << pion)) | ajout)
+    return résultat
+
+
+def successeurs(bit, pions, libres, table_sauts=None):
+    """Donne le masque des cases atteignables en un coup à partir d'une case
+    Arguments:
+        bit {int} -- le numéro de bit de la case de départ
+        pions {list} -- les numéros de bit des deux joueurs
+        libres {dict} -- les masques de libertés du damier
+    Keyword Arguments:
+        table_sauts {dict} -- les sauts déjà calculés par sauts() (default: {None})
+    """
+    if table_sauts is None:
+        table_sauts = sauts(pions, libres)
+    masque_pions = (1 << pions[0]) | (1 << pions[1])
+    return (voisins(1 << bit, libres) & ~masque_pions) | table_sauts.get(bit, 0)
+
+
+def _fronts(départ, objectif, pions, libres):
+    """Fait avancer les fronts de la recherche en largeur jusqu'à l'objectif
+    Return:
+        list -- les fronts successifs; le dernier touche l'objectif, ou est vide
+    """
+    table_sauts = sauts(pions, libres)
+    interdits = (1 << pions[0]) | (1 << pions[1])
+    front = 1 << départ
+    visités = front
+    fronts = [front]
+    while front and not front & objectif:
+        suivant = voisins(front, libres)
+        # ajouter les sauts des cases voisines des joueurs présentes dans le front
+        for source, ajout in table_sauts.items():
+            if (front >> source) & 1:
+                suivant |= ajout
+        front = suivant & ~visités & ~interdits
+        visités |= front
+        fronts.append(front)
+    return fronts
+
+
+def distance(départ, objectif, pions, libres):
+    """Donne le nombre de coups pour atteindre un masque objectif, ou None
+    Arguments:
+        départ {int} -- le numéro de bit de la case de départ
+        objectif {int} -- le masque des cases à atteindre
+        pions {list} -- les numéros de bit des deux joueurs
+        libres {dict} -- les masques de libertés du damier
+    """
+    fronts = _fronts(départ, objectif, pions, libres)
+    if not fronts[-1]:
+        return None
+    return len(fronts) - 1
+
+
+def plus_court_chemin(départ, objectif, pions, libres):
+    """Donne un plus court chemin vers un masque objectif, ou None
+    Return:
+        list -- les numéros de bit des cases, du départ jusqu'à l'arrivée
+    """
+    fronts = _fronts(départ, objectif, pions, libres)
+    if not fronts[-1]:
+        return None
+    table_sauts = sauts(pions, libres)
+    # remonter les fronts à partir d'une case d'arrivée
+    chemin = [next(bits(fronts[-1] & objectif))]
+    for front in reversed(fronts[:-1]):
+        # les murs sont symétriques: les voisins de l'arrivée peuvent y aller
+        candidats = voisins(1 << chemin[-1], libres) & front
+        if not candidats:
+            # sinon l'arrivée a été atteinte par un saut
+            for source, ajout in table_sauts.items():
+                if (front >> source) & 1 and (ajout >> chemin[-1]) & 1:
+                    candidats = 1 << source
+                    break
+        chemin.append(next(bits(candidats)))
+    chemin.reverse()
+    return chemin
+
+
+class PlateauBits:
+    """PlateauBits
+    Moteur de déplacements en masques de bits, interchangeable avec quoridor.GrapheJeu.
+    Attributs:
+        joueurs {list} -- les positions (x, y) des joueurs
+        murh, murv {list} -- les murs placés
+        libres {dict} -- les masques de libertés du damier
+    """
+
+    def __init__(self, joueurs, murs_horizontaux, murs_verticaux):
+        """
+        Arguments:
+            joueurs {list} -- une liste des positions (x,y) des joueurs.
+            murs_horizontaux {list} -- une liste des positions (x,y) des murs horizontaux.
+            murs_verticaux {list} -- une liste des positions (x,y) des murs verticaux.
+        """
+        self.joueurs = [tuple(joueur) for joueur in joueurs]
+        self.murh = [tuple(mur) for mur in murs_horizontaux]
+        self.murv = [tuple(mur) for mur in murs_verticaux]
+        self.libres = libertés(self.murh, self.murv)
+        self.pions = [case(joueur) for joueur in self.joueurs]
+
+
+    def déplacer(self, joueurs):
+        """Met à jour les positions des joueurs"""
+        self.joueurs = [tuple(joueur) for joueur in joueurs]
+        self.pions = [case(joueur) for joueur in self.joueurs]
+
+
+    def ajouter_mur(self, position_mur, orientation):
+        """Coupe les passages bloqués par un mur
+        Raises:
+            MurOccupé -- si un des passages est déjà coupé (le plateau n'est pas modifié)
+        """
+        coupés = coupures(position_mur, orientation)
+        for direction, masque in coupés:
+            if self.libres[direction] & masque != masque:
+                raise MurOccupé("Il y a déjà un mur!")
+        for direction, masque in coupés:
+            self.libres[direction] &= ~masque
+        if orientation == 'horizontal':
+            self.murh.append(tuple(position_mur))
+        else:
+            self.murv.append(tuple(position_mur))
+
+
+    def retirer_mur(self, position_mur, orientation):
+        """Rouvre les passages bloqués par un mur"""
+        for direction, masque in coupures(position_mur, orientation):
+            self.libres[direction] |= masque
+        if orientation == 'horizontal':
+            self.murh.remove(tuple(position_mur))
+        else:
+            self.murv.remove(tuple(position_mur))
+
+
+    def successeurs(self, départ):
+        """Donne la liste des positions (x, y) atteignables en un coup"""
+        return [position(bit) for bit in
+                bits(successeurs(case(départ), self.pions, self.libres))]
+
+
+    def chemin_existe(self, départ, objectif):
+        """Vérifie si l'objectif ('B1' ou 'B2') est atteignable à partir de départ"""
+        return distance(case(départ), OBJECTIFS[objectif], self.pions, self.libres) is not None
+
+
+    def plus_court_chemin(self, départ, objectif):
+        """Donne un plus court chemin vers l'objectif ('B1' ou 'B2'), comme nx.shortest_path
+        Return:
+            list -- les positions (x, y) du départ jusqu'à l'arrivée, suivies de l'objectif
+        """
+        chemin = plus_court_chemin(case(départ), OBJECTIFS[objectif], self.pions, self.libres)
+        if chemin is None:
+            return None
+        return [position(bit) for bit in chemin] + [objectif]
+
+
+def murs_interdits(murh, murv):
+    """Donne les emplacements où aucun mur ne peut être placé
+    Un mur horizontal est bloqué par un mur horizontal au même emplacement ou dans la
+    colonne voisine (chevauchement), ou par le mur vertical qui a le même bit (croisement:
+    même centre). De même pour un mur vertical et les rangées voisines.
+    Arguments:
+        murh, murv {int} -- les masques des murs placés (voir bit_mur)
+    Return:
+        tuple -- (masque horizontal, masque vertical) des emplacements interdits
+    """
+    horizontaux = (murh | murv | ((murh << 1) & ~COLONNE_MURS_1 & TOUS_MURS) |
+                   ((murh >> 1) & ~COLONNE_MURS_8))
+    verticaux = murv | murh | ((murv << 8) & TOUS_MURS) | (murv >> 8)
+    return horizontaux, verticaux
+
+
+class IndexMurs:
+    """IndexMurs
+    Index d'occupation des emplacements de murs: les murs placés et les emplacements
+    qu'ils interdisent (chevauchements et croisements), en masques de 64 bits.
+    Tenu à jour à chaque mur posé ou retiré, il répond en temps constant.
+    Attributs:
+        murh, murv {int} -- les masques des murs placés
+        interdits {dict} -- 'horizontal' et 'vertical': les masques des emplacements
+            où un mur ne peut pas être placé
+    """
+    __slots__ = ('murh', 'murv', 'interdits')
+
+    def __init__(self, murs_horizontaux=(), murs_verticaux=()):
+        """
+        Arguments:
+            murs_horizontaux {list} -- une liste des positions (x,y) des murs horizontaux.
+            murs_verticaux {list} -- une liste des positions (x,y) des murs verticaux.
+        """
+        self.murh = masque_murs(murs_horizontaux, 'horizontal')
+        self.murv = masque_murs(murs_verticaux, 'vertical')
+        self.interdits = None
+        self._recalculer()
+
+
+    def _recalculer(self):
+        """Recalcule les emplacements interdits à partir des murs placés"""
+        horizontaux, verticaux = murs_interdits(self.murh, self.murv)
+        self.interdits = {'horizontal': horizontaux, 'vertical': verticaux}
+
+
+    def ajouter(self, position_mur, orientation):
+        """Ajoute un mur à l'index (sans vérifier qu'il est libre)"""
+        if orientation == 'horizontal':
+            self.murh |= 1 << bit_mur(position_mur, orientation)
+        else:
+            self.murv |= 1 << bit_mur(position_mur, orientation)
+        self._recalculer()
+
+
+    def retirer(self, position_mur, orientation):
+        """Retire un mur de l'index"""
+        if orientation == 'horizontal':
+            self.murh &= ~(1 << bit_mur(position_mur, orientation))
+        else:
+            self.murv &= ~(1 << bit_mur(position_mur, orientation))
+        self._recalculer()
+
+
+    def libre(self, position_mur, orientation):
+        """Vérifie qu'un mur, dans les limites du damier, ne chevauche ni ne croise aucun mur"""
+        return not (self.interdits[orientation] >> bit_mur(position_mur, orientation)) & 1
+
+
+    def libres(self, orientation):
+        """Donne le masque des emplacements libres d'une orientation"""
+        return ~self.interdits[orientation] & TOUS_MURS
+
+
+    def emplacements(self, orientation):
+        """Itère sur les positions (x, y) des emplacements libres d'une orientation"""
+        for bit in bits(self.libres(orientation)):
+            yield mur(bit, orientation)
+
+
+class TestPlateauBits(unittest.TestCase):
+    """classe test PlateauBits"""
+
+    def test_parité_construire_graphe(self):
+        """ Test de parité entre PlateauBits et construire_graphe
+            Cas à tester:
+                - les successeurs de chaque case sont les mêmes
+                - l'existence et la longueur des plus courts chemins sont les mêmes
+        """
+        import random
+        import networkx as nx
+        import quoridor
+        for graine in range(10):
+            hasard = random.Random(graine)
+            jeu = quoridor.Quoridor(["joueur1", "joueur2"], moteur='bits')
+            for tour in range(60):
+                joueur = (tour % 2) + 1
+                positions = [j['pos'] for j in jeu.joueurs]
+                graphe = quoridor.construire_graphe(positions, jeu.murh, jeu.murv)
+                plateau = PlateauBits(positions, jeu.murh, jeu.murv)
+                for bit in range(81):
+                    self.assertEqual(
+                        set(plateau.successeurs(position(bit))),
+                        set(graphe.successors(position(bit))) - {'B1', 'B2'})
+                for numero, objectif in enumerate(['B1', 'B2']):
+                    chemin = plateau.plus_court_chemin(positions[numero], objectif)
+                    self.assertEqual(
+                        len(chemin),
+                        len(nx.shortest_path(graphe, positions[numero], objectif)))
+                    # le chemin trouvé est bien un chemin du graphe
+                    self.assertTrue(nx.is_path(graphe, chemin))
+                if hasard.random() < 0.4:
+                    orientation = hasard.choice(['horizontal', 'vertical'])
+                    if orientation == 'horizontal':
+                        position_mur = (hasard.randint(1, 8), hasard.randint(2, 9))
+                    else:
+                        position_mur = (hasard.randint(2, 9), hasard.randint(1, 8))
+                    try:
+                        jeu.placer_mur(joueur, position_mur, orientation)
+                    except (quoridor.QuoridorError, MurOccupé):
+                        pass
+                else:
+                    jeu.déplacer_jeton(joueur, hasard.choice(
+                        plateau.successeurs(positions[joueur - 1])))
+                if jeu.partie_terminée():
+                    break
+
+
+    def test_bit_mur(self):
+        """ Test de la fonction bit_mur
+            Cas à tester:
+                - les 64 murs de chaque orientation ont des bits distincts de 0 à 63
+                - mur est l'inverse de bit_mur
+        """
+        horizontaux = {bit_mur((x, y), 'horizontal') for x in range(1, 9) for y in range(2, 10)}
+        verticaux = {bit_mur((x, y), 'vertical') for x in range(2, 10) for y in range(1, 9)}
+        self.assertEqual(horizontaux, set(range(64)))
+        self.assertEqual(verticaux, set(range(64)))
+        for bit in range(64):
+            self.assertEqual(bit_mur(mur(bit, 'horizontal'), 'horizontal'), bit)
+            self.assertEqual(bit_mur(mur(bit, 'vertical'), 'vertical'), bit)
+
+
+    def test_index_murs(self):
+        """ Test de la classe IndexMurs
+            Cas à tester:
+                - un mur horizontal (x, y) croise le mur vertical (x + 1, y - 1)
+                - les emplacements libres sont ceux qui ne chevauchent ni ne croisent
+                    aucun mur, sur des dispositions au hasard
+                - retirer un mur redonne l'index d'avant
+        """
+        import random
+        index = IndexMurs([(4, 5)], [])
+        self.assertFalse(index.libre((5, 4), 'vertical'))
+        self.assertTrue(index.libre((4, 4), 'vertical'))
+        for position_mur in [(3, 5), (4, 5), (5, 5)]:
+            self.assertFalse(index.libre(position_mur, 'horizontal'))
+        self.assertTrue(index.libre((6, 5), 'horizontal'))
+        hasard = random.Random(25)
+        for _ in range(50):
+            index = IndexMurs()
+            murs = {'horizontal': set(), 'vertical': set()}
+            for _ in range(hasard.randint(0, 20)):
+                orientation = hasard.choice(['horizontal', 'vertical'])
+                position_mur = hasard.choice(list(index.emplacements(orientation)))
+                index.ajouter(position_mur, orientation)
+                murs[orientation].add(position_mur)
+            attendus = {'horizontal': set(), 'vertical': set()}
+            for x in range(1, 9):
+                for y in range(2, 10):
+                    if not (murs['horizontal'] & {(x - 1, y), (x, y), (x + 1, y)} or
+                            (x + 1, y - 1) in murs['vertical']):
+                        attendus['horizontal'].add((x, y))
+            for x in range(2, 10):
+                for y in range(1, 9):
+                    if not (murs['vertical'] & {(x, y - 1), (x, y), (x, y + 1)} or
+                            (x - 1, y + 1) in murs['horizontal']):
+                        attendus['vertical'].add((x, y))
+            for orientation in attendus:
+                self.assertEqual(set(index.emplacements(orientation)), attendus[orientation])
+            avant = (index.murh, index.murv, dict(index.interdits))
+            index.ajouter((1, 2), 'horizontal')
+            index.retirer((1, 2), 'horizontal')
+            if (1, 2) not in murs['horizontal']:
+                self.assertEqual((index.murh, index.murv, index.interdits), avant)
+
+
+    def test_coder_coup(self):
+        """ Test des fonctions coder_coup et décoder_coup
+            Cas à tester:
+                - les 209 codes sont distincts et se décodent en leur coup
+        """
+        for code in range(NOMBRE_CODES):
+            self.assertEqual(coder_coup(décoder_coup(code)), code)
+        self.assertEqual(décoder_coup(coder_coup(('MV', (9, 8)))), ('MV', (9, 8)))
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -2,12 +2,24 @@
 Module qui enferme les classes d'encapsulation
 de la structure du jeu
 contient les classes:
+    - GrapheJeu
+        moteur de déplacements en networkX (référence)
     - Quoridor
     - QuoridorError(Exception)
 """
 import unittest
-import copy
+import collections.abc
+import random
+import types
 import networkx as nx
+import plateau
+import distances
+import enregistrement
+import finale
+import ia
+import mcts
+import rendu
+import transposition
 
 
 def graphe_helper(murs_horizontaux, murs_verticaux):
@@ -58,7 +70,24 @@ def construire_graphe(joueurs, murs_horizontaux, murs_verticaux):
     :returns: le graphe bidirectionnel (en networkX) des déplacements admissibles.
     """
     graphe = graphe_helper(murs_horizontaux, murs_verticaux)
+    ajouter_sauts(graphe, joueurs)
 
+    # ajouter les noeuds objectifs des deux joueurs
+    for x in range(1, 10):
+        graphe.add_edge((x, 9), 'B1')
+        graphe.add_edge((x, 1), 'B2')
+
+    return graphe
+
+
+def ajouter_sauts(graphe, joueurs):
+    """fonction pour aider construire_graphe et GrapheJeu
+        Retire les arcs qui pointent vers les joueurs et ajoute
+        les sauts en ligne droite ou en diagonale, selon le cas
+    Arguments:
+        graphe {nx.DiGraph} -- le graphe à modifier sur place
+        joueurs {list} -- une liste des positions (x,y) des joueurs.
+    """
     # retirer tous les arcs qui pointent vers les positions des joueurs
     # et ajouter les sauts en ligne droite ou en diagonale, selon le cas
     for joueur in map(tuple, joueurs):
@@ -79,12 +108,201 @@ def construire_graphe(joueurs, murs_horizontaux, murs_verticaux):
                     if prédécesseur != successeur and successeur not in joueurs:
                         graphe.add_edge(prédécesseur, successeur)
 
-    # ajouter les noeuds objectifs des deux joueurs
-    for x in range(1, 10):
-        graphe.add_edge((x, 9), 'B1')
-        graphe.add_edge((x, 1), 'B2')
 
-    return graphe
+def arcs_mur(position, orientation):
+    """Donne les 4 arcs du damier coupés par un mur
+    Arguments:
+        position {tuple} -- le tuple (x, y) de la position du mur
+        orientation {str} -- 'horizontal' ou 'vertical'
+    Return:
+        list -- les arcs (départ, arrivée) dans l'ordre où graphe_helper les retire
+    """
+    x, y = position
+    if orientation == 'horizontal':
+        return [((x, y-1), (x, y)), ((x, y), (x, y-1)),
+                ((x+1, y-1), (x+1, y)), ((x+1, y), (x+1, y-1))]
+    return [((x-1, y), (x, y)), ((x, y), (x-1, y)),
+            ((x-1, y+1), (x, y+1)), ((x, y+1), (x-1, y+1))]
+
+
+def coupe_chemin(chemin, position, orientation):
+    """Vérifie si un mur coupe un des pas d'un chemin
+    Un mur ne fait que retirer des arcs: si aucun pas du chemin ne passe par un
+    des arcs coupés, le chemin existe encore tel quel après l'ajout du mur.
+    Arguments:
+        chemin {list} -- les positions (x, y) du chemin, suivies de l'objectif
+        position {tuple} -- le tuple (x, y) de la position du mur
+        orientation {str} -- 'horizontal' ou 'vertical'
+    Return:
+        bool -- True si le chemin pourrait être coupé (il faut alors le revérifier)
+    """
+    # sans chemin connu, il faut toujours vérifier
+    if chemin is None:
+        return True
+    coupés = set(arcs_mur(position, orientation))
+    for départ, arrivée in zip(chemin, chemin[1:]):
+        # le dernier pas vers l'objectif n'est jamais coupé
+        if arrivée in ('B1', 'B2'):
+            break
+        écart = (arrivée[0] - départ[0], arrivée[1] - départ[1])
+        distance = abs(écart[0]) + abs(écart[1])
+        if distance == 1:
+            # pas simple
+            milieux = []
+        elif distance == 2 and 0 in écart:
+            # saut en ligne droite par-dessus le joueur au milieu
+            milieux = [((départ[0] + arrivée[0]) // 2, (départ[1] + arrivée[1]) // 2)]
+        elif distance == 2:
+            # saut en diagonale par-dessus un des deux coins
+            milieux = [(départ[0], arrivée[1]), (arrivée[0], départ[1])]
+        else:
+            # saut plus long: ne pas prendre de chance
+            return True
+        if not milieux and (départ, arrivée) in coupés:
+            return True
+        for milieu in milieux:
+            if (départ, milieu) in coupés or (milieu, arrivée) in coupés:
+                return True
+    return False
+
+
+class GrapheJeu:
+    """GrapheJeu
+    Graphe des déplacements admissibles d'une partie, tenu à jour de façon incrémentale.
+    Donne exactement le même graphe que construire_graphe, mais au lieu de tout
+    reconstruire, ne retouche que les arcs autour des murs ajoutés et des jetons déplacés.
+    Attributs:
+        base {nx.DiGraph} -- le damier avec seulement les murs (sans joueurs ni objectifs)
+        graphe {nx.DiGraph} -- le graphe complet, identique à celui de construire_graphe
+        joueurs {list} -- les positions (x, y) des joueurs pour lesquelles graphe est valide
+        murh, murv {list} -- les murs pour lesquels graphe est valide
+    """
+
+    def __init__(self, joueurs, murs_horizontaux, murs_verticaux):
+        """
+        Construit le graphe une seule fois, à partir de zéro
+        Arguments:
+            joueurs {list} -- une liste des positions (x,y) des joueurs.
+            murs_horizontaux {list} -- une liste des positions (x,y) des murs horizontaux.
+            murs_verticaux {list} -- une liste des positions (x,y) des murs verticaux.
+        """
+        self.base = graphe_helper(murs_horizontaux, murs_verticaux)
+        self.joueurs = [tuple(joueur) for joueur in joueurs]
+        self.murh = [tuple(mur) for mur in murs_horizontaux]
+        self.murv = [tuple(mur) for mur in murs_verticaux]
+        # le graphe complet part d'une copie du damier
+        self.graphe = self.base.copy()
+        ajouter_sauts(self.graphe, self.joueurs)
+        # ajouter les noeuds objectifs des deux joueurs
+        for x in range(1, 10):
+            self.graphe.add_edge((x, 9), 'B1')
+            self.graphe.add_edge((x, 1), 'B2')
+
+
+    def _voisinage(self):
+        """Ensemble des cases dont les arcs sortants dépendent des joueurs:
+        les joueurs eux-mêmes et leurs voisins sur le damier
+        """
+        cases = set(self.joueurs)
+        for joueur in self.joueurs:
+            cases.update(self.base.predecessors(joueur))
+        return cases
+
+
+    def _repatcher(self, cases):
+        """Remet les arcs sortants des cases spécifiées à leur valeur du damier,
+        puis rejoue les sauts des joueurs comme le fait construire_graphe
+        Arguments:
+            cases {set} -- les cases dont les arcs sortants doivent être refaits
+        """
+        for case in cases:
+            # arcs sortants voulus: ceux du damier, sans les objectifs pour l'instant
+            voulus = set(self.base.successors(case))
+            actuels = set(self.graphe.successors(case))
+            # ne toucher qu'aux arcs qui diffèrent
+            for successeur in actuels - voulus:
+                self.graphe.remove_edge(case, successeur)
+            for successeur in voulus - actuels:
+                self.graphe.add_edge(case, successeur)
+        # seules les cases repatchées pointent vers les joueurs
+        ajouter_sauts(self.graphe, self.joueurs)
+        # les objectifs sont ajoutés après les sauts, comme dans construire_graphe
+        for case in cases:
+            if case[1] == 9:
+                self.graphe.add_edge(case, 'B1')
+            if case[1] == 1:
+                self.graphe.add_edge(case, 'B2')
+
+
+    def déplacer(self, joueurs):
+        """Met à jour le graphe pour de nouvelles positions de joueurs
+        Arguments:
+            joueurs {list} -- une liste des positions (x,y) des joueurs.
+        """
+        joueurs = [tuple(joueur) for joueur in joueurs]
+        if joueurs == self.joueurs:
+            return
+        cases = self._voisinage()
+        self.joueurs = joueurs
+        self._repatcher(cases | self._voisinage())
+
+
+    def ajouter_mur(self, position, orientation):
+        """Retire du graphe les 4 arcs coupés par un mur
+        Arguments:
+            position {tuple} -- le tuple (x, y) de la position du mur
+            orientation {str} -- 'horizontal' ou 'vertical'
+        Raises:
+            nx.NetworkXError -- si un des arcs est déjà coupé, comme graphe_helper
+                (le graphe n'est alors pas modifié)
+        """
+        arcs = arcs_mur(position, orientation)
+        # vérifier avant de modifier quoi que ce soit
+        for départ, arrivée in arcs:
+            if not self.base.has_edge(départ, arrivée):
+                raise nx.NetworkXError(
+                    "The edge {}-{} is not in the graph.".format(départ, arrivée))
+        cases = self._voisinage()
+        self.base.remove_edges_from(arcs)
+        if orientation == 'horizontal':
+            self.murh.append(tuple(position))
+        else:
+            self.murv.append(tuple(position))
+        self._repatcher(cases | {départ for départ, _ in arcs})
+
+
+    def retirer_mur(self, position, orientation):
+        """Remet dans le graphe les 4 arcs coupés par un mur
+        Arguments:
+            position {tuple} -- le tuple (x, y) de la position du mur
+            orientation {str} -- 'horizontal' ou 'vertical'
+        """
+        arcs = arcs_mur(position, orientation)
+        if orientation == 'horizontal':
+            self.murh.remove(tuple(position))
+        else:
+            self.murv.remove(tuple(position))
+        self.base.add_edges_from(arcs)
+        self._repatcher(self._voisinage() | {départ for départ, _ in arcs})
+
+
+    def successeurs(self, départ):
+        """Donne la liste des positions (x, y) atteignables en un coup"""
+        return [successeur for successeur in self.graphe.successors(départ)
+                if successeur not in ('B1', 'B2')]
+
+
+    def chemin_existe(self, départ, objectif):
+        """Vérifie si l'objectif ('B1' ou 'B2') est atteignable à partir de départ"""
+        return nx.has_path(self.graphe, départ, objectif)
+
+
+    def plus_court_chemin(self, départ, objectif):
+        """Donne un plus court chemin vers l'objectif ('B1' ou 'B2'), ou None"""
+        try:
+            return nx.shortest_path(self.graphe, départ, objectif)
+        except nx.NetworkXNoPath:
+            return None
 
 
 class QuoridorError(Exception):
@@ -156,10 +374,69 @@ def check_total_murs(joueurs, murs):
         raise QuoridorError("mauvaise quantité totale de murs!")
 
 
+class VueListe(collections.abc.Sequence):
+    """VueListe
+    Vue en lecture seule d'une liste, sans copie: elle suit les changements de la liste.
+    Une tranche donne un tuple.
+    """
+    __slots__ = ('_liste',)
+
+    def __init__(self, liste):
+        self._liste = liste
+
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return tuple(self._liste[indice])
+        return self._liste[indice]
+
+
+    def __len__(self):
+        return len(self._liste)
+
+
+    def __iter__(self):
+        return iter(self._liste)
+
+
+    def __contains__(self, valeur):
+        return valeur in self._liste
+
+
+    def __eq__(self, autre):
+        if isinstance(autre, VueListe):
+            autre = autre._liste
+        if isinstance(autre, (list, tuple)):
+            return len(self._liste) == len(autre) and all(
+                a == b for a, b in zip(self._liste, autre))
+        return NotImplemented
+
+
+    __hash__ = None
+
+
+    def __repr__(self):
+        return 'VueListe({!r})'.format(self._liste)
+
+
+# moteurs de déplacements disponibles, selon leur nom
+MOTEURS = {'networkx': GrapheJeu, 'bits': plateau.PlateauBits}
+# emplacements de murs (position, orientation, bit), dans l'ordre de murs_valides
+EMPLACEMENTS_MURS = [((x, y), orientation, plateau.bit_mur((x, y), orientation))
+                     for x in range(1, 10) for y in range(1, 10)
+                     for orientation in ('horizontal', 'vertical')
+                     if (orientation == 'horizontal' and x <= 8 and y >= 2) or
+                     (orientation == 'vertical' and x >= 2 and y <= 8)]
+# coups légaux déjà générés, partagés entre les parties: (clé de Zobrist, joueur) -> coups
+COUPS_LÉGAUX = {}
+# au-delà de ce nombre de positions, le cache est vidé
+TAILLE_COUPS_LÉGAUX = 1 << 14
+
+
 class Quoridor:
     """class quoridor"""
 
-    def __init__(self, joueurs, murs=None):
+    def __init__(self, joueurs, murs=None, moteur='networkx'):
         """
         __init__
         Initialisation de la classe Quoridor
@@ -176,37 +453,37 @@ class Quoridor:
             -- 'horzontaux': [list of tuples]
                 Une liste de tuples (x, y) représentant la position des différents
                 murs horizontaux dans la partie
+            moteur {str} (default: {'networkx'})
+            -- le moteur de déplacements: 'networkx' (référence) ou 'bits' (masques de bits)
         """
+        # vérifier que le moteur demandé existe
+        if moteur not in MOTEURS:
+            raise QuoridorError("moteur invalide!")
         # définir les attribut de classes que nous allons utiliser
         self.joueurs = [{'nom':'', 'murs': 0, 'pos':(0, 0)},
                         {'nom':'', 'murs': 0, 'pos':(0, 0)}]
         self.murh = []
         self.murv = []
         starting_position = [(5, 1), (5, 9)]
-        #faire un copie profonde de ce qui a besoin d'être copié
-        cjoueurs = copy.deepcopy(joueurs)
-        cmurs = copy.deepcopy(murs)
-        # Vérifier si le nombre totab de murs donne 20
-        check_total_murs(cjoueurs, cmurs)
+        # Vérifier si le nombre totab de murs donne 20 (et que joueurs est itérable
+        # et de longueur 2). Rien n'est modifié: les murs sont convertis en tuples
+        # et les dictionnaires de joueurs copiés, sans copie profonde
+        check_total_murs(joueurs, murs)
         # vérifier si un dictionnaire de murs est présent
         if murs:
-            # vérifier si murs est un tuple
-            check_type(dict, cmurs, "murs n'est pas un dictionnaire!")
             # itérer sur chaque mur horizontal
-            for mur in cmurs['horizontaux']:
+            for mur in murs['horizontaux']:
                 # Vérifier si la position du mur est valide
                 if not 1 <= mur[0] <= 8 or not 2 <= mur[1] <= 9:
                     raise QuoridorError("position du mur non-valide!")
-                self.murh += [tuple(mur)]
+                self.murh.append(tuple(mur))
             # itérer sur chaque mur vertical
-            for mur in cmurs['verticaux']:
+            for mur in murs['verticaux']:
                 if not 2 <= mur[0] <= 9 or not 1 <= mur[1] <= 8:
                     raise QuoridorError("position du mur non-valide!")
-                self.murv += [tuple(mur)]
-        # vérifier que joueurs est itérable et de longueur 2
-        check_iterable(cjoueurs)
+                self.murv.append(tuple(mur))
         # itérer sur chaque joueur
-        for numero, joueur in enumerate(cjoueurs):
+        for numero, joueur in enumerate(joueurs):
             # Vérifier s'il s'agit d'un string ou d'un dictionnaire
             if isinstance(joueur, str):
                 # ajouter le nom au dictionnaire
@@ -222,95 +499,189 @@ class Quoridor:
                 # Vérifier que la position du joueur est valide
                 if not 1 <= joueur['pos'][0] <= 9 or not 1 <= joueur['pos'][1] <= 9:
                     raise QuoridorError("position du joueur invalide!")
-                # updater la valeur de joueur
-                self.joueurs[numero] = joueur
+                # updater la valeur de joueur (une copie)
+                self.joueurs[numero] = dict(joueur)
                 # vérifier que la position du joueur est storée comme tuple
-                self.joueurs[numero]['pos'] = tuple(self.joueurs[numero]['pos'])
+                self.joueurs[numero]['pos'] = tuple(joueur['pos'])
+        self._préparer(moteur)
+
+
+    @classmethod
+    def depuis_état(cls, état, moteur='networkx'):
+        """
+        depuis_état
+        Construit une partie à partir d'un état fiable, sans aucune validation
+        Pour les états produits par état_partie ou instantané, par le serveur ou lus
+        d'un enregistrement: le nombre de murs et les positions ne sont pas vérifiés.
+        Arguments:
+            état {dict} -- l'état, au format de état_partie (les positions peuvent
+                être des listes, comme en JSON)
+        Keyword Arguments:
+            moteur {str} -- le moteur de déplacements (default: {'networkx'})
+        Return:
+            Quoridor -- la partie
+        """
+        if moteur not in MOTEURS:
+            raise QuoridorError("moteur invalide!")
+        jeu = cls.__new__(cls)
+        jeu.joueurs = [{'nom': joueur['nom'], 'murs': joueur['murs'], 'pos': tuple(joueur['pos'])}
+                       for joueur in état['joueurs']]
+        murs = état['murs']
+        jeu.murh = [tuple(mur) for mur in murs['horizontaux']]
+        jeu.murv = [tuple(mur) for mur in murs['verticaux']]
+        jeu._préparer(moteur)
+        return jeu
+
+
+    def _préparer(self, moteur):
+        """Initialise les caches et l'historique d'une partie dont l'état est en place"""
+        # le moteur de déplacements est construit au premier besoin
+        self.type_moteur = moteur
+        self._moteur = None
+        # distances de chaque case aux objectifs, construites au premier besoin
+        self._distances = None
+        # plus courts chemins des joueurs, avec l'état pour lequel ils sont valides
+        self._chemins = [None, None]
+        self._clé_chemins = None
+        # clé de Zobrist de la position, tenue à jour à chaque coup
+        self.clé = transposition.hacher(self.joueurs, self.murh, self.murv)
+        # coups joués (joueur, type_coup, position, ancienne position) et coups annulés
+        self.historique = []
+        self.annulés = []
+        # observateurs des coups (voir abonner), numéro du dernier delta émis et
+        # nombre de coups de l'historique déjà diffusés
+        self.observateurs = []
+        self.séquence = 0
+        self._publiés = 0
+        # compteur des changements de murs, et dernier instantané (voir instantané)
+        self._version_murs = 0
+        self._instantané = None
+        # emplacements de murs occupés, chevauchés ou croisés (voir index_murs)
+        self._index_murs = plateau.IndexMurs(self.murh, self.murv)
 
 
     def __str__(self):
         """
         __str__
         Produit la représentation en art ascii correspondant à l'état actuel de la partie
+        Le damier vide et la couche des murs sont gardés en mémoire (voir rendu.py):
+        seuls les deux jetons sont écrits à chaque appel.
         Returns:
             board (str)
                 Une représentation en art ascii de la table de jeu
         """
-        # définition des contraintes du tableau de jeu
-        # permet de modifier la taille du jeu si désiré
-        board_positions = 9
-        spacing_horizontal = ((board_positions * 4) - 1)
-        # tableaux d'équivalences entre les adresses du jeu et notre tableau
-        game_pos_x = range(1, (board_positions * 4), 4)
-        game_pos_y = range(((board_positions - 1) * 2), -1, -2)
-        # Création du tableau de jeu
-        # en-tête
-        board = [
-            "légende: 1={} 2={}\n".format(self.joueurs[0]['nom'], self.joueurs[1]['nom']) +
-            (' ' * 3) + ('-' * spacing_horizontal) + '\n'
-        ]
-        # game board
-        for i in reversed(range((board_positions * 2) - 1)):
-            if (i % 2) == 0:
-                # check if more than 10 positions for better formatting
-                board += ["{}{}|".format((((i + 1) // 2) + 1),
-                                         (' ' * (1 - ((((i + 1) // 2) + 1) // 10))))]
-                board += [' ', '.']
-                board += ([' ', ' ', ' ', '.'] * (board_positions - 1))
-                board += [' ', '|\n']
-            else:
-                board += ["  |"]
-                board += ([' '] * spacing_horizontal)
-                board += ['|\n']
-        # bottom lines
-        board += "--|" + ('-' * spacing_horizontal) + '\n'
-        board += (' ' * 2) + '| '
-        for i in range(1, board_positions):
-            board += str(i) + (' ')
-            board += (' ' * (2 - (i // 10)))
-        board += "{}\n".format(board_positions)
-        # insertion des joueurs dans board
-        for num, joueur in enumerate(self.joueurs):
-            # obtention de la position en [x, y] du joueur
-            position = joueur["pos"]
-            # vérification que la position est dans les contraintes
-            if ((0 > position[0] > board_positions) or
-                    (0 > position[1] > board_positions)):
-                raise IndexError("Adresse du joueur invalide!")
-            # calcul du décallage relatif au tableau
-            indice = (game_pos_x[(position[0] - 1)] +
-                      (game_pos_y[(position[1] - 1)] * spacing_horizontal))
-            decallage = ((((indice + 1) // spacing_horizontal) * 2) + 2)
-            indice += decallage
-            # Insérer le personnage dans le tableau de jeu
-            board[indice] = str(num + 1)
-        # insertion des murs horizontaux dans board
-        for murh in self.murh:
-            # vérification que la position est dans les contraintes
-            if ((1 > murh[0] > (board_positions - 1)) or
-                    (2 > murh[1] > board_positions)):
-                raise IndexError("Position du mur horizontal invalide!")
-            indice = ((game_pos_x[(murh[0] - 1)] - 1) +
-                      ((game_pos_y[(murh[1] - 1)] + 1) * spacing_horizontal))
-            decallage = ((((indice + 1) // spacing_horizontal) * 2) + 2)
-            indice += decallage
-            # itérer pour placer les 5 murs
-            for i in range(7):
-                board[(indice + i)] = '-'
-        # insertion des murs verticaux
-        for murv in self.murv:
-            # vérification que la position est dans les contraintes
-            if (2 > murv[0] > board_positions) or (1 > murv[1] > board_positions):
-                raise IndexError("Position du mur vertical invalide!")
-            indice = ((game_pos_x[(murv[0] - 1)] - 2) +
-                      (game_pos_y[(murv[1] - 1)] * spacing_horizontal))
-            decallage = ((((indice + 1) // spacing_horizontal) * 2) + 2)
-            indice += decallage
-            # itérer pour placer les 3 murs
-            for i in range(3):
-                board[(indice - (i * (spacing_horizontal + 2)))] = '|'
-        # afficher le jeu sous forme d'une chaine de caractères
-        return ''.join(board)
+        return rendu.afficher(self)
+
+
+    def __bytes__(self):
+        """
+        __bytes__
+        Produit la même représentation que __str__, en octets UTF-8, pour l'écrire
+        directement dans un fichier ou un socket
+        """
+        return rendu.afficher_octets(self)
+
+
+    def moteur(self):
+        """
+        moteur
+        Donne le moteur de déplacements (GrapheJeu ou PlateauBits) pour l'état actuel
+        de la partie. Il est construit au premier appel, puis tenu à jour de façon incrémentale.
+        S'il doit être reconstruit, la clé de Zobrist est aussi recalculée.
+        Return:
+            le moteur, qui offre successeurs, chemin_existe et plus_court_chemin
+        """
+        positions = [joueur['pos'] for joueur in self.joueurs]
+        # construire le moteur s'il n'existe pas ou si les murs ont été modifiés à la main
+        if (self._moteur is None or
+                self._moteur.murh != self.murh or self._moteur.murv != self.murv):
+            self._moteur = MOTEURS[self.type_moteur](positions, self.murh, self.murv)
+            self.clé = transposition.hacher(self.joueurs, self.murh, self.murv)
+        else:
+            self._moteur.déplacer(positions)
+        return self._moteur
+
+
+    def distances(self):
+        """
+        distances
+        Donne les champs de distances aux objectifs pour les murs actuels de la partie.
+        Ils sont construits au premier appel, puis tenus à jour à chaque mur posé ou retiré.
+        Return:
+            distances.ChampsDistances
+        """
+        # reconstruire les champs s'ils n'existent pas ou si les murs ont été modifiés à la main
+        if (self._distances is None or
+                self._distances.murh != self.murh or self._distances.murv != self.murv):
+            self._distances = distances.ChampsDistances(self.murh, self.murv)
+        return self._distances
+
+
+    def index_murs(self):
+        """
+        index_murs
+        Donne l'index des emplacements de murs occupés, chevauchés ou croisés pour les
+        murs actuels de la partie. Il est tenu à jour à chaque mur posé ou retiré.
+        Return:
+            plateau.IndexMurs
+        """
+        # reconstruire l'index si les murs ont été modifiés à la main
+        if (self._index_murs.murh != plateau.masque_murs(self.murh, 'horizontal') or
+                self._index_murs.murv != plateau.masque_murs(self.murv, 'vertical')):
+            self._index_murs = plateau.IndexMurs(self.murh, self.murv)
+        return self._index_murs
+
+
+    def distance_objectif(self, joueur):
+        """
+        distance_objectif
+        Donne le nombre de pas qui séparent le joueur de sa rangée objectif, en tenant
+        compte des murs mais pas des jetons (une simple lecture dans un tableau).
+        Arguments:
+            joueur {int} -- le numéro du joueur (1 ou 2)
+        Return:
+            int -- la distance, ou distances.INACCESSIBLE si l'objectif est enfermé
+        """
+        # Vérifier que le joueur est valide
+        if joueur not in (1, 2):
+            raise QuoridorError("joueur invalide!")
+        return self.distances().distance(joueur, self.joueurs[(joueur - 1)]['pos'])
+
+
+    def chemin(self, joueur):
+        """
+        chemin
+        Donne le plus court chemin actuel du joueur vers son objectif.
+        Le chemin est gardé en cache tant que les jetons ne bougent pas, et même après
+        l'ajout d'un mur qui ne le coupe pas (un mur ne peut pas raccourcir un chemin).
+        Arguments:
+            joueur {int} -- le numéro du joueur (1 ou 2)
+        Return:
+            list -- les positions (x, y) du chemin, suivies de 'B1' ou 'B2'
+        """
+        objectifs = ['B1', 'B2']
+        # invalider les chemins si les jetons ou les murs ont changé sans nous
+        clé = (self.joueurs[0]['pos'], self.joueurs[1]['pos'], tuple(self.murh), tuple(self.murv))
+        if clé != self._clé_chemins:
+            self._chemins = [None, None]
+            self._clé_chemins = clé
+        if self._chemins[joueur - 1] is None:
+            self._chemins[joueur - 1] = self.moteur().plus_court_chemin(
+                self.joueurs[joueur - 1]['pos'], objectifs[joueur - 1])
+        return self._chemins[joueur - 1]
+
+
+    def graphe(self):
+        """
+        graphe
+        Donne le graphe des déplacements admissibles pour l'état actuel de la partie.
+        Return:
+            le graphe (en networkX) identique à celui de construire_graphe
+        """
+        if self.type_moteur == 'networkx':
+            return self.moteur().graphe
+        return construire_graphe([joueur['pos'] for joueur in self.joueurs],
+                                 self.murh, self.murv)
 
 
     def déplacer_jeton(self, joueur, position):
@@ -329,19 +700,163 @@ class Quoridor:
         # Vérifier que la position du joueur est valide
         if not 1 <= position[0] <= 9 or not 1 <= position[1] <= 9:
             raise QuoridorError("position invalide!")
-        # créer un graphe des mouvements possible à jouer
-        graphe = construire_graphe(
-            [joueur['pos'] for joueur in self.joueurs],
-            self.murh,
-            self.murv
-        )
+        # obtenir les mouvements possible à jouer
+        moteur = self.moteur()
         # vérifier si le mouvement est valide
-        if position not in list(graphe.successors((self.joueurs[(joueur - 1)]['pos']))):
+        if position not in moteur.successeurs(self.joueurs[(joueur - 1)]['pos']):
             raise QuoridorError("mouvement invalide!")
         # Changer la position du joueur
+        self.appliquer_coup(joueur, ('D', position))
+        self.publier('coup')
+
+
+    def bouger_jeton(self, joueur, position):
+        """simple fonction pour alléger déplacer_jeton
+        Change la position du jeton et tient la clé de Zobrist à jour.
+        Le déplacement doit déjà avoir été validé.
+        """
+        zobrist = transposition.ZOBRIST_PIONS[joueur - 1]
+        self.clé ^= (zobrist[plateau.case(self.joueurs[(joueur - 1)]['pos'])] ^
+                     zobrist[plateau.case(position)])
         self.joueurs[(joueur - 1)]['pos'] = position
 
 
+    def appliquer_coup(self, joueur, coup, effacer_annulés=True):
+        """
+        appliquer_coup
+        Joue un coup déjà validé et l'ajoute à l'historique
+        Arguments:
+            joueur {int} -- Le numéro du joueur (1 ou 2)
+            coup {tuple} -- le coup (type_coup, position), avec type_coup 'D', 'MH' ou 'MV'
+        Keyword Arguments:
+            effacer_annulés {bool} -- oublier les coups qui pouvaient être refaits,
+                comme après tout nouveau coup (default: {True})
+        """
+        type_coup, position = coup
+        if type_coup == 'D':
+            ancienne = self.joueurs[(joueur - 1)]['pos']
+            self.bouger_jeton(joueur, position)
+        else:
+            ancienne = None
+            self.poser_mur(joueur, position, ia.ORIENTATIONS[type_coup])
+        self.historique.append((joueur, type_coup, position, ancienne))
+        if effacer_annulés:
+            self.annulés.clear()
+
+
+    def annuler_coup(self, garder=True):
+        """
+        annuler_coup
+        Annule le dernier coup joué: remet le jeton à son ancienne position, ou retire
+        le mur et le redonne au joueur. Tout est fait sur place, sans copie de la partie.
+        Keyword Arguments:
+            garder {bool} -- garder le coup pour pouvoir le refaire (default: {True})
+        Return:
+            tuple -- le coup annulé (joueur, type_coup, position)
+        """
+        if not self.historique:
+            raise QuoridorError("aucun coup à annuler!")
+        joueur, type_coup, position, ancienne = self.historique.pop()
+        if type_coup == 'D':
+            self.bouger_jeton(joueur, ancienne)
+        else:
+            self.retirer_mur(joueur, position, ia.ORIENTATIONS[type_coup])
+        if garder:
+            self.annulés.append((joueur, type_coup, position))
+        # un coup diffusé est annulé: les observateurs doivent le défaire aussi
+        if len(self.historique) < self._publiés:
+            self.publier('annulé', (joueur, type_coup, position, ancienne))
+        return (joueur, type_coup, position)
+
+
+    def refaire_coup(self):
+        """
+        refaire_coup
+        Rejoue le dernier coup annulé par annuler_coup
+        Return:
+            tuple -- le coup refait (joueur, type_coup, position)
+        """
+        if not self.annulés:
+            raise QuoridorError("aucun coup à refaire!")
+        joueur, type_coup, position = self.annulés.pop()
+        self.appliquer_coup(joueur, (type_coup, position), effacer_annulés=False)
+        self.publier('coup')
+        return (joueur, type_coup, position)
+
+
+    def abonner(self, observateur):
+        """
+        abonner
+        Ajoute un observateur, appelé avec chaque delta émis par la partie:
+        (séquence, sorte, joueur, type_coup, position, ancienne), où sorte est 'coup'
+        ou 'annulé' et ancienne la position du jeton avant un déplacement (None pour un mur).
+        Seuls les coups de déplacer_jeton, placer_mur, refaire_coup et leur annulation
+        sont émis: les coups explorés par la recherche (appliquer_coup) ne le sont pas.
+        Arguments:
+            observateur -- une fonction d'un argument, appelée dans le fil de la partie
+        """
+        self.observateurs.append(observateur)
+
+
+    def désabonner(self, observateur):
+        """
+        désabonner
+        Retire un observateur ajouté par abonner
+        """
+        self.observateurs.remove(observateur)
+
+
+    def publier(self, sorte, coup=None):
+        """
+        publier
+        Émet un delta aux observateurs
+        Arguments:
+            sorte {str} -- 'coup' pour le dernier coup de l'historique, ou 'annulé'
+        Keyword Arguments:
+            coup {tuple} -- le coup annulé (joueur, type_coup, position, ancienne)
+                (default: {None})
+        """
+        if sorte == 'coup':
+            coup = self.historique[-1]
+        self._publiés = len(self.historique)
+        self.séquence += 1
+        delta = (self.séquence, sorte) + tuple(coup)
+        for observateur in list(self.observateurs):
+            observateur(delta)
+
+
+    def clé_zobrist(self, trait=None):
+        """
+        clé_zobrist
+        Donne la clé de Zobrist de la position, tenue à jour à chaque coup
+        Keyword Arguments:
+            trait {int} -- le joueur qui a le trait (1 ou 2), s'il doit faire partie
+                de la clé (default: {None})
+        Return:
+            int -- une clé de 64 bits
+        """
+        if trait is None:
+            return self.clé
+        return self.clé ^ transposition.ZOBRIST_TRAIT[trait - 1]
+
+
+    def enregistrer(self, fichier, texte=False):
+        """
+        enregistrer
+        Ajoute la partie (sa position de départ et ses coups) à une archive de parties
+        (voir enregistrement.py)
+        Arguments:
+            fichier -- l'archive, ouverte en écriture binaire ('wb' ou 'ab'), ou en
+                écriture texte si texte est vrai
+        Keyword Arguments:
+            texte {bool} -- écrire en notation texte (default: {False})
+        """
+        if texte:
+            enregistrement.écrire_texte(fichier, enregistrement.partie(self))
+        else:
+            enregistrement.écrire_binaire(fichier, enregistrement.partie(self))
+
+
     def état_partie(self):
         """
         état_partie
@@ -360,43 +875,113 @@ class Quoridor:
                 }
             }
         """
-        return {"joueurs": self.joueurs,
+        # les positions sont des tuples: copier les dictionnaires et les listes suffit
+        return {"joueurs": [dict(joueur) for joueur in self.joueurs],
                 "murs":{
-                    "horizontaux": self.murh,
-                    "verticaux": self.murv
+                    "horizontaux": list(self.murh),
+                    "verticaux": list(self.murv)
                     }}
 
 
-    def jouer_coup(self, joueur):
+    def vue_partie(self):
+        """
+        vue_partie
+        Donne l'état actuel du jeu en lecture seule, sans aucune copie
+        La vue a la forme de état_partie, mais ses dictionnaires sont des
+        types.MappingProxyType et ses listes de murs des VueListe: elle suit la partie
+        (les coups joués après l'appel y apparaissent). Pour les lecteurs fréquents
+        (évaluation, affichage); pour garder l'état, voir état_partie ou instantané.
+        Arguments: None
+        Return:
+            types.MappingProxyType -- {'joueurs': (vue1, vue2), 'murs': {...}}
+        """
+        return types.MappingProxyType({
+            "joueurs": tuple(types.MappingProxyType(joueur) for joueur in self.joueurs),
+            "murs": types.MappingProxyType({
+                "horizontaux": VueListe(self.murh),
+                "verticaux": VueListe(self.murv)
+                })})
+
+
+    def instantané(self):
+        """
+        instantané
+        Donne une copie de l'état actuel du jeu, pour la garder (sauvegarde, envoi)
+        Les murs sont des tuples: tant qu'aucun mur n'a été posé ou retiré, ceux du
+        dernier instantané sont réutilisés plutôt que copiés. Seuls les deux
+        dictionnaires de joueurs sont copiés à chaque appel.
+        Arguments: None
+        Return:
+            dict -- l'état, au format de état_partie, avec des tuples de murs
+        """
+        précédent = self._instantané
+        if précédent is None or précédent[0] != self._version_murs:
+            précédent = self._instantané = (self._version_murs, {
+                "horizontaux": tuple(self.murh),
+                "verticaux": tuple(self.murv)
+                })
+        return {"joueurs": [dict(joueur) for joueur in self.joueurs],
+                "murs": dict(précédent[1])}
+
+
+    def jouer_coup(self, joueur, délai=1.0, profondeur=None, mode='alphabeta', livre=None,
+                   table=None, itérations=None, processus=1, graine=None):
         """
         jouer_coup
         Pour le joueur spécifié, jouer automatiquement son meilleur
         coup pour l'état actuel de la partie. Ce coup est soit le déplacement de son jeton,
         soit le placement d'un mur horizontal ou vertical.
+        Le coup est choisi par une recherche alpha-bêta (voir ia.py) qui s'approfondit
+        jusqu'à ce que le délai soit écoulé, ou par une recherche Monte-Carlo (voir mcts.py).
+        Dans les premiers coups, le coup du livre d'ouvertures donné est joué sans recherche.
+        Lorsque les deux joueurs n'ont plus de murs, le coup parfait est lu dans la table
+        de finales de la disposition des murs (voir finale.py).
         Arguments:
             joueur {int} -- un entier spécifiant le numéro du joueur (1 ou 2)
-        NOTE: version temporaire et stupide! à optimiser!
-        Return: None
+        Keyword Arguments:
+            délai {float} -- le temps de réflexion maximal en secondes (default: {1.0})
+            profondeur {int} -- la profondeur maximale de la recherche (default: {None})
+            mode {str} -- 'alphabeta' ou 'mcts' (default: {'alphabeta'})
+            livre {LivreOuvertures} -- le livre d'ouvertures à consulter, par exemple
+                ouverture.livre_défaut() (default: {None}, aucun livre: toujours chercher)
+            table {TableTransposition} -- la table de la recherche alpha-bêta, propre à
+                la partie lorsque plusieurs parties cherchent en même temps
+                (default: {None}, la table partagée ia.TABLE)
+            itérations {int} -- en mode 'mcts', le nombre de parties simulées, au lieu
+                du délai (default: {None})
+            processus {int} -- en mode 'mcts', le nombre de processus qui cherchent en
+                parallèle (default: {1})
+            graine {int} -- en mode 'mcts', la graine de la recherche; avec un nombre
+                d'itérations, le même coup est joué à chaque fois (default: {None})
+        Return:
+            tuple -- le coup joué (type_coup, position), avec type_coup 'D', 'MH' ou 'MV'
         """
-        # objectifs
-        objectifs = ['B1', 'B2']
         # Vérifier que le joueur est valide
         if joueur not in (1, 2):
             raise QuoridorError("joueur invalide!")
         # Vérifier si la partie est déjà terminée
         if self.partie_terminée():
             raise QuoridorError("La partie est déjà terminée!")
-        # créer un graphe des mouvements possible à jouer
-        graphe = construire_graphe(
-            [joueur['pos'] for joueur in self.joueurs],
-            self.murh,
-            self.murv
-        )
-        coup_a_jouer = nx.shortest_path(graphe,
-                                        self.joueurs[(joueur - 1)]['pos'],
-                                        objectifs[(joueur - 1)])[1]
+        # Vérifier que le mode de recherche est valide
+        if mode not in ('alphabeta', 'mcts'):
+            raise QuoridorError("mode invalide!")
+        # consulter le livre d'ouvertures, s'il y en a un
+        coup = livre.coup(self, joueur) if livre else None
+        # sans murs en réserve, la table de finales donne le coup parfait
+        if coup is None:
+            coup = finale.coup_parfait(self, joueur)
+        # hors du livre, chercher le meilleur coup
+        if coup is None and mode == 'mcts':
+            coup = mcts.meilleur_coup(self, joueur, délai, itérations, processus, graine)
+        elif coup is None:
+            coup = ia.meilleur_coup(self, joueur, délai, table, profondeur)
+        type_coup, position = coup
         # jouer le coup
-        self.déplacer_jeton(joueur, coup_a_jouer)
+        if type_coup == 'D':
+            self.déplacer_jeton(joueur, position)
+        else:
+            self.placer_mur(joueur, position, ia.ORIENTATIONS[type_coup])
+        return (type_coup, position)
 
 
     def partie_terminée(self):
@@ -424,14 +1009,188 @@ class Quoridor:
         # vérifier si les positions sont dans les limites du jeu
         if not 1 <= position[0] <= 8 or not 2 <= position[1] <= 9:
             raise QuoridorError("position du mur invalide!")
-        # vérifier si l'emplacement est déjà occupé
-        if (position[0], position[1]) in self.murh:
-            raise QuoridorError("Il y a déjà un mur!")
-        # Prendre en compte le décalage des murs
-        if ((position[0] - 1), position[1]) in self.murh:
+        # vérifier si l'emplacement est déjà occupé, chevauché (à gauche ou à droite)
+        # ou croisé par un mur vertical
+        if not self.index_murs().libre(position, 'horizontal'):
             raise QuoridorError("Il y a déjà un mur!")
 
 
+    def _mur_admissible(self, chemins, position, orientation):
+        """simple fonction pour alléger poser_mur et murs_valides
+        Vérifie qu'un mur déjà ajouté au moteur n'enferme aucun joueur.
+        La recherche n'est faite que pour les joueurs dont le chemin est coupé.
+        Arguments:
+            chemins {list} -- les plus courts chemins des joueurs avant le mur
+        """
+        # définir les objectifs de chaque joueurs
+        objectif = ['B1', 'B2']
+        # le moteur contient déjà le mur: ne pas le resynchroniser avec la partie
+        moteur = self._moteur
+        for i in range(2):
+            if (coupe_chemin(chemins[i], position, orientation) and
+                    not moteur.chemin_existe(self.joueurs[i]['pos'], objectif[i])):
+                return False
+        return True
+
+
+    def coups_légaux(self, joueur):
+        """
+        coups_légaux
+        Donne tous les coups permis au joueur spécifié: ses déplacements (sauts et
+        diagonales compris, comme dans construire_graphe), puis tous les murs qu'il peut placer.
+        Le résultat est gardé en cache par position (clé de Zobrist et joueur) et partagé
+        entre les parties: une position déjà vue n'est pas régénérée.
+        Arguments:
+            joueur {int} -- Le numéro du joueur (1 ou 2)
+        Return:
+            tuple -- les coups (type_coup, position), avec type_coup 'D', 'MH' ou 'MV';
+                vide si la partie est terminée
+        """
+        # Vérifier que le joueur est valide
+        if joueur not in (1, 2):
+            raise QuoridorError("joueur invalide!")
+        # resynchroniser le moteur, et la clé, si les murs ont été modifiés à la main
+        moteur = self.moteur()
+        clé = (self.clé, joueur)
+        coups = COUPS_LÉGAUX.get(clé)
+        if coups is None:
+            if self.partie_terminée():
+                coups = ()
+            else:
+                départ = self.joueurs[(joueur - 1)]['pos']
+                coups = tuple([('D', position) for position in
+                               sorted(moteur.successeurs(départ))] +
+                              [(ia.TYPES_MURS[orientation], position) for position, orientation
+                               in self.murs_valides(joueur)])
+            if len(COUPS_LÉGAUX) >= TAILLE_COUPS_LÉGAUX:
+                COUPS_LÉGAUX.clear()
+            COUPS_LÉGAUX[clé] = coups
+        return coups
+
+
+    def murs_valides(self, joueur, candidats=None):
+        """
+        murs_valides
+        Donne tous les murs que le joueur spécifié peut placer dans l'état actuel de la partie
+        Arguments:
+            joueur {int} -- Le numéro du joueur (1 ou 2)
+        Keyword Arguments:
+            candidats {list} -- les (position, orientation) à vérifier (default: {None})
+                Par défaut, tous les emplacements du damier sont vérifiés.
+        Return:
+            list -- les tuples (position, orientation) des murs admissibles,
+                où orientation est 'horizontal' ou 'vertical'
+        """
+        # Vérifier que le joueur est valide
+        if joueur not in (1, 2):
+            raise QuoridorError("joueur invalide!")
+        # un joueur sans murs ne peut rien placer
+        if self.joueurs[(joueur - 1)]['murs'] <= 0:
+            return []
+        # des plus courts chemins lus dans les champs de distances, sans recherche:
+        # un mur qui ne les coupe pas n'enferme personne
+        champs = self.distances()
+        chemins = [champs.chemin(1, self.joueurs[0]['pos']),
+                   champs.chemin(2, self.joueurs[1]['pos'])]
+        moteur = self.moteur()
+        interdits = self.index_murs().interdits
+        if candidats is None:
+            # les emplacements libres, lus dans l'index des murs
+            candidats = [(position, orientation) for position, orientation, bit in EMPLACEMENTS_MURS
+                         if not (interdits[orientation] >> bit) & 1]
+        else:
+            # un mur ne peut sortir du damier, ni chevaucher ou croiser un autre mur
+            candidats = [(position, orientation) for position, orientation in candidats
+                         if (1 <= position[0] - (orientation == 'vertical') <= 8 and
+                             2 <= position[1] + (orientation == 'vertical') <= 9 and
+                             not (interdits[orientation] >>
+                                  plateau.bit_mur(position, orientation)) & 1)]
+        valides = []
+        for position, orientation in candidats:
+            # le raccourci évite toute recherche si aucun chemin n'est coupé
+            if not (coupe_chemin(chemins[0], position, orientation) or
+                    coupe_chemin(chemins[1], position, orientation)):
+                valides.append((position, orientation))
+                continue
+            moteur.ajouter_mur(position, orientation)
+            if self._mur_admissible(chemins, position, orientation):
+                valides.append((position, orientation))
+            moteur.retirer_mur(position, orientation)
+        return valides
+
+
+    def poser_mur(self, joueur, position, orientation):
+        """simple fonction pour alléger le nombre
+        de branches dans placer_mur
+        Ajoute le mur au graphe, vérifie qu'il n'enferme aucun joueur,
+        puis l'ajoute à la partie. La position doit déjà avoir été validée.
+        """
+        # des plus courts chemins lus dans les champs de distances, avant d'ajouter le mur
+        champs = self.distances()
+        positions = (self.joueurs[0]['pos'], self.joueurs[1]['pos'])
+        chemins = [champs.chemin(1, positions[0]), champs.chemin(2, positions[1])]
+        # ajouter le mur au moteur des mouvements possible à jouer
+        moteur = self.moteur()
+        moteur.ajouter_mur(position, orientation)
+        # vérifier si placer ce mur enfermerais un joueur
+        if not self._mur_admissible(chemins, position, orientation):
+            # remettre le moteur comme il était
+            moteur.retirer_mur(position, orientation)
+            raise QuoridorError("ce coup enfermerait un joueur")
+        # les chemins gardés en cache sont-ils ceux de la position avant le mur?
+        cache_valide = self._clé_chemins == positions + (tuple(self.murh), tuple(self.murv))
+        # placer le mur
+        if orientation == 'horizontal':
+            self.murh.append(tuple(position))
+        else:
+            self.murv.append(tuple(position))
+        self._version_murs += 1
+        self._index_murs.ajouter(position, orientation)
+        # seuls les chemins coupés par le mur seront recalculés au besoin
+        for i in range(2):
+            if not cache_valide or coupe_chemin(self._chemins[i], position, orientation):
+                self._chemins[i] = None
+        self._clé_chemins = positions + (tuple(self.murh), tuple(self.murv))
+        # seules les distances de la région touchée par le mur sont recalculées
+        champs.ajouter_mur(position, orientation)
+        # retirer un mur des murs plaçables du joueurs
+        self._changer_réserve(joueur, -1)
+        self.clé ^= transposition.ZOBRIST_MURS[orientation][plateau.bit_mur(position, orientation)]
+
+
+    def retirer_mur(self, joueur, position, orientation):
+        """
+        retirer_mur
+        Inverse de poser_mur: retire un mur placé par le joueur et le lui redonne.
+        Aucune validation n'est faite.
+        Arguments:
+            joueur {int} -- Le numéro du joueur (1 ou 2)
+            position {tuple} -- le tuple (x, y) de la position du mur
+            orientation {str} -- l'orientation du mur: 'horizontal' ou 'vertical'
+        """
+        # retirer le mur du moteur pendant qu'il est encore synchronisé avec la partie
+        self.moteur().retirer_mur(position, orientation)
+        self.distances().retirer_mur(position, orientation)
+        murs = self.murh if orientation == 'horizontal' else self.murv
+        # le mur retiré est presque toujours le dernier placé
+        if murs[-1] == tuple(position):
+            murs.pop()
+        else:
+            murs.remove(tuple(position))
+        self._version_murs += 1
+        self._index_murs.retirer(position, orientation)
+        self._changer_réserve(joueur, 1)
+        self.clé ^= transposition.ZOBRIST_MURS[orientation][plateau.bit_mur(position, orientation)]
+
+
+    def _changer_réserve(self, joueur, changement):
+        """Change le nombre de murs plaçables du joueur et tient la clé de Zobrist à jour"""
+        zobrist = transposition.ZOBRIST_RÉSERVES[joueur - 1]
+        self.clé ^= zobrist[self.joueurs[(joueur - 1)]['murs']]
+        self.joueurs[(joueur - 1)]['murs'] += changement
+        self.clé ^= zobrist[self.joueurs[(joueur - 1)]['murs']]
+
+
     def placer_mur(self, joueur: int, position: tuple, orientation: str):
         """
         placer_mur
@@ -442,8 +1201,6 @@ class Quoridor:
             orientation {str} -- l'orientation du mur: 'horizontal' ou 'vertical'
         Return: None
         """
-        # définir les objectifs de chaque joueurs
-        objectif = ['B1', 'B2']
         # Vérifier que le joueur est valide
         if joueur not in (1, 2):
             raise QuoridorError("joueur invalide!")
@@ -453,50 +1210,43 @@ class Quoridor:
         # Si le mur est horizontal
         if orientation == 'horizontal':
             self.check_position(position)
-            # créer un graphe des mouvements possible à jouer avec le mur ajouté
-            graphe = construire_graphe(
-                [joueur['pos'] for joueur in self.joueurs],
-                (self.murh + [position]),
-                self.murv
-            )
-            # vérifier si placer ce mur enfermerais un joueur
-            for i in range(2):
-                if not nx.has_path(graphe, (self.joueurs[i]['pos']), objectif[i]):
-                    raise QuoridorError("ce coup enfermerait un joueur")
-            # placer le mur
-            self.murh += [position]
-            # retirer un mur des murs plaçables du joueurs
-            self.joueurs[(joueur - 1)]['murs'] -= 1
+            # placer le mur s'il n'enferme personne
+            self.appliquer_coup(joueur, ('MH', tuple(position)))
+            self.publier('coup')
         # Si c'est un mur vertical
         elif orientation == 'vertical':
             # vérifier si les positions sont dans les limites du jeu
             if not 2 <= position[0] <= 9 or not 1 <= position[1] <= 8:
                 raise QuoridorError("position du mur invalide!")
-            # vérifier si l'emplacement est déjà occupé
-            if (position[0], position[1]) in self.murv:
+            # vérifier si l'emplacement est déjà occupé, chevauché (dessous ou dessus)
+            # ou croisé par un mur horizontal
+            if not self.index_murs().libre(position, 'vertical'):
                 raise QuoridorError("Il y a déjà un mur!")
-            # Prendre en compte le décalage des murs
-            if (position[0], (position[1] - 1)) in self.murv:
-                raise QuoridorError("Il y a déjà un mur!")
-            # créer un graphe des mouvements possible à jouer avec le mur ajouté
-            graphe = construire_graphe(
-                [joueur['pos'] for joueur in self.joueurs],
-                self.murh,
-                (self.murv + [position])
-            )
-            # vérifier si placer ce mur enfermerais le joueur
-            for i in range(2):
-                if not nx.has_path(graphe, (self.joueurs[i]['pos']), objectif[i]):
-                    raise QuoridorError("ce coup enfermerait un joueur")
-            # placer le mur
-            self.murv += [position]
-            # retirer un mur des murs plaçables du joueurs
-            self.joueurs[(joueur - 1)]['murs'] -= 1
+            # placer le mur s'il n'enferme personne
+            self.appliquer_coup(joueur, ('MV', tuple(position)))
+            self.publier('coup')
         # Si l'orientation n'est ni horizontal ni vertical, soulever une exception
         else:
             raise QuoridorError("orientation invalide!")
 
 
+def charger_parties(états, moteur='networkx', vérifier=False):
+    """Construit des parties à partir d'une liste d'états (positions stockées, réponses
+    du serveur), par Quoridor.depuis_état
+    Arguments:
+        états {iterable} -- les états, au format de état_partie
+    Keyword Arguments:
+        moteur {str} -- le moteur de déplacements des parties (default: {'networkx'})
+        vérifier {bool} -- valider chaque état comme le constructeur (default: {False})
+    Return:
+        list -- les parties, dans l'ordre des états
+    """
+    if vérifier:
+        return [Quoridor(état['joueurs'], état['murs'], moteur) for état in états]
+    construire = Quoridor.depuis_état
+    return [construire(état, moteur) for état in états]
+
+
 class TestQuoridor(unittest.TestCase):
     """classe test quoridor"""
 
@@ -511,6 +1261,7 @@ class TestQuoridor(unittest.TestCase):
                 - QuoridorError si l'argument 'mur' n'est pas un dictionnaire si présent
                 - QuoridorError si le total des murs placés et plaçables n'est pas 20
                 - QuoridorError si la position d'un mur est invalide
+                - QuoridorError si le moteur demandé n'existe pas
         """
         # Dresser des tableaux connus pour des constructions connues
         nouveau_jeu = ("légende: 1=foo 2=bar\n" +
@@ -570,6 +1321,11 @@ class TestQuoridor(unittest.TestCase):
         self.assertEqual(str(Quoridor(partie_existante_etat['joueurs'],
                                       partie_existante_etat['murs'])),
                          partie_existante_tableau)
+        # Test de création d'une partie avec le moteur en masques de bits
+        self.assertEqual(str(Quoridor(["foo", "bar"], moteur='bits')), nouveau_jeu)
+        # Test de l'erreur soulevée si le moteur demandé n'existe pas
+        self.assertRaisesRegex(QuoridorError, "moteur invalide!",
+                               Quoridor, ["foo", "bar"], None, 'igraph')
         # Test de l'erreur soulevée si l'argument 'joueur' n'est pas itérable
         self.assertRaisesRegex(QuoridorError, "joueurs n'est pas iterable!", Quoridor, 2)
         # Test de l'erreur soulevée si l'argument 'joueur' n'est pas de longueur 2
@@ -820,6 +1576,87 @@ class TestQuoridor(unittest.TestCase):
         # Tester si la fonction retourne la bonne affichage
         nouvellepartie = Quoridor(["joueur1", "joueur2"])
         self.assertEqual(nouvellepartie.état_partie(), nouvelle_partie_etat)
+        # une copie: la modifier ne change pas la partie
+        état = nouvellepartie.état_partie()
+        état['joueurs'][0]['murs'] = 0
+        état['murs']['horizontaux'].append((4, 3))
+        self.assertEqual(nouvellepartie.état_partie(), nouvelle_partie_etat)
+
+
+    def test_depuis_état(self):
+        """ Test des fonctions depuis_état et charger_parties
+            Cas à tester:
+                - la partie construite a le même état et la même clé
+                - l'état d'origine n'est pas partagé avec la partie
+                - les positions en listes (JSON) deviennent des tuples
+                - charger_parties donne les mêmes parties avec ou sans vérification
+        """
+        jeu = Quoridor(["joueur1", "joueur2"], moteur='bits')
+        jeu.placer_mur(1, (4, 3), 'horizontal')
+        jeu.placer_mur(2, (6, 6), 'vertical')
+        jeu.déplacer_jeton(1, (5, 2))
+        état = jeu.état_partie()
+        copie = Quoridor.depuis_état(état, 'bits')
+        self.assertEqual(copie.état_partie(), état)
+        self.assertEqual(copie.clé, jeu.clé)
+        self.assertEqual(copie.murs_valides(1), jeu.murs_valides(1))
+        copie.placer_mur(1, (2, 5), 'horizontal')
+        self.assertEqual(état['joueurs'][0]['murs'], 9)
+        self.assertEqual(état['murs']['horizontaux'], [(4, 3)])
+        réponse = {"joueurs": [{"nom": "a", "murs": 9, "pos": [5, 2]},
+                            {"nom": "b", "murs": 10, "pos": [5, 9]}],
+                "murs": {"horizontaux": [[4, 3]], "verticaux": []}}
+        self.assertEqual(Quoridor.depuis_état(réponse).joueurs[0]['pos'], (5, 2))
+        self.assertRaisesRegex(QuoridorError, "moteur invalide!",
+                               Quoridor.depuis_état, état, 'inconnu')
+        parties = charger_parties([état, réponse], 'bits')
+        vérifiées = charger_parties([état, réponse], 'bits', vérifier=True)
+        self.assertEqual([partie.état_partie() for partie in parties],
+                         [partie.état_partie() for partie in vérifiées])
+        self.assertEqual([partie.clé for partie in parties],
+                         [partie.clé for partie in vérifiées])
+
+
+    def test_vue_partie(self):
+        """ Test des fonctions vue_partie et instantané
+            Cas à tester:
+                - la vue a le contenu de état_partie et suit la partie
+                - la vue ne peut pas être modifiée
+                - l'instantané ne change plus et réutilise les murs inchangés
+        """
+        jeu = Quoridor(["joueur1", "joueur2"], moteur='bits')
+        vue = jeu.vue_partie()
+        avant = jeu.instantané()
+        self.assertEqual(vue['murs']['horizontaux'], [])
+        jeu.placer_mur(1, (4, 3), 'horizontal')
+        jeu.déplacer_jeton(2, (5, 8))
+        self.assertEqual(vue['murs']['horizontaux'], [(4, 3)])
+        self.assertEqual(vue['joueurs'][1]['pos'], (5, 8))
+        état = jeu.état_partie()
+        self.assertEqual([dict(joueur) for joueur in vue['joueurs']], état['joueurs'])
+        self.assertEqual(list(vue['murs']['horizontaux']), état['murs']['horizontaux'])
+        with self.assertRaises(TypeError):
+            vue['joueurs'][0]['murs'] = 10
+        with self.assertRaises(TypeError):
+            vue['murs']['horizontaux'][0] = (1, 2)
+        self.assertFalse(hasattr(vue['murs']['verticaux'], 'append'))
+        # l'instantané pris avant les coups n'a pas changé
+        self.assertEqual(avant['murs']['horizontaux'], ())
+        self.assertEqual(avant['joueurs'][1]['pos'], (5, 9))
+        premier = jeu.instantané()
+        self.assertEqual(premier['murs']['horizontaux'], ((4, 3),))
+        # un déplacement ne recopie pas les murs
+        jeu.déplacer_jeton(1, (5, 2))
+        second = jeu.instantané()
+        self.assertIs(second['murs']['horizontaux'], premier['murs']['horizontaux'])
+        self.assertEqual(second['joueurs'][0]['pos'], (5, 2))
+        self.assertEqual(premier['joueurs'][0]['pos'], (5, 1))
+        # un mur retiré donne de nouveaux murs
+        jeu.annuler_coup()
+        jeu.annuler_coup()
+        jeu.annuler_coup()
+        self.assertEqual(jeu.instantané()['murs']['horizontaux'], ())
+        self.assertEqual(premier['murs']['horizontaux'], ((4, 3),))
 
 
     def test_jouer_coup(self):
@@ -892,8 +1729,10 @@ class TestQuoridor(unittest.TestCase):
                 - Les murs horizontaux et verticaux sont placés correctement
                 - QuoridorError si le numéro du joueur n'est pas bon
                 - QuoridorError si un mur occupe déjà la position
+                - QuoridorError si un mur chevauche ou croise un mur existant
                 - QuoridorError si la position est invalide pour l'horientation
                 - QuoridorError si le joueur a déjà placé tous ses murs
+                - les murs ajoutés à la main sont pris en compte
         """
         jeu1_etat = {
             "joueurs": [
@@ -948,6 +1787,17 @@ class TestQuoridor(unittest.TestCase):
         # Position décallée
         self.assertRaisesRegex(QuoridorError, "Il y a déjà un mur!",
                                jeu3.placer_mur, 1, (4, 5), 'vertical')
+        # Chevauchement par la droite (ou par le dessus)
+        self.assertRaisesRegex(QuoridorError, "Il y a déjà un mur!",
+                               jeu3.placer_mur, 1, (3, 4), 'horizontal')
+        self.assertRaisesRegex(QuoridorError, "Il y a déjà un mur!",
+                               jeu3.placer_mur, 1, (4, 3), 'vertical')
+        # Croisement: même centre qu'un mur de l'autre orientation
+        self.assertRaisesRegex(QuoridorError, "Il y a déjà un mur!",
+                               jeu3.placer_mur, 1, (5, 3), 'vertical')
+        self.assertRaisesRegex(QuoridorError, "Il y a déjà un mur!",
+                               jeu3.placer_mur, 1, (5, 3), 'horizontal')
+        self.assertEqual(jeu3.état_partie()['joueurs'][0]['murs'], 7)
         # Tester l'erreur si l'orientation n'est pas valide
         self.assertRaisesRegex(QuoridorError, "orientation invalide!",
                                jeu3.placer_mur, 1, (4, 5), 'diagonale')
@@ -974,6 +1824,204 @@ class TestQuoridor(unittest.TestCase):
                                jeu3.placer_mur, 1, (3, 3), 'horizontal')
         self.assertRaisesRegex(nx.exception.NetworkXError, "",
                                jeu3.placer_mur, 1, (4, 2), 'vertical')
+        # les murs ajoutés à la main sont vus, avec chaque moteur
+        for moteur in MOTEURS:
+            jeu = Quoridor(["joueur1", "joueur2"], moteur=moteur)
+            jeu.placer_mur(1, (2, 5), 'horizontal')
+            jeu.murh.append((4, 9))
+            jeu.murv.append((7, 3))
+            self.assertRaisesRegex(QuoridorError, "Il y a déjà un mur!",
+                                   jeu.placer_mur, 1, (4, 9), 'horizontal')
+            self.assertRaisesRegex(QuoridorError, "Il y a déjà un mur!",
+                                   jeu.placer_mur, 1, (7, 4), 'vertical')
+
+
+    def test_murs_valides(self):
+        """ Test de la fonction murs_valides
+            Cas à tester:
+                - les murs retournés sont exactement ceux que placer_mur accepte
+                - les murs ajoutés à la main sont pris en compte
+                - un joueur sans murs n'a aucun mur valide
+                - QuoridorError si le numéro du joueur n'est pas bon
+        """
+        etat = {
+            "joueurs": [
+                {"nom": "joueur1", "murs": 4, "pos": (1, 1)},
+                {"nom": "joueur2", "murs": 0, "pos": (3, 5)}
+            ],
+            "murs": {
+                "horizontaux": [(4, 4), (2, 6), (4, 2), (5, 8), (7, 8), (1, 4), (6, 6)],
+                "verticaux": [(6, 2), (4, 4), (2, 5), (7, 5), (7, 7), (2, 1), (8, 2),
+                              (3, 7), (6, 4)]
+            }}
+        for moteur in MOTEURS:
+            jeu = Quoridor(etat['joueurs'], etat['murs'], moteur)
+            attendus = []
+            for x in range(1, 10):
+                for y in range(1, 10):
+                    for orientation in ['horizontal', 'vertical']:
+                        essai = Quoridor(etat['joueurs'], etat['murs'], moteur)
+                        try:
+                            essai.placer_mur(1, (x, y), orientation)
+                        except QuoridorError:
+                            continue
+                        attendus.append(((x, y), orientation))
+            self.assertEqual(sorted(jeu.murs_valides(1)), sorted(attendus))
+            # le mur vertical en (2, 3) enfermerait le joueur 1 dans son coin
+            self.assertNotIn(((2, 3), 'vertical'), attendus)
+            self.assertEqual(jeu.murs_valides(2), [])
+            self.assertRaisesRegex(QuoridorError, "joueur invalide!", jeu.murs_valides, 3)
+            # un mur ajouté à la main n'est plus proposé
+            jeu = Quoridor(["joueur1", "joueur2"], moteur=moteur)
+            jeu.murs_valides(1)
+            jeu.murh.append((4, 2))
+            valides = jeu.murs_valides(1)
+            self.assertNotIn(((4, 2), 'horizontal'), valides)
+            self.assertNotIn(((5, 2), 'horizontal'), valides)
+            self.assertEqual(len(valides), 128 - 4)
+
+
+    def test_annuler_coup(self):
+        """ Test des fonctions annuler_coup et refaire_coup
+            Cas à tester:
+                - annuler tous les coups redonne l'état et la clé de départ
+                - refaire tous les coups redonne l'état et la clé de la fin
+                - un nouveau coup efface les coups à refaire
+                - QuoridorError s'il n'y a aucun coup à annuler ou à refaire
+        """
+        jeu = Quoridor(["joueur1", "joueur2"])
+        self.assertRaisesRegex(QuoridorError, "aucun coup à annuler!", jeu.annuler_coup)
+        self.assertRaisesRegex(QuoridorError, "aucun coup à refaire!", jeu.refaire_coup)
+        départ = (jeu.état_partie(), jeu.clé)
+        jeu.déplacer_jeton(1, (5, 2))
+        jeu.placer_mur(2, (5, 3), 'horizontal')
+        jeu.déplacer_jeton(1, (4, 2))
+        jeu.placer_mur(2, (4, 2), 'vertical')
+        jeu.déplacer_jeton(1, (4, 1))
+        fin = (jeu.état_partie(), jeu.clé)
+        for _ in range(5):
+            jeu.annuler_coup()
+        self.assertEqual((jeu.état_partie(), jeu.clé), départ)
+        for _ in range(5):
+            jeu.refaire_coup()
+        self.assertEqual((jeu.état_partie(), jeu.clé), fin)
+        # les déplacements sont encore validés correctement après les annulations
+        self.assertRaisesRegex(QuoridorError, "mouvement invalide!",
+                               jeu.déplacer_jeton, 1, (4, 3))
+        jeu.annuler_coup()
+        self.assertRaisesRegex(QuoridorError, "mouvement invalide!",
+                               jeu.déplacer_jeton, 1, (3, 2))
+        jeu.déplacer_jeton(1, (4, 3))
+        self.assertRaisesRegex(QuoridorError, "aucun coup à refaire!", jeu.refaire_coup)
+
+
+    def test_distance_objectif(self):
+        """ Test de la fonction distance_objectif
+            Cas à tester:
+                - la distance au départ est de 8 pas
+                - un mur qui barre le chemin allonge la distance, l'annuler la raccourcit
+                - la distance suit les murs ajoutés à la main
+                - QuoridorError si le joueur est invalide
+        """
+        jeu = Quoridor(["joueur1", "joueur2"])
+        self.assertEqual((jeu.distance_objectif(1), jeu.distance_objectif(2)), (8, 8))
+        jeu.placer_mur(2, (5, 2), 'horizontal')
+        self.assertEqual(jeu.distance_objectif(1), 9)
+        self.assertEqual(jeu.distance_objectif(1), len(jeu.chemin(1)) - 2)
+        jeu.annuler_coup()
+        self.assertEqual(jeu.distance_objectif(1), 8)
+        jeu.murh.append((4, 9))
+        jeu.murh.append((6, 9))
+        self.assertEqual(jeu.distance_objectif(2), 10)
+        self.assertRaisesRegex(QuoridorError, "joueur invalide!", jeu.distance_objectif, 3)
+
+
+    def test_coups_légaux(self):
+        """ Test de la fonction coups_légaux
+            Cas à tester:
+                - au départ: 3 déplacements et les 128 murs
+                - les sauts et les diagonales sont compris
+                - une position déjà vue est retrouvée dans le cache
+                - les murs ajoutés à la main sont pris en compte
+                - aucun coup si la partie est terminée
+                - QuoridorError si le joueur est invalide
+        """
+        jeu = Quoridor(["joueur1", "joueur2"])
+        coups = jeu.coups_légaux(1)
+        self.assertEqual(coups[:3], (('D', (4, 1)), ('D', (5, 2)), ('D', (6, 1))))
+        self.assertEqual(len(coups), 3 + 128)
+        self.assertIs(Quoridor(["joueur1", "joueur2"]).coups_légaux(1), coups)
+        jeu.murh.append((5, 2))
+        coups = jeu.coups_légaux(1)
+        self.assertNotIn(('D', (5, 2)), coups)
+        self.assertEqual([coup for coup in coups if coup[0] == 'D'],
+                         [('D', position) for position in sorted(jeu.moteur().successeurs((5, 1)))])
+        # face à face: saut par-dessus, ou diagonales si un mur bloque le saut
+        jeu = Quoridor([{"nom": "joueur1", "murs": 9, "pos": (5, 5)},
+                        {"nom": "joueur2", "murs": 10, "pos": (5, 6)}],
+                       {"horizontaux": [(5, 8)], "verticaux": []})
+        self.assertIn(('D', (5, 7)), jeu.coups_légaux(1))
+        jeu.placer_mur(2, (4, 7), 'horizontal')
+        déplacements = [coup for coup in jeu.coups_légaux(1) if coup[0] == 'D']
+        self.assertEqual(déplacements, [('D', (4, 5)), ('D', (4, 6)), ('D', (5, 4)),
+                                        ('D', (6, 5)), ('D', (6, 6))])
+        self.assertNotIn(('MH', (4, 7)), jeu.coups_légaux(1))
+        self.assertNotIn(('MH', (5, 7)), jeu.coups_légaux(1))
+        jeu = Quoridor([{"nom": "joueur1", "murs": 10, "pos": (5, 9)},
+                        {"nom": "joueur2", "murs": 10, "pos": (5, 5)}])
+        self.assertEqual(jeu.coups_légaux(2), ())
+        self.assertRaisesRegex(QuoridorError, "joueur invalide!", jeu.coups_légaux, 3)
+
+
+class TestGrapheJeu(unittest.TestCase):
+    """classe test GrapheJeu"""
+
+    def test_parité_construire_graphe(self):
+        """ Test de parité entre GrapheJeu et construire_graphe
+            Cas à tester:
+                - des séquences de coups aléatoires donnent toujours
+                  exactement les mêmes arcs que construire_graphe
+                - retirer les murs un à un redonne les mêmes arcs
+        """
+        for graine in range(10):
+            hasard = random.Random(graine)
+            jeu = Quoridor(["joueur1", "joueur2"])
+            for tour in range(80):
+                joueur = (tour % 2) + 1
+                positions = [j['pos'] for j in jeu.joueurs]
+                référence = construire_graphe(positions, jeu.murh, jeu.murv)
+                if hasard.random() < 0.4:
+                    # essayer un mur au hasard
+                    orientation = hasard.choice(['horizontal', 'vertical'])
+                    if orientation == 'horizontal':
+                        position = (hasard.randint(1, 8), hasard.randint(2, 9))
+                    else:
+                        position = (hasard.randint(2, 9), hasard.randint(1, 8))
+                    try:
+                        jeu.placer_mur(joueur, position, orientation)
+                    except (QuoridorError, nx.NetworkXError):
+                        pass
+                else:
+                    # déplacer le jeton vers un successeur au hasard
+                    successeurs = [s for s in référence.successors(positions[joueur - 1])
+                                   if s not in ('B1', 'B2')]
+                    jeu.déplacer_jeton(joueur, hasard.choice(successeurs))
+                positions = [j['pos'] for j in jeu.joueurs]
+                self.assertEqual(set(jeu.graphe().edges()),
+                                 set(construire_graphe(positions, jeu.murh, jeu.murv).edges()))
+                if jeu.partie_terminée():
+                    break
+            # retirer les murs un à un
+            graphe = GrapheJeu(positions, jeu.murh, jeu.murv)
+            murh = list(jeu.murh)
+            murv = list(jeu.murv)
+            while murh or murv:
+                if murh:
+                    graphe.retirer_mur(murh.pop(), 'horizontal')
+                else:
+                    graphe.retirer_mur(murv.pop(), 'vertical')
+                self.assertEqual(set(graphe.graphe.edges()),
+                                 set(construire_graphe(positions, murh, murv).edges()))
 
 
 #Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
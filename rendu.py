@@ -0,0 +1,139 @@
+""" rendu.py
+Module d'affichage en art ascii du damier de Quoridor (voir Quoridor.__str__).
+Le damier vide est construit une seule fois. La couche des murs (le damier vide sur
+lequel les murs sont dessinés) est gardée en mémoire par disposition de murs: elle
+n'est redessinée que lorsqu'un mur est ajouté ou retiré. Chaque affichage copie cette
+couche et n'y écrit que les deux jetons.
+Toutes les lignes du damier ont LARGEUR caractères:
+    - rangée de cases y: le numéro, '|', un ' ' puis '.' toutes les 4 colonnes, '|'
+    - entre les rangées y et y - 1: les murs horizontaux '-------' et verticaux '|'
+contient les fonctions:
+    - couche_murs
+        le damier avec ses murs, en octets
+    - afficher_octets
+        le damier d'une partie, en octets UTF-8 (pour les sockets et les fichiers)
+    - afficher
+        le damier d'une partie, en chaîne de caractères
+"""
+import unittest
+
+
+# nombre de cases par côté
+CASES = 9
+# largeur d'une ligne du damier, saut de ligne compris
+LARGEUR = 4 * CASES + 4
+# couches de murs gardées en mémoire (vidées lorsque le nombre est atteint)
+TAILLE_COUCHES = 256
+
+
+def _gabarit():
+    """Construit le damier vide: (bordure du haut, lignes des cases, bas du damier)"""
+    bordure = ' ' * 3 + '-' * (4 * CASES - 1) + '\n'
+    lignes = []
+    for y in range(CASES, 0, -1):
+        lignes.append('{:<2}| .'.format(y) + '   .' * (CASES - 1) + ' |\n')
+        if y > 1:
+            lignes.append('  |' + ' ' * (4 * CASES - 1) + '|\n')
+    bas = ('--|' + '-' * (4 * CASES - 1) + '\n' + '  | ' +
+           ''.join('{}   '.format(x) for x in range(1, CASES)) + '{}\n'.format(CASES))
+    return bordure.encode('ascii'), ''.join(lignes).encode('ascii'), bas.encode('ascii')
+
+
+# bordure du haut, lignes des cases et bas du damier vide
+BORDURE, DAMIER_VIDE, BAS = _gabarit()
+# couches de murs déjà dessinées: (murs horizontaux, murs verticaux) -> octets
+COUCHES = {}
+
+
+def indice_case(position):
+    """Donne l'indice, dans les lignes du damier, du caractère de la case (x, y)"""
+    x, y = position
+    return 2 * (CASES - y) * LARGEUR + 4 * x
+
+
+def couche_murs(murs_horizontaux, murs_verticaux):
+    """Donne les lignes du damier avec les murs dessinés (sans les jetons)
+    Les murs verticaux sont dessinés après les horizontaux: au croisement, '|' l'emporte.
+    Arguments:
+        murs_horizontaux, murs_verticaux {tuple} -- les positions (x, y) des murs
+    Return:
+        bytes -- les lignes du damier
+    """
+    clé = (murs_horizontaux, murs_verticaux)
+    couche = COUCHES.get(clé)
+    if couche is None:
+        lignes = bytearray(DAMIER_VIDE)
+        for x, y in murs_horizontaux:
+            # sous la rangée y, de la colonne x à la colonne x + 1
+            début = (2 * (CASES - y) + 1) * LARGEUR + 4 * x - 1
+            lignes[début:début + 7] = b'-------'
+        for x, y in murs_verticaux:
+            # à gauche de la colonne x, des rangées y à y + 1
+            for ligne in range(2 * (CASES - y) - 2, 2 * (CASES - y) + 1):
+                lignes[ligne * LARGEUR + 4 * x - 2] = ord('|')
+        if len(COUCHES) >= TAILLE_COUCHES:
+            COUCHES.clear()
+        couche = COUCHES[clé] = bytes(lignes)
+    return couche
+
+
+def afficher_octets(jeu):
+    """Donne le damier d'une partie en octets UTF-8, identique à str(jeu).encode()
+    Arguments:
+        jeu {Quoridor} -- la partie
+    """
+    lignes = bytearray(couche_murs(tuple(jeu.murh), tuple(jeu.murv)))
+    for numero, joueur in enumerate(jeu.joueurs):
+        lignes[indice_case(joueur['pos'])] = ord('1') + numero
+    légende = "légende: 1={} 2={}\n".format(jeu.joueurs[0]['nom'], jeu.joueurs[1]['nom'])
+    return b''.join((légende.encode('utf-8'), BORDURE, lignes, BAS))
+
+
+def afficher(jeu):
+    """Donne le damier d'une partie en chaîne de caractères (voir Quoridor.__str__)"""
+    lignes = bytearray(couche_murs(tuple(jeu.murh), tuple(jeu.murv)))
+    for numero, joueur in enumerate(jeu.joueurs):
+        lignes[indice_case(joueur['pos'])] = ord('1') + numero
+    return ("légende: 1={} 2={}\n".format(jeu.joueurs[0]['nom'], jeu.joueurs[1]['nom']) +
+            (BORDURE + lignes + BAS).decode('ascii'))
+
+
+class TestRendu(unittest.TestCase):
+    """classe test rendu"""
+
+    def test_afficher(self):
+        """ Test de l'affichage
+            Cas à tester:
+                - les octets sont l'encodage UTF-8 de la chaîne
+                - la couche de murs est réutilisée tant que les murs ne changent pas
+                - un mur ajouté puis retiré redonne le même damier
+                - les murs sont aux mêmes caractères que dans l'ancien affichage
+        """
+        import quoridor
+        jeu = quoridor.Quoridor(["élise", "bob"])
+        self.assertEqual(bytes(jeu), str(jeu).encode('utf-8'))
+        avant = str(jeu)
+        couche = couche_murs((), ())
+        jeu.déplacer_jeton(1, (5, 2))
+        self.assertIs(couche_murs(tuple(jeu.murh), tuple(jeu.murv)), couche)
+        jeu.placer_mur(2, (4, 3), 'horizontal')
+        self.assertNotEqual(str(jeu).count('-'), avant.count('-'))
+        jeu.annuler_coup()
+        jeu.annuler_coup()
+        self.assertEqual(str(jeu), avant)
+        jeu = quoridor.Quoridor([{"nom": "a", "murs": 9, "pos": (1, 1)},
+                                 {"nom": "b", "murs": 9, "pos": (9, 9)}],
+                                {"horizontaux": [(4, 5)], "verticaux": [(8, 8)]})
+        lignes = str(jeu).split('\n')
+        # le mur horizontal (4, 5) est sous la rangée 5 (après la légende, la bordure
+        # et les rangées 9 à 5)
+        self.assertEqual(lignes[11], '  |' + ' ' * 12 + '-' * 7 + ' ' * 16 + '|')
+        # le mur vertical (8, 8) longe les rangées 9 et 8, à gauche de la colonne 8
+        self.assertEqual([ligne[30] for ligne in lignes[2:6]], ['|', '|', '|', ' '])
+        self.assertEqual(lignes[2][36], '2')
+        self.assertEqual(bytes(jeu), str(jeu).encode('utf-8'))
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
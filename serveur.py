@@ -0,0 +1,343 @@
+'''serveur.py
+
+Serveur HTTP local qui remplace le serveur du cours, pour jouer et tester hors ligne.
+Il offre les routes lister/, débuter/ et jouer/ avec les mêmes réponses JSON
+('id', 'état', 'gagnant', 'message'); les règles sont celles de la classe Quoridor et
+l'automate du serveur joue avec Quoridor.jouer_coup. Les parties sont gardées en mémoire.
+Pour y brancher api.py:
+    python serveur.py --port 8000
+    QUORIDOR_URL=http://127.0.0.1:8000/quoridor/api/ python main.py
+Le mode charge démarre le serveur, y joue des parties en parallèle avec api_async
+et affiche le débit et la latence:
+    python serveur.py --charge 200 --concurrence 50
+Contient les fonctions:
+    - démarrer
+        démarre le serveur dans un fil d'exécution
+    - charge
+        joue des parties contre un serveur et mesure le débit et la latence
+Contient les classes:
+    - ServeurQuoridor
+    - GestionnaireQuoridor
+'''
+import argparse
+import asyncio
+import datetime
+import json
+import re
+import threading
+import time
+import unittest
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import quoridor
+import transposition
+
+
+# préfixe des routes, le même que sur le serveur du cours
+PRÉFIXE = '/quoridor/api/'
+# nombre de parties retournées par lister/
+PARTIES_LISTÉES = 20
+# nombre de cases de la table de transposition de l'automate, dans chaque partie
+TAILLE_TABLE_PARTIE = 1 << 14
+
+
+class ServeurQuoridor(ThreadingHTTPServer):
+    '''class ServeurQuoridor
+
+    Description:
+        Serveur HTTP (un fil d'exécution par connexion) qui garde les parties en mémoire
+    Attributs:
+        parties (dict):
+            Pour chaque id: {'idul', 'date', 'jeu' (Quoridor), 'table' (la table de
+            transposition de l'automate), 'verrou', 'gagnant'}
+        délai (float):
+            Le temps de réflexion de l'automate, en secondes
+        profondeur (int):
+            La profondeur de recherche de l'automate (None: limitée par le délai)
+    '''
+    daemon_threads = True
+
+    def __init__(self, adresse, délai=0.05, profondeur=None, moteur='bits'):
+        '''
+        Input:
+            adresse (tuple):
+                (hôte, port) où écouter; le port 0 en choisit un libre
+            délai (float):
+                Le temps de réflexion de l'automate (default: 0.05)
+            profondeur (int):
+                La profondeur de recherche de l'automate (default: None)
+            moteur (str):
+                Le moteur des parties (default: 'bits')
+        '''
+        super().__init__(adresse, GestionnaireQuoridor)
+        self.parties = {}
+        self.délai = délai
+        self.profondeur = profondeur
+        self.moteur = moteur
+        self.verrou = threading.Lock()
+
+
+    def url(self):
+        '''Donne l'URL de base à utiliser comme api.URL_BASE'''
+        return 'http://{}:{}{}'.format(self.server_address[0], self.server_address[1], PRÉFIXE)
+
+
+    def lister(self, idul):
+        '''Les dernières parties du joueur, la plus récente en premier'''
+        with self.verrou:
+            parties = [(id_partie, partie) for id_partie, partie in self.parties.items()
+                       if partie['idul'] == idul]
+        parties.sort(key=lambda item: item[1]['date'], reverse=True)
+        return {'parties': [{'id': id_partie, 'date': partie['date'],
+                             'joueurs': [partie['idul'], 'automate'],
+                             'gagnant': partie['gagnant']}
+                            for id_partie, partie in parties[:PARTIES_LISTÉES]]}
+
+
+    def débuter(self, idul):
+        '''Crée une nouvelle partie'''
+        id_partie = str(uuid.uuid4())
+        jeu = quoridor.Quoridor([idul, 'automate'], moteur=self.moteur)
+        with self.verrou:
+            self.parties[id_partie] = {'idul': idul, 'date': datetime.datetime.now().isoformat(),
+                                       'jeu': jeu, 'verrou': threading.Lock(), 'gagnant': None,
+                                       # chaque partie cherche dans sa propre table: les
+                                       # automates de plusieurs parties jouent en même temps
+                                       'table': transposition.TableTransposition(
+                                           TAILLE_TABLE_PARTIE)}
+        return {'id': id_partie, 'état': jeu.état_partie()}
+
+
+    def jouer(self, id_partie, type_coup, position):
+        '''Joue le coup du joueur, puis celui de l'automate'''
+        with self.verrou:
+            partie = self.parties.get(id_partie)
+        if partie is None:
+            return {'message': "Aucune partie ne correspond à cet identifiant."}
+        with partie['verrou']:
+            jeu = partie['jeu']
+            if partie['gagnant']:
+                return {'message': "La partie est déjà terminée."}
+            try:
+                if type_coup == 'D':
+                    jeu.déplacer_jeton(1, position)
+                elif type_coup in ('MH', 'MV'):
+                    jeu.placer_mur(1, position, 'horizontal' if type_coup == 'MH' else 'vertical')
+                else:
+                    return {'message': "Type de coup invalide."}
+                if not jeu.partie_terminée():
+                    jeu.jouer_coup(2, self.délai, self.profondeur, table=partie['table'])
+            except quoridor.QuoridorError as erreur:
+                return {'message': str(erreur)}
+            partie['gagnant'] = jeu.partie_terminée() or None
+            if partie['gagnant']:
+                return {'gagnant': partie['gagnant']}
+            return {'id': id_partie, 'état': jeu.état_partie()}
+
+
+def lire_position(valeurs):
+    '''Lit une position (x, y) envoyée par formulaire: deux clés 'pos' répétées
+    (comme les envoie requests pour un tuple) ou une seule valeur comme "(4, 5)"
+    '''
+    if len(valeurs) == 1:
+        valeurs = re.findall(r'-?\d+', valeurs[0])
+    if len(valeurs) != 2:
+        raise ValueError("position invalide")
+    return (int(valeurs[0]), int(valeurs[1]))
+
+
+class GestionnaireQuoridor(BaseHTTPRequestHandler):
+    '''class GestionnaireQuoridor
+
+    Description:
+        Traite les requêtes HTTP d'un ServeurQuoridor.
+        HTTP/1.1: les connexions restent ouvertes entre les requêtes (keep-alive).
+    '''
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+
+    def répondre(self, contenu, code=200):
+        '''Envoie une réponse JSON'''
+        corps = json.dumps(contenu, ensure_ascii=False).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corps)))
+        self.end_headers()
+        self.wfile.write(corps)
+
+
+    def route(self):
+        '''Donne la route demandée ('lister/', 'débuter/', ...), sans préfixe et décodée'''
+        chemin = unquote(urlsplit(self.path).path)
+        return chemin[len(PRÉFIXE):] if chemin.startswith(PRÉFIXE) else None
+
+
+    def do_GET(self):
+        if self.route() != 'lister/':
+            self.répondre({'message': "Route inconnue."}, 404)
+            return
+        idul = parse_qs(urlsplit(self.path).query).get('idul', [''])[0]
+        self.répondre(self.server.lister(idul))
+
+
+    def do_POST(self):
+        longueur = int(self.headers.get('Content-Length', 0))
+        données = parse_qs(self.rfile.read(longueur).decode('utf-8'))
+        route = self.route()
+        if route == 'débuter/' and données.get('idul'):
+            self.répondre(self.server.débuter(données['idul'][0]))
+        elif route == 'jouer/':
+            try:
+                position = lire_position(données.get('pos', []))
+                id_partie, type_coup = données['id'][0], données['type'][0]
+            except (KeyError, ValueError):
+                self.répondre({'message': "Requête invalide."})
+                return
+            self.répondre(self.server.jouer(id_partie, type_coup, position))
+        elif route == 'débuter/':
+            self.répondre({'message': "Il manque l'IDUL."})
+        else:
+            self.répondre({'message': "Route inconnue."}, 404)
+
+
+def démarrer(hôte='127.0.0.1', port=0, **options):
+    '''Démarre un ServeurQuoridor dans un fil d'exécution
+    Input:
+        hôte (str), port (int):
+            L'adresse où écouter (default: 127.0.0.1, un port libre)
+        options:
+            Les options de ServeurQuoridor (délai, profondeur, moteur)
+    Return:
+        (ServeurQuoridor):
+            Le serveur; serveur.url() donne l'URL de base, serveur.shutdown() l'arrête
+    '''
+    serveur = ServeurQuoridor((hôte, port), **options)
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    return serveur
+
+
+def charge(url, parties=100, concurrence=20, délai=0.01):
+    '''def charge(url, parties, concurrence, délai)
+
+    Description:
+        Joue des parties en parallèle contre un serveur et mesure le débit et la latence
+    Input:
+        url (str):
+            L'URL de base du serveur
+        parties (int):
+            Le nombre de parties à jouer (default: 100)
+        concurrence (int):
+            Le nombre maximal de requêtes simultanées (default: 20)
+        délai (float):
+            Le temps de réflexion du client par coup (default: 0.01)
+    Return:
+        (dict):
+            'parties', 'terminées', 'requêtes', 'durée' (s), 'parties_par_seconde',
+            'requêtes_par_seconde' et 'latences' (api.ClientQuoridor.métriques)
+    '''
+    import api
+    import api_async
+    client = api_async.ClientAsynchrone(api.ClientQuoridor(url, connexions=concurrence),
+                                        concurrence)
+    début = time.perf_counter()
+    try:
+        résultats = asyncio.run(api_async.jouer_parties(parties, 'charge', client, délai))
+    finally:
+        client.fermer()
+    durée = time.perf_counter() - début
+    latences = client.métriques()
+    requêtes = sum(route['appels'] for route in latences.values())
+    return {'parties': parties,
+            'terminées': sum(1 for résultat in résultats if résultat['gagnant']),
+            'requêtes': requêtes, 'durée': durée,
+            'parties_par_seconde': parties / durée, 'requêtes_par_seconde': requêtes / durée,
+            'latences': latences}
+
+
+def analyser_commande():
+    '''Lit les arguments de la ligne de commande'''
+    analyseur = argparse.ArgumentParser(description="Serveur local de Quoridor")
+    analyseur.add_argument('--hôte', default='127.0.0.1')
+    analyseur.add_argument('--port', type=int, default=8000)
+    analyseur.add_argument('--délai', type=float, default=0.05,
+                           help="temps de réflexion de l'automate, en secondes")
+    analyseur.add_argument('--profondeur', type=int, default=None,
+                           help="profondeur de recherche de l'automate")
+    analyseur.add_argument('--charge', type=int, default=0, metavar='PARTIES',
+                           help="jouer ce nombre de parties contre le serveur puis quitter")
+    analyseur.add_argument('--concurrence', type=int, default=20,
+                           help="requêtes simultanées en mode charge")
+    return analyseur.parse_args()
+
+
+class TestServeurQuoridor(unittest.TestCase):
+    """classe test ServeurQuoridor"""
+
+    def setUp(self):
+        import api
+        self.serveur = démarrer(délai=1.0, profondeur=1)
+        self.url_base = api.URL_BASE
+        self.client = api.CLIENT
+        # les fonctions de api.py utilisent le serveur local
+        api.URL_BASE = self.serveur.url()
+        api.CLIENT = None
+
+
+    def tearDown(self):
+        import api
+        api.client_défaut().fermer()
+        api.URL_BASE = self.url_base
+        api.CLIENT = self.client
+        self.serveur.shutdown()
+        self.serveur.server_close()
+
+
+    def test_routes(self):
+        """ Test des routes du serveur, par les fonctions de api.py
+            Cas à tester:
+                - débuter/ retourne un id et l'état initial
+                - jouer/ retourne l'état après le coup de l'automate
+                - un coup invalide ou une partie inconnue retournent un message
+                - lister/ retourne les parties du joueur
+                - le mode charge joue toutes ses parties
+        """
+        import api
+        rep = api.débuter_partie('idul')
+        self.assertEqual(rep['état']['joueurs'][0], {'nom': 'idul', 'murs': 10, 'pos': [5, 1]})
+        rep = api.jouer_coup(rep['id'], 'D', (5, 2))
+        self.assertEqual(rep['état']['joueurs'][0]['pos'], [5, 2])
+        self.assertNotEqual(rep['état']['joueurs'][1], {'nom': 'automate', 'murs': 10, 'pos': [5, 9]})
+        with self.assertRaises(RuntimeError):
+            api.jouer_coup(rep['id'], 'D', (5, 5))
+        with self.assertRaises(RuntimeError):
+            api.jouer_coup('inconnue', 'D', (5, 2))
+        api.jouer_coup(rep['id'], 'MH', (1, 8))
+        self.assertEqual([partie['id'] for partie in api.lister_parties('idul')['parties']],
+                         [rep['id']])
+        statistiques = charge(self.serveur.url(), parties=4, concurrence=4)
+        self.assertEqual(statistiques['terminées'], 4)
+        self.assertGreater(statistiques['requêtes_par_seconde'], 0)
+
+
+if __name__ == '__main__':
+    COM = analyser_commande()
+    if COM.charge:
+        SERVEUR = démarrer(COM.hôte, 0, délai=COM.délai, profondeur=COM.profondeur)
+        STATS = charge(SERVEUR.url(), COM.charge, COM.concurrence)
+        print("{} parties ({} terminées), {} requêtes en {:.2f} s".format(
+            STATS['parties'], STATS['terminées'], STATS['requêtes'], STATS['durée']))
+        print("{:.1f} parties/s, {:.1f} requêtes/s".format(
+            STATS['parties_par_seconde'], STATS['requêtes_par_seconde']))
+        for ROUTE, LATENCE in STATS['latences'].items():
+            print("{:<10} {:>6} appels  p50 {:7.2f} ms  p95 {:7.2f} ms  max {:7.2f} ms".format(
+                ROUTE, LATENCE['appels'], LATENCE['p50'], LATENCE['p95'], LATENCE['max']))
+        SERVEUR.shutdown()
+    else:
+        SERVEUR = ServeurQuoridor((COM.hôte, COM.port), COM.délai, COM.profondeur)
+        print("serveur Quoridor sur {}".format(SERVEUR.url()))
+        SERVEUR.serve_forever()
@@ -0,0 +1,257 @@
+'''session.py
+
+Session de jeu contre le serveur: l'état retourné par le serveur est reproduit dans
+une partie Quoridor locale, ce qui permet
+    - de refuser un coup invalide sans faire l'aller-retour au serveur;
+    - de profiter de l'attente de la réponse du serveur pour calculer d'avance notre
+      prochain coup en réponse aux coups les plus probables de l'adversaire.
+Contient les classes:
+    - SessionQuoridor
+'''
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import api
+import ia
+import ouverture
+import quoridor
+import transposition
+
+
+# nombre maximal de réponses de l'adversaire pour lesquelles un coup est calculé d'avance
+RÉPONSES_SPÉCULÉES = 4
+
+
+class SessionQuoridor:
+    '''class SessionQuoridor
+
+    Description:
+        Partie réseau vue par le joueur 1 (l'IDUL), avec validation locale des coups
+        et calcul spéculatif de la réponse pendant l'attente du serveur.
+    Attributs:
+        client (api.ClientQuoridor):
+            Le client du serveur
+        id_partie (str):
+            L'identifiant de la partie sur le serveur
+        jeu (quoridor.Quoridor):
+            La copie locale de la partie, synchronisée sur chaque état du serveur
+        gagnant (str):
+            Le nom du gagnant, une fois la partie terminée
+        délai (float):
+            Le temps de réflexion d'un coup, en secondes
+        livre (ouverture.LivreOuvertures):
+            Le livre d'ouvertures consulté avant toute recherche (None: aucun)
+        réponses (dict):
+            Les coups calculés d'avance: clé de Zobrist de la position -> coup
+        statistiques (dict):
+            'calculées' (coups calculés d'avance), 'utilisées' (coups d'avance joués),
+            'refusés' (coups invalides arrêtés localement)
+    '''
+
+    def __init__(self, idul, client=None, délai=1.0, moteur='bits', livre=None):
+        '''
+        Input:
+            idul (str):
+                L'identifiant IDUL du joueur
+            client (api.ClientQuoridor):
+                Le client du serveur (default: None, le client partagé de api.py)
+            délai (float):
+                Le temps de réflexion d'un coup (default: 1.0)
+            moteur (str):
+                Le moteur de la partie locale (default: 'bits')
+            livre (ouverture.LivreOuvertures):
+                Le livre d'ouvertures, ou False pour toujours chercher
+                (default: None, ouverture.livre_défaut())
+        '''
+        self.idul = idul
+        self.client = api.client_défaut() if client is None else client
+        self.délai = délai
+        self.moteur = moteur
+        self.livre = ouverture.livre_défaut() if livre is None else livre
+        self.id_partie = None
+        self.jeu = None
+        self.gagnant = None
+        self.réponses = {}
+        self.statistiques = {'calculées': 0, 'utilisées': 0, 'refusés': 0}
+        # table propre à la session: la spéculation ne doit pas dépendre des autres recherches
+        self.table = transposition.TableTransposition()
+        # un seul fil d'exécution attend le serveur pendant que le fil principal calcule
+        self.exécuteur = ThreadPoolExecutor(1)
+
+
+    def débuter(self):
+        '''Débute une partie sur le serveur et en fait la copie locale'''
+        rep = self.client.débuter_partie(self.idul)
+        self.id_partie = rep['id']
+        self.synchroniser(rep['état'])
+        return rep['état']
+
+
+    def synchroniser(self, état):
+        '''Remplace la copie locale par l'état retourné par le serveur'''
+        self.jeu = quoridor.Quoridor.depuis_état(état, self.moteur)
+
+
+    def valider(self, type_coup, position):
+        '''def valider(type_coup, position)
+
+        Description:
+            Vérifie un coup du joueur 1 sur la copie locale, sans la modifier
+        Input:
+            type_coup (str):
+                'D', 'MH' ou 'MV'
+            position (tuple):
+                La position (x, y) du coup
+        Note:
+            - Soulève QuoridorError si le coup est invalide.
+        '''
+        if type_coup == 'D':
+            self.jeu.déplacer_jeton(1, tuple(position))
+        elif type_coup in ia.ORIENTATIONS:
+            self.jeu.placer_mur(1, tuple(position), ia.ORIENTATIONS[type_coup])
+        else:
+            raise quoridor.QuoridorError("type de coup invalide!")
+        self.jeu.annuler_coup(garder=False)
+
+
+    def jouer(self, type_coup, position):
+        '''def jouer(type_coup, position)
+
+        Description:
+            Joue un coup: validé localement, puis envoyé au serveur.
+            Pendant l'attente, la réponse aux coups probables de l'adversaire est calculée.
+        Return:
+            (dict):
+                Le nouvel état de la partie (après le coup de l'adversaire)
+        Notes:
+            - Un coup invalide soulève QuoridorError sans contacter le serveur.
+            - Si le serveur retourne un message, RuntimeError est soulevée.
+            - Si le serveur retourne un gagnant, StopIteration est soulevée, comme
+                dans api.jouer_coup.
+        '''
+        if self.gagnant:
+            raise StopIteration(self.gagnant)
+        try:
+            self.valider(type_coup, position)
+        except quoridor.QuoridorError:
+            self.statistiques['refusés'] += 1
+            raise
+        envoi = self.exécuteur.submit(self.client.jouer_coup, self.id_partie,
+                                      type_coup, tuple(position))
+        self.spéculer((type_coup, tuple(position)), envoi)
+        try:
+            rep = envoi.result()
+        except StopIteration as arrêt:
+            self.gagnant = arrêt.args[0]
+            raise
+        self.synchroniser(rep['état'])
+        return rep['état']
+
+
+    def réponses_probables(self):
+        '''Les coups les plus probables de l'adversaire, dans l'ordre de la recherche de ia.py
+        (le pas sur son plus court chemin, puis les murs qui coupent notre chemin)
+        '''
+        return ia.Recherche(self.jeu, 0, self.table).coups(2, 0)[:RÉPONSES_SPÉCULÉES]
+
+
+    def spéculer(self, coup, envoi):
+        '''Calcule d'avance notre réponse aux coups probables de l'adversaire
+        La réponse au coup le plus probable est toujours calculée; les suivantes
+        seulement tant que le serveur n'a pas répondu.
+        Input:
+            coup (tuple):
+                Notre coup (type_coup, position), déjà validé
+            envoi (Future):
+                La requête au serveur en cours
+        '''
+        self.réponses = {}
+        jeu = self.jeu
+        jeu.appliquer_coup(1, coup)
+        try:
+            if jeu.partie_terminée():
+                return
+            for réponse in self.réponses_probables():
+                jeu.appliquer_coup(2, réponse)
+                try:
+                    if not jeu.partie_terminée():
+                        self.réponses[jeu.clé] = ia.meilleur_coup(jeu, 1, self.délai, self.table)
+                        self.statistiques['calculées'] += 1
+                finally:
+                    jeu.annuler_coup(garder=False)
+                if envoi.done():
+                    break
+        finally:
+            jeu.annuler_coup(garder=False)
+
+
+    def choisir_coup(self):
+        '''Notre meilleur coup: celui calculé d'avance si l'adversaire a joué un coup
+        prévu, sinon celui du livre d'ouvertures ou le résultat d'une nouvelle recherche
+        '''
+        coup = self.réponses.get(self.jeu.clé)
+        if coup is not None:
+            self.statistiques['utilisées'] += 1
+            return coup
+        coup = self.livre.coup(self.jeu, 1) if self.livre else None
+        if coup is not None:
+            return coup
+        return ia.meilleur_coup(self.jeu, 1, self.délai, self.table)
+
+
+    def jouer_automatique(self):
+        '''Joue notre meilleur coup (voir choisir_coup et jouer)'''
+        type_coup, position = self.choisir_coup()
+        return self.jouer(type_coup, position)
+
+
+    def fermer(self):
+        '''Libère le fil d'exécution de la session'''
+        self.exécuteur.shutdown(wait=False)
+
+
+class TestSessionQuoridor(unittest.TestCase):
+    """classe test SessionQuoridor, contre le serveur local de serveur.py"""
+
+    def setUp(self):
+        import serveur
+        self.serveur = serveur.démarrer(délai=1.0, profondeur=1)
+        self.client = api.ClientQuoridor(self.serveur.url())
+
+
+    def tearDown(self):
+        self.client.fermer()
+        self.serveur.shutdown()
+        self.serveur.server_close()
+
+
+    def test_session(self):
+        """ Test de la session
+            Cas à tester:
+                - un coup invalide est refusé sans contacter le serveur
+                - la copie locale suit l'état du serveur
+                - la partie se joue jusqu'au gagnant
+                - des coups calculés d'avance sont utilisés
+        """
+        session = SessionQuoridor('idul', self.client, délai=0.05, livre=False)
+        session.débuter()
+        with self.assertRaises(quoridor.QuoridorError):
+            session.jouer('D', (5, 3))
+        self.assertNotIn('jouer/', self.client.métriques())
+        self.assertEqual(session.statistiques['refusés'], 1)
+        état = session.jouer('D', (5, 2))
+        self.assertEqual(session.jeu.état_partie()['joueurs'][0]['pos'], (5, 2))
+        self.assertEqual(tuple(état['joueurs'][1]['pos']), session.jeu.joueurs[1]['pos'])
+        with self.assertRaises(StopIteration):
+            for _ in range(200):
+                session.jouer_automatique()
+        self.assertIn(session.gagnant, ('idul', 'automate'))
+        self.assertGreater(session.statistiques['utilisées'], 0)
+        self.assertGreaterEqual(session.statistiques['calculées'],
+                                session.statistiques['utilisées'])
+        session.fermer()
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)
@@ -0,0 +1,322 @@
+""" tournoi.py
+Module qui fait jouer des stratégies les unes contre les autres, sans interface,
+sur tous les coeurs de la machine (concurrent.futures.ProcessPoolExecutor).
+Chaque partie reçoit une graine dérivée de la graine du tournoi, de la paire de
+stratégies et du numéro de la partie: un tournoi relancé avec la même graine rejoue
+les mêmes parties, peu importe le nombre de processus. Seules la stratégie 'alphabeta'
+sans profondeur fixe et la stratégie 'mcts' sans nombre d'itérations dépendent de la
+vitesse de la machine (elles cherchent tant que leur délai n'est pas écoulé).
+contient les fonctions:
+    - jouer_partie
+        joue une partie entre deux stratégies
+    - tournoi
+        joue toutes les parties d'un tournoi et en fait le bilan
+    - bilan
+        taux de victoire, longueur des parties et temps par coup de chaque stratégie
+    - écrire_json, écrire_csv
+        sauvegarde des résultats
+contient les constantes:
+    - STRATÉGIES
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+import statistics
+import time
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+
+import ia
+import quoridor
+
+
+# une partie qui dépasse ce nombre de coups est déclarée nulle
+COUPS_MAX = 400
+
+
+def jouer_alphabeta(jeu, joueur, hasard, options):
+    """Joue le coup de Quoridor.jouer_coup (recherche alpha-bêta)"""
+    return jeu.jouer_coup(joueur, options.get('délai', 1.0), options.get('profondeur'),
+                          livre=False)
+
+
+def jouer_mcts(jeu, joueur, hasard, options):
+    """Joue le coup de Quoridor.jouer_coup en mode 'mcts' (recherche Monte-Carlo),
+    avec une graine tirée du hasard de la partie
+    """
+    return jeu.jouer_coup(joueur, options.get('délai', 1.0), mode='mcts', livre=False,
+                          itérations=options.get('itérations'),
+                          processus=options.get('processus_mcts', 1),
+                          graine=hasard.getrandbits(32))
+
+
+def jouer_chemin(jeu, joueur, hasard, options):
+    """Avance d'un pas sur le plus court chemin, sans jamais placer de mur"""
+    position = jeu.chemin(joueur)[1]
+    jeu.déplacer_jeton(joueur, position)
+    return ('D', position)
+
+
+def jouer_hasard(jeu, joueur, hasard, options):
+    """Joue un coup permis au hasard
+    Un déplacement est choisi avec la probabilité options['déplacement'] (0.75 par défaut),
+    sinon un mur parmi tous ceux qui sont permis.
+    """
+    murs = []
+    if jeu.joueurs[(joueur - 1)]['murs'] > 0 and hasard.random() >= options.get('déplacement', 0.75):
+        murs = [coup for coup in jeu.coups_légaux(joueur) if coup[0] != 'D']
+    if murs:
+        type_coup, position = hasard.choice(murs)
+        jeu.placer_mur(joueur, position, ia.ORIENTATIONS[type_coup])
+        return (type_coup, position)
+    position = hasard.choice(sorted(jeu.moteur().successeurs(jeu.joueurs[(joueur - 1)]['pos'])))
+    jeu.déplacer_jeton(joueur, position)
+    return ('D', position)
+
+
+# stratégies disponibles: fonction(jeu, joueur, hasard, options) qui joue un coup et le retourne
+STRATÉGIES = {
+    'alphabeta': jouer_alphabeta,
+    'mcts': jouer_mcts,
+    'chemin': jouer_chemin,
+    'hasard': jouer_hasard,
+}
+
+
+def graine_partie(graine, stratégie1, stratégie2, numero):
+    """Donne la graine d'une partie, la même d'une exécution à l'autre"""
+    return random.Random('{}/{}/{}/{}'.format(graine, stratégie1, stratégie2, numero)).getrandbits(64)
+
+
+def jouer_partie(stratégie1, stratégie2, graine, options=None):
+    """Joue une partie complète entre deux stratégies
+    Arguments:
+        stratégie1 {str} -- la stratégie du joueur 1 (clé de STRATÉGIES)
+        stratégie2 {str} -- la stratégie du joueur 2
+        graine {int} -- la graine de la partie
+    Keyword Arguments:
+        options {dict} -- 'moteur', 'ouverture' (nombre de déplacements au hasard joués
+            avant de laisser jouer les stratégies), 'coups_max' et les options des
+            stratégies (default: {None})
+    Return:
+        dict -- 'stratégies', 'graine', 'gagnant' (1, 2 ou None pour une nulle),
+            'coups' et 'temps' (la durée de chaque coup, en secondes, par joueur)
+    """
+    options = options or {}
+    hasard = random.Random(graine)
+    # la table de transposition ne doit pas dépendre des parties précédentes
+    ia.TABLE.vider()
+    jeu = quoridor.Quoridor([stratégie1, stratégie2], moteur=options.get('moteur', 'bits'))
+    stratégies = (STRATÉGIES[stratégie1], STRATÉGIES[stratégie2])
+    temps = ([], [])
+    coups = 0
+    gagnant = None
+    while coups < options.get('coups_max', COUPS_MAX):
+        joueur = (coups % 2) + 1
+        if coups < options.get('ouverture', 0):
+            # ouverture au hasard pour varier les parties entre stratégies déterministes
+            jouer_hasard(jeu, joueur, hasard, {'déplacement': 1.0})
+        else:
+            début = time.perf_counter()
+            stratégies[(joueur - 1)](jeu, joueur, hasard, options)
+            temps[(joueur - 1)].append(time.perf_counter() - début)
+        coups += 1
+        if jeu.partie_terminée():
+            gagnant = joueur
+            break
+    return {'stratégies': (stratégie1, stratégie2), 'graine': graine,
+            'gagnant': gagnant, 'coups': coups, 'temps': temps}
+
+
+def _jouer_partie(arguments):
+    """jouer_partie avec ses arguments en un tuple, pour ProcessPoolExecutor.map"""
+    return jouer_partie(*arguments)
+
+
+def tournoi(stratégies, parties=10, graine=0, processus=None, options=None):
+    """Fait jouer chaque paire de stratégies, chacune à tour de rôle avec le premier coup
+    Arguments:
+        stratégies {list} -- les noms des stratégies (clés de STRATÉGIES)
+    Keyword Arguments:
+        parties {int} -- le nombre de parties par paire ordonnée (default: {10})
+        graine {int} -- la graine du tournoi (default: {0})
+        processus {int} -- le nombre de processus; 1 pour tout jouer dans le processus
+            courant (default: {None}, un par coeur). Avec options['processus_mcts'] > 1,
+            ce sont les recherches de 'mcts' qui sont réparties sur plusieurs processus:
+            les parties sont alors jouées dans le processus courant.
+        options {dict} -- les options passées à jouer_partie (default: {None})
+    Return:
+        list -- le résultat de chaque partie (voir jouer_partie), dans un ordre fixe
+    """
+    for stratégie in stratégies:
+        if stratégie not in STRATÉGIES:
+            raise ValueError("stratégie inconnue: {}".format(stratégie))
+    tâches = [(stratégie1, stratégie2, graine_partie(graine, stratégie1, stratégie2, numero), options)
+              for stratégie1, stratégie2 in itertools.permutations(stratégies, 2)
+              for numero in range(parties)]
+    # un travailleur de ProcessPoolExecutor ne peut pas lui-même en lancer
+    if processus == 1 or (options or {}).get('processus_mcts', 1) > 1:
+        return [_jouer_partie(tâche) for tâche in tâches]
+    with ProcessPoolExecutor(processus) as exécuteur:
+        # map garde l'ordre des tâches: le résultat ne dépend pas de l'ordonnancement
+        return list(exécuteur.map(_jouer_partie, tâches,
+                                  chunksize=max(1, len(tâches) // (4 * (processus or os.cpu_count() or 1)))))
+
+
+def _centile(valeurs, centile):
+    """Donne le centile (0 à 100) d'une liste triée de valeurs"""
+    if not valeurs:
+        return 0.0
+    return valeurs[min(len(valeurs) - 1, int(len(valeurs) * centile / 100))]
+
+
+def bilan(résultats):
+    """Fait le bilan de chaque stratégie
+    Arguments:
+        résultats {list} -- les résultats de tournoi
+    Return:
+        dict -- pour chaque stratégie: 'parties', 'victoires', 'défaites', 'nulles',
+            'taux_victoire', 'coups_moyen' (longueur moyenne de ses parties) et
+            'temps' (moyenne, médiane, centile 95 et maximum de la durée d'un coup, en ms)
+    """
+    statistiques = {}
+    for résultat in résultats:
+        for numero, stratégie in enumerate(résultat['stratégies']):
+            stats = statistiques.setdefault(stratégie, {
+                'parties': 0, 'victoires': 0, 'défaites': 0, 'nulles': 0,
+                'longueurs': [], 'durées': []})
+            stats['parties'] += 1
+            stats['longueurs'].append(résultat['coups'])
+            stats['durées'].extend(résultat['temps'][numero])
+            if résultat['gagnant'] is None:
+                stats['nulles'] += 1
+            elif résultat['gagnant'] == numero + 1:
+                stats['victoires'] += 1
+            else:
+                stats['défaites'] += 1
+    for stats in statistiques.values():
+        durées = sorted(1000 * durée for durée in stats.pop('durées'))
+        longueurs = stats.pop('longueurs')
+        stats['taux_victoire'] = stats['victoires'] / stats['parties']
+        stats['coups_moyen'] = statistics.mean(longueurs)
+        stats['temps'] = {
+            'moyenne': statistics.mean(durées) if durées else 0.0,
+            'médiane': _centile(durées, 50),
+            'p95': _centile(durées, 95),
+            'max': durées[-1] if durées else 0.0,
+        }
+    return statistiques
+
+
+def écrire_json(résultats, chemin):
+    """Écrit le bilan et le détail des parties (sans la durée de chaque coup) en JSON"""
+    parties = [{clé: valeur for clé, valeur in résultat.items() if clé != 'temps'}
+               for résultat in résultats]
+    with open(chemin, 'w', encoding='utf-8') as fichier:
+        json.dump({'bilan': bilan(résultats), 'parties': parties},
+                  fichier, ensure_ascii=False, indent=2)
+
+
+def écrire_csv(résultats, chemin):
+    """Écrit une ligne par partie en CSV"""
+    with open(chemin, 'w', encoding='utf-8', newline='') as fichier:
+        écrivain = csv.writer(fichier)
+        écrivain.writerow(['joueur1', 'joueur2', 'graine', 'gagnant', 'coups',
+                           'temps_moyen_ms_1', 'temps_moyen_ms_2'])
+        for résultat in résultats:
+            écrivain.writerow(list(résultat['stratégies']) + [
+                résultat['graine'], résultat['gagnant'] or '', résultat['coups']] + [
+                    round(1000 * statistics.mean(temps), 3) if temps else ''
+                    for temps in résultat['temps']])
+
+
+def analyser_commande():
+    """Lit les arguments de la ligne de commande"""
+    analyseur = argparse.ArgumentParser(description="Tournoi entre stratégies de Quoridor")
+    analyseur.add_argument('stratégies', nargs='+', choices=sorted(STRATÉGIES),
+                           help="les stratégies à faire jouer")
+    analyseur.add_argument('-n', '--parties', type=int, default=10,
+                           help="nombre de parties par paire ordonnée")
+    analyseur.add_argument('-g', '--graine', type=int, default=0, help="graine du tournoi")
+    analyseur.add_argument('-p', '--processus', type=int, default=None,
+                           help="nombre de processus (un par coeur par défaut)")
+    analyseur.add_argument('--délai', type=float, default=0.1,
+                           help="temps de réflexion de 'alphabeta', en secondes")
+    analyseur.add_argument('--profondeur', type=int, default=None,
+                           help="profondeur fixe de 'alphabeta' (parties reproductibles)")
+    analyseur.add_argument('--itérations', type=int, default=None,
+                           help="nombre de parties simulées par coup de 'mcts' (au lieu du délai)")
+    analyseur.add_argument('--processus-mcts', type=int, default=1,
+                           help="nombre de processus de recherche de chaque coup de 'mcts' "
+                           "(les parties sont alors jouées une à la fois)")
+    analyseur.add_argument('--ouverture', type=int, default=0,
+                           help="nombre de déplacements au hasard en début de partie")
+    analyseur.add_argument('--moteur', default='bits', choices=sorted(quoridor.MOTEURS))
+    analyseur.add_argument('--json', help="fichier où écrire le bilan en JSON")
+    analyseur.add_argument('--csv', help="fichier où écrire les parties en CSV")
+    return analyseur.parse_args()
+
+
+class TestTournoi(unittest.TestCase):
+    """classe test tournoi"""
+
+    def test_tournoi(self):
+        """ Test de la fonction tournoi
+            Cas à tester:
+                - chaque paire ordonnée joue le nombre de parties demandé
+                - le même tournoi donne les mêmes parties, en parallèle ou non
+                - le bilan compte toutes les parties
+                - les fichiers JSON et CSV sont écrits
+        """
+        import tempfile
+        options = {'ouverture': 2, 'coups_max': 120}
+        en_série = tournoi(['chemin', 'hasard'], parties=3, graine=7, processus=1, options=options)
+        en_parallèle = tournoi(['chemin', 'hasard'], parties=3, graine=7, processus=2, options=options)
+        self.assertEqual(len(en_série), 6)
+        self.assertEqual([(r['graine'], r['gagnant'], r['coups']) for r in en_série],
+                         [(r['graine'], r['gagnant'], r['coups']) for r in en_parallèle])
+        statistiques = bilan(en_série)
+        self.assertEqual(statistiques['chemin']['parties'], 6)
+        self.assertEqual(statistiques['chemin']['victoires'] + statistiques['chemin']['défaites'] +
+                         statistiques['chemin']['nulles'], 6)
+        self.assertEqual(statistiques['chemin']['victoires'], statistiques['hasard']['défaites'])
+        with tempfile.TemporaryDirectory() as dossier:
+            écrire_json(en_série, os.path.join(dossier, 'tournoi.json'))
+            écrire_csv(en_série, os.path.join(dossier, 'tournoi.csv'))
+            with open(os.path.join(dossier, 'tournoi.json'), encoding='utf-8') as fichier:
+                self.assertEqual(len(json.load(fichier)['parties']), 6)
+            with open(os.path.join(dossier, 'tournoi.csv'), encoding='utf-8') as fichier:
+                self.assertEqual(len(fichier.readlines()), 7)
+        with self.assertRaises(ValueError):
+            tournoi(['inconnue'], processus=1)
+
+
+    def test_tournoi_mcts(self):
+        """ Test de la stratégie 'mcts' avec un nombre d'itérations
+            Cas à tester:
+                - le même tournoi donne les mêmes parties
+        """
+        options = {'itérations': 40, 'coups_max': 120}
+        premier = tournoi(['mcts', 'chemin'], parties=1, graine=5, processus=1, options=options)
+        second = tournoi(['mcts', 'chemin'], parties=1, graine=5, processus=1, options=options)
+        self.assertEqual([(r['graine'], r['gagnant'], r['coups']) for r in premier],
+                         [(r['graine'], r['gagnant'], r['coups']) for r in second])
+
+
+if __name__ == '__main__':
+    COM = analyser_commande()
+    RÉSULTATS = tournoi(COM.stratégies, COM.parties, COM.graine, COM.processus, {
+        'délai': COM.délai, 'profondeur': COM.profondeur,
+        'itérations': COM.itérations, 'processus_mcts': COM.processus_mcts,
+        'ouverture': COM.ouverture, 'moteur': COM.moteur})
+    for NOM, STATS in sorted(bilan(RÉSULTATS).items()):
+        print("{:<10} {:>5} parties  {:6.1%} victoires  {:5.1f} coups  {:8.2f} ms/coup (p95 {:.2f})".format(
+            NOM, STATS['parties'], STATS['taux_victoire'], STATS['coups_moyen'],
+            STATS['temps']['moyenne'], STATS['temps']['p95']))
+    if COM.json:
+        écrire_json(RÉSULTATS, COM.json)
+    if COM.csv:
+        écrire_csv(RÉSULTATS, COM.csv)
@@ -0,0 +1,226 @@
+""" transposition.py
+Module qui contient le hachage de Zobrist des positions de Quoridor et
+la table de transposition utilisée par la recherche de ia.py.
+Une clé de Zobrist est le ou exclusif (xor) de nombres aléatoires associés à chaque
+élément de la position: la case de chaque jeton, chaque mur placé, le nombre de murs
+qu'il reste à chaque joueur et le joueur qui a le trait. Elle se met donc à jour
+en un xor à chaque coup. Les nombres sont tirés d'une graine fixe, pour que les clés
+soient les mêmes d'une exécution à l'autre (et puissent être écrites sur disque).
+contient les fonctions:
+    - hacher
+        calcule la clé d'une position à partir de zéro
+contient les classes:
+    - TableTransposition
+"""
+import random
+import unittest
+from array import array
+
+import plateau
+
+
+# graine fixe: les clés doivent être stables d'une exécution à l'autre
+_HASARD = random.Random(1901)
+# un nombre par joueur et par case
+ZOBRIST_PIONS = [[_HASARD.getrandbits(64) for _ in range(81)] for _ in range(2)]
+# un nombre par emplacement de mur, pour chaque orientation
+ZOBRIST_MURS = {orientation: [_HASARD.getrandbits(64) for _ in range(64)]
+                for orientation in ('horizontal', 'vertical')}
+# un nombre par joueur et par nombre de murs en réserve (0 à 10)
+ZOBRIST_RÉSERVES = [[_HASARD.getrandbits(64) for _ in range(11)] for _ in range(2)]
+# un nombre pour chaque joueur qui peut avoir le trait
+ZOBRIST_TRAIT = [_HASARD.getrandbits(64) for _ in range(2)]
+
+# types d'entrées de la table
+EXACTE = 0
+BORNE_INF = 1
+BORNE_SUP = 2
+# code de coup absent
+AUCUN_COUP = 0xFFFF
+
+
+def hacher(joueurs, murs_horizontaux, murs_verticaux):
+    """Calcule la clé de Zobrist d'une position à partir de zéro (sans le trait)
+    Arguments:
+        joueurs {list} -- les 2 dictionnaires de joueurs ('murs' et 'pos')
+        murs_horizontaux {list} -- une liste des positions (x,y) des murs horizontaux.
+        murs_verticaux {list} -- une liste des positions (x,y) des murs verticaux.
+    """
+    clé = 0
+    for numero, joueur in enumerate(joueurs):
+        clé ^= ZOBRIST_PIONS[numero][plateau.case(joueur['pos'])]
+        clé ^= ZOBRIST_RÉSERVES[numero][joueur['murs']]
+    for mur in murs_horizontaux:
+        clé ^= ZOBRIST_MURS['horizontal'][plateau.bit_mur(mur, 'horizontal')]
+    for mur in murs_verticaux:
+        clé ^= ZOBRIST_MURS['vertical'][plateau.bit_mur(mur, 'vertical')]
+    return clé
+
+
+class TableTransposition:
+    """TableTransposition
+    Table de taille fixe des positions déjà analysées, indexée par clé de Zobrist.
+    Chaque case garde une seule entrée; une nouvelle entrée remplace l'ancienne si elle
+    a été cherchée au moins aussi profondément, ou si l'ancienne vient d'une recherche
+    précédente (remplacement par profondeur).
+    Les entrées sont rangées dans des tableaux compacts (module array) plutôt que dans
+    des objets Python, pour que la mémoire occupée soit connue d'avance.
+    Attributs:
+        taille {int} -- le nombre de cases de la table
+        sondes {int} -- le nombre de recherches dans la table
+        succès {int} -- le nombre de recherches qui ont trouvé leur position
+    """
+
+    def __init__(self, taille=1 << 16):
+        """
+        Keyword Arguments:
+            taille {int} -- le nombre de cases de la table (default: {65536})
+        """
+        self.taille = taille
+        self.clés = array('Q', bytes(8 * taille))
+        # profondeur -1: case vide
+        self.profondeurs = array('b', [-1]) * taille
+        self.valeurs = array('i', bytes(4 * taille))
+        self.drapeaux = array('B', bytes(taille))
+        self.coups = array('H', [AUCUN_COUP]) * taille
+        self.âges = array('B', bytes(taille))
+        self.âge = 0
+        self.sondes = 0
+        self.succès = 0
+
+
+    def nouvelle_recherche(self):
+        """Marque le début d'une nouvelle recherche: les anciennes entrées deviennent remplaçables"""
+        self.âge = (self.âge + 1) % 256
+
+
+    def chercher(self, clé):
+        """Cherche une position dans la table
+        Arguments:
+            clé {int} -- la clé de Zobrist de la position (avec le trait)
+        Return:
+            tuple -- (profondeur, valeur, drapeau, coup) ou None si la position est absente
+        """
+        self.sondes += 1
+        indice = clé % self.taille
+        if self.profondeurs[indice] < 0 or self.clés[indice] != clé:
+            return None
+        self.succès += 1
+        code = self.coups[indice]
+        return (self.profondeurs[indice], self.valeurs[indice], self.drapeaux[indice],
+                None if code == AUCUN_COUP else plateau.décoder_coup(code))
+
+
+    def enregistrer(self, clé, profondeur, valeur, drapeau, coup):
+        """Enregistre le résultat de l'analyse d'une position
+        Arguments:
+            clé {int} -- la clé de Zobrist de la position (avec le trait)
+            profondeur {int} -- la profondeur de la recherche
+            valeur {int} -- la valeur trouvée
+            drapeau {int} -- EXACTE, BORNE_INF ou BORNE_SUP
+            coup {tuple} -- le meilleur coup (type_coup, position), ou None
+        """
+        indice = clé % self.taille
+        if (self.profondeurs[indice] >= 0 and self.clés[indice] != clé and
+                self.âges[indice] == self.âge and self.profondeurs[indice] > profondeur):
+            # garder l'entrée plus profonde de la recherche en cours
+            return
+        self.clés[indice] = clé
+        self.profondeurs[indice] = profondeur
+        self.valeurs[indice] = valeur
+        self.drapeaux[indice] = drapeau
+        self.coups[indice] = AUCUN_COUP if coup is None else plateau.coder_coup(coup)
+        self.âges[indice] = self.âge
+
+
+    def vider(self):
+        """Vide la table et remet les statistiques à zéro"""
+        self.__init__(self.taille)
+
+
+    def entrées(self):
+        """Donne le nombre de cases occupées"""
+        return self.taille - self.profondeurs.count(-1)
+
+
+    def taux_succès(self):
+        """Donne la proportion des recherches qui ont trouvé leur position"""
+        return self.succès / self.sondes if self.sondes else 0.0
+
+
+    def empreinte_mémoire(self):
+        """Donne le nombre d'octets occupés par les entrées de la table"""
+        return sum(tableau.itemsize * len(tableau) for tableau in
+                   (self.clés, self.profondeurs, self.valeurs, self.drapeaux,
+                    self.coups, self.âges))
+
+
+    def statistiques(self):
+        """Donne un résumé de l'utilisation de la table
+        Return:
+            dict -- 'taille', 'entrées', 'sondes', 'succès', 'taux_succès' et 'octets'
+        """
+        return {'taille': self.taille, 'entrées': self.entrées(), 'sondes': self.sondes,
+                'succès': self.succès, 'taux_succès': self.taux_succès(),
+                'octets': self.empreinte_mémoire()}
+
+
+class TestTableTransposition(unittest.TestCase):
+    """classe test TableTransposition et hachage de Zobrist"""
+
+    def test_clé_incrémentale(self):
+        """ Test de la clé tenue à jour par Quoridor
+            Cas à tester:
+                - la clé incrémentale est toujours égale à hacher()
+                - une même position atteinte par deux ordres de coups a la même clé
+        """
+        import quoridor
+        jeu = quoridor.Quoridor(["joueur1", "joueur2"])
+        départ = jeu.clé
+        for numero in range(30):
+            joueur = (numero % 2) + 1
+            jeu.jouer_coup(joueur, 0.05)
+            self.assertEqual(jeu.clé, hacher(jeu.joueurs, jeu.murh, jeu.murv))
+            if jeu.partie_terminée():
+                break
+        premier = quoridor.Quoridor(["joueur1", "joueur2"])
+        premier.placer_mur(1, (4, 5), 'horizontal')
+        premier.placer_mur(2, (6, 6), 'vertical')
+        second = quoridor.Quoridor(["joueur1", "joueur2"])
+        second.placer_mur(2, (6, 6), 'vertical')
+        second.placer_mur(1, (4, 5), 'horizontal')
+        self.assertEqual(premier.clé, second.clé)
+        self.assertNotEqual(premier.clé, départ)
+        self.assertNotEqual(premier.clé_zobrist(1), premier.clé_zobrist(2))
+
+
+    def test_remplacement(self):
+        """ Test de la table de transposition
+            Cas à tester:
+                - une entrée enregistrée est retrouvée
+                - une entrée moins profonde ne remplace pas une plus profonde
+                - les entrées d'une recherche précédente sont remplaçables
+                - les statistiques comptent les succès et la mémoire
+        """
+        table = TableTransposition(16)
+        self.assertIsNone(table.chercher(5))
+        table.enregistrer(5, 4, 12, EXACTE, ('D', (5, 2)))
+        self.assertEqual(table.chercher(5), (4, 12, EXACTE, ('D', (5, 2))))
+        # même case, autre clé, moins profond: ignoré
+        table.enregistrer(21, 2, -3, BORNE_INF, None)
+        self.assertIsNone(table.chercher(21))
+        # nouvelle recherche: remplaçable
+        table.nouvelle_recherche()
+        table.enregistrer(21, 2, -3, BORNE_INF, None)
+        self.assertEqual(table.chercher(21), (2, -3, BORNE_INF, None))
+        self.assertIsNone(table.chercher(5))
+        statistiques = table.statistiques()
+        self.assertEqual(statistiques['sondes'], 5)
+        self.assertEqual(statistiques['succès'], 2)
+        self.assertEqual(statistiques['entrées'], 1)
+        self.assertEqual(statistiques['octets'], 16 * (8 + 1 + 4 + 1 + 2 + 1))
+
+
+#Lancer la batterie de tests unitaires l'orsque ce module est lancé en tant que main (pas importé)
+if __name__ == '__main__':
+    unittest.main(argv=[''], verbosity=2, exit=False)